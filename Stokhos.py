@@ -17,21 +17,56 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-from sys import argv
+from argparse import ArgumentParser
 
 from stokhos.REPL import StokhosCMD
+from stokhos.builtins.low_discrepancy import QMC_SEQUENCES
+from stokhos.utils.constants import PARALLEL_THRESHOLD
 
 repl = StokhosCMD()
 
 def main():
     repl.cmdloop()
 
+def parse_args():
+    parser = ArgumentParser(description='REPL del lenguaje Stókhos')
+    parser.add_argument('files', nargs='*',
+        help='archivos de instrucciones a cargar antes de iniciar el REPL')
+    parser.add_argument('--workers', type=int, default=1,
+        help='número de procesos entre los que se reparten las muestras de '
+        'histogram y los elementos de array (1 por defecto)')
+    parser.add_argument('--parallel-threshold', type=int,
+        default=PARALLEL_THRESHOLD,
+        help='número mínimo de muestras o elementos por proceso '
+        f'({PARALLEL_THRESHOLD} por defecto)')
+
+    parser.add_argument('--seed', type=int,
+        help='semilla del generador de números aleatorios, para obtener '
+        'los mismos resultados en cada ejecución')
+
+    parser.add_argument('--qmc', choices=QMC_SEQUENCES,
+        help='secuencia de baja discrepancia de la que uniform toma sus '
+        'números (cuasi-Monte Carlo), en lugar de números pseudoaleatorios')
+
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error('--workers debe ser un entero positivo')
+    if args.parallel_threshold < 1:
+        parser.error('--parallel-threshold debe ser un entero positivo')
+    if args.seed is not None and args.seed < 0:
+        parser.error('--seed debe ser un entero no negativo')
+    return args
+
 if __name__ == '__main__':
     enter = True
-    
+    args = parse_args()
+    repl.vm.set_workers(args.workers, args.parallel_threshold)
+    if args.seed is not None:
+        repl.vm.set_seed(args.seed)
+    repl.vm.set_sequence(args.qmc)
 
-    if len(argv) != 1:
-        for path in argv[1:]:
+    if args.files:
+        for path in args.files:
             repl.send_load(path)
 
         print('¿Quieres acceder al REPL de Stokhos? [y/n]: ')
@@ -0,0 +1,80 @@
+"""Conteo de terminales creados por muestra de histogram en cada motor.
+
+Cuenta las instancias de Number y Boolean que crea cada motor de evaluación
+de la VM al ejecutar las simulaciones de bench_engines.py, y reporta el
+promedio por muestra de la simulación y el tiempo de cada una.
+
+Uso (desde la raíz del proyecto):
+    python benchmarks/bench_allocations.py [escala]
+
+donde escala (1 por defecto) multiplica el número de muestras de cada
+simulación.
+"""
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(1, os.path.abspath('.'))
+from bench_engines import PROGRAMS
+from stokhos.AST import Boolean, Number
+from stokhos.VM import EVALUATION_ENGINES
+from stokhos.VM import StokhosVM as SVM
+
+class TerminalCounter:
+    '''Cuenta las instancias de Number y Boolean creadas mientras está
+    activo, envolviendo sus constructores.
+    '''
+    def __init__(self):
+        self.count = 0
+        self.originals = {}
+
+    def __enter__(self):
+        for cls in [Number, Boolean]:
+            init = cls.__init__
+            self.originals[cls] = init
+
+            def counted(terminal, value, init=init):
+                self.count += 1
+                init(terminal, value)
+
+            cls.__init__ = counted
+        return self
+
+    def __exit__(self, *args):
+        for cls, init in self.originals.items():
+            cls.__init__ = init
+
+def run(engine: str, program: list[str], n: int) -> tuple[int, float]:
+    '''Ejecuta un programa en una VM nueva con el motor indicado y retorna el
+    número de terminales creados y el tiempo transcurrido en segundos.
+    '''
+    vm = SVM(engine)
+    lines = [line.format(n=n, n_small=max(n // 20, 1)) for line in program]
+    with TerminalCounter() as counter:
+        start = perf_counter()
+        for line in lines:
+            out = vm.process(line)
+            if out.startswith('ERROR'):
+                raise RuntimeError(out)
+        elapsed = perf_counter() - start
+    return counter.count, elapsed
+
+def main():
+    scale = float(sys.argv[1]) if len(sys.argv) > 1 else 1
+    n = int(5000 * scale)
+
+    engines = list(EVALUATION_ENGINES)
+    print('Terminales creados por muestra (tiempo)')
+    print(f'{"simulación":<14}' + ''.join(f'{e:>18}' for e in engines))
+    for name, program in PROGRAMS.items():
+        # Número de muestras de la simulación ({n} o {n_small})
+        uses_n = any('{n}' in line for line in program)
+        samples = n if uses_n else max(n // 20, 1)
+        row = ''
+        for engine in engines:
+            count, elapsed = run(engine, program, n)
+            row += f'{count / samples:>9.1f} ({elapsed:.2f}s)'
+        print(f'{name:<14}{row}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Costo del despacho de ASTNodeVisitor.visit por nodo visitado.
+
+Compara el despacho anterior (construir el nombre visit_<Nodo> y buscarlo con
+getattr en cada visita) con la tabla de despacho por tipo de nodo de
+ASTNodeVisitor, de dos formas:
+
+    - Aislado: visitas a un nodo con un visitor que no hace nada más.
+    - Sobre las simulaciones de bench_engines.py, evaluadas con el motor
+      'tree' sin ejecución por niveles, reportando el tiempo por nodo.
+
+Uso (desde la raíz del proyecto):
+    python benchmarks/bench_dispatch.py [escala]
+"""
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(1, os.path.abspath('.'))
+from bench_engines import PROGRAMS
+from stokhos.AST import Number
+from stokhos.utils.evaluators import ASTEvaluator
+from stokhos.utils.helpers import ASTNodeVisitor
+from stokhos.VM import StokhosVM as SVM
+
+class GetattrDispatch:
+    '''Despacho anterior a la tabla de ASTNodeVisitor.'''
+    def visit(self, node):
+        method_name = 'visit_' + type(node).__name__
+        visitor = getattr(self, method_name, self.generic_visit)
+        return visitor(node)
+
+class GetattrEvaluator(GetattrDispatch, ASTEvaluator):
+    pass
+
+class CountingEvaluator(ASTEvaluator):
+    '''Evaluador que cuenta los nodos visitados.'''
+    visits = 0
+
+    def visit(self, node):
+        CountingEvaluator.visits += 1
+        return super().visit(node)
+
+class NullVisitor(ASTNodeVisitor):
+    def visit_Number(self, node):
+        return node
+
+class GetattrNullVisitor(GetattrDispatch, NullVisitor):
+    pass
+
+def bench_isolated(visitor: ASTNodeVisitor, n: int) -> float:
+    '''Retorna el tiempo por visita, en nanosegundos, de un nodo Number.'''
+    node = Number(1)
+    visit = visitor.visit
+    start = perf_counter()
+    for _ in range(n):
+        visit(node)
+    return (perf_counter() - start) / n * 1e9
+
+def run(evaluator_class: type, program: list[str], n: int) -> float:
+    '''Ejecuta un programa en una VM nueva con el evaluador indicado y
+    retorna el tiempo transcurrido en segundos.
+    '''
+    vm = SVM()
+    vm.evaluator = evaluator_class(vm.symbol_table)
+    vm.evaluator.hot_threshold = None
+
+    start = perf_counter()
+    for line in program:
+        out = vm.process(line.format(n=n, n_small=max(n // 20, 1)))
+        if out.startswith('ERROR'):
+            raise RuntimeError(out)
+    return perf_counter() - start
+
+def main():
+    scale = float(sys.argv[1]) if len(sys.argv) > 1 else 1
+    n = int(20000 * scale)
+
+    before = bench_isolated(GetattrNullVisitor(), 10 * n)
+    after = bench_isolated(NullVisitor(), 10 * n)
+    print(f'Despacho aislado: getattr {before:.0f} ns/visita, '
+        f'tabla {after:.0f} ns/visita\n')
+
+    print(f'{"simulación":<14}{"nodos":>10}{"getattr":>14}{"tabla":>14}'
+        f'{"ahorro":>14}')
+    for name, program in PROGRAMS.items():
+        CountingEvaluator.visits = 0
+        run(CountingEvaluator, program, n)
+        nodes = CountingEvaluator.visits
+
+        before = run(GetattrEvaluator, program, n) / nodes * 1e9
+        after = run(ASTEvaluator, program, n) / nodes * 1e9
+        print(f'{name:<14}{nodes:>10}{before:>9.0f} ns/n{after:>9.0f} ns/n'
+            f'{before - after:>9.0f} ns/n')
+
+if __name__ == '__main__':
+    main()
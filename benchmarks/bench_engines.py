@@ -0,0 +1,72 @@
+"""Comparación de rendimiento entre los motores de evaluación de Stókhos.
+
+Ejecuta versiones reducidas de las simulaciones de tests/simulaciones con cada
+motor de evaluación de la VM y reporta el tiempo de cada una.
+
+Uso (desde la raíz del proyecto):
+    python benchmarks/bench_engines.py [escala]
+
+donde escala (1 por defecto) multiplica el número de muestras de cada
+simulación.
+"""
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(1, os.path.abspath('.'))
+from stokhos.VM import EVALUATION_ENGINES
+from stokhos.VM import StokhosVM as SVM
+
+# Simulaciones tomadas de tests/simulaciones, con {n} como número de muestras
+PROGRAMS = {
+    'montecarlo': [
+        'num n := {n};',
+        "[num] arr := array(n, ''if((2*uniform() - 1)^2 + (2*uniform() - 1)^2 <= 1, 1, 0)'');",
+        'num darts_inside := sum(arr);',
+        '4*darts_inside/n',
+    ],
+    'montecarlo2': [
+        'num n := {n};',
+        "num dart := 'if((2*uniform() - 1)^2 + (2*uniform() - 1)^2 <= 1, 1, -1)';",
+        "histogram('dart', n, 1, 0, 0)",
+    ],
+    'suggested_a': [
+        "num u1 := 'uniform()';",
+        "num u2 := 'uniform()';",
+        "num x := 'sqrt(-2 * ln(u1)) * cos(2 * pi() * u2)';",
+        "num y := 'sqrt(-2 * ln(u1)) * sin(2 * pi() * u2)';",
+        "histogram('x', {n}, 30, -3.0, 3.0)",
+        "histogram('y', {n}, 30, -3.0, 3.0)",
+    ],
+    'suggested_b': [
+        "[num] a := 'array(49, '2 * uniform() - 1')';",
+        "num promedio := 'avg(a)';",
+        "histogram('promedio', {n_small}, 40, -1, 1)",
+    ],
+}
+
+def run(engine: str, program: list[str], n: int) -> float:
+    '''Ejecuta un programa en una VM nueva con el motor indicado y retorna el
+    tiempo transcurrido en segundos.
+    '''
+    vm = SVM(engine)
+    start = perf_counter()
+    for line in program:
+        out = vm.process(line.format(n=n, n_small=max(n // 20, 1)))
+        if out.startswith('ERROR'):
+            raise RuntimeError(out)
+    return perf_counter() - start
+
+def main():
+    scale = float(sys.argv[1]) if len(sys.argv) > 1 else 1
+    n = int(20000 * scale)
+
+    engines = list(EVALUATION_ENGINES)
+    print(f'{"simulación":<14}' + ''.join(f'{e:>12}' for e in engines))
+    for name, program in PROGRAMS.items():
+        times = [run(engine, program, n) for engine in engines]
+        row = ''.join(f'{t:>11.3f}s' for t in times)
+        print(f'{name:<14}{row}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Escalabilidad de array y histogram de Stókhos con el número de procesos.
+
+Construye array(N, '2 * uniform() - 1') (el arreglo de
+tests/memoization/1.stk) y un histograma de N muestras de uniform() con 1,
+2, 4, ... procesos (hasta el número de núcleos de la máquina), y reporta el
+tiempo de cada uno y la aceleración respecto a un solo proceso.
+
+Uso (desde la raíz del proyecto):
+    python benchmarks/bench_parallel.py [N] [motor]
+
+con N = 1000000 y el motor unboxed por defecto.
+"""
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(1, os.path.abspath('.'))
+from stokhos.VM import StokhosVM as SVM
+
+def worker_counts() -> list[int]:
+    '''Retorna las potencias de 2 hasta el número de núcleos, y este.'''
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    return counts
+
+def run(engine: str, workers: int, command: str) -> float:
+    '''Ejecuta un comando en una VM nueva con el motor y número de procesos
+    indicados y retorna el tiempo transcurrido en segundos.
+    '''
+    vm = SVM(engine, workers)
+    start = perf_counter()
+    out = vm.process(command)
+    if out.startswith('ERROR'):
+        raise RuntimeError(out)
+    return perf_counter() - start
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    engine = sys.argv[2] if len(sys.argv) > 2 else 'unboxed'
+    commands = {
+        'array': f"[num] a := array({n}, '2 * uniform() - 1');",
+        'histogram': f"[num] h := histogram('uniform()', {n}, 10, 0, 1);",
+    }
+
+    print(f'{"procesos":<10}' + ''.join(f'{name:>12}{"acel.":>8}'
+        for name in commands))
+    base = {}
+    for workers in worker_counts():
+        row = ''
+        for name, command in commands.items():
+            t = run(engine, workers, command)
+            base.setdefault(name, t)
+            row += f'{t:>11.3f}s{base[name] / t:>7.1f}x'
+        print(f'{workers:<10}{row}')
+
+if __name__ == '__main__':
+    main()
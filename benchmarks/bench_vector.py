@@ -0,0 +1,66 @@
+"""Comparación de rendimiento del motor vectorizado de Stókhos.
+
+Ejecuta las simulaciones montecarlo.stk y montecarlo2.stk de
+tests/simulaciones con los motores unboxed y vector, y reporta el tiempo de
+cada una y la aceleración del motor vectorizado.
+
+Uso (desde la raíz del proyecto):
+    python benchmarks/bench_vector.py [dardos]
+
+donde dardos (el de cada archivo por defecto) reemplaza el número de dardos
+lanzados en cada simulación.
+"""
+import os
+import re
+import sys
+from time import perf_counter
+
+sys.path.insert(1, os.path.abspath('.'))
+from stokhos.VM import StokhosVM as SVM
+
+SIMULATIONS = ['montecarlo.stk', 'montecarlo2.stk']
+ENGINES = ['unboxed', 'vector']
+
+def load(filename: str, n: int = None) -> list[str]:
+    '''Retorna los comandos de una simulación de tests/simulaciones, con n
+    como número de dardos si se indica.
+    '''
+    path = os.path.join('tests', 'simulaciones', filename)
+    with open(path, encoding='utf-8') as fi:
+        program = [line.strip() for line in fi.readlines()]
+
+    program = [line for line in program if line and not line.startswith('#')]
+    if n is not None:
+        program = [re.sub(r'^num n := \d+;$', f'num n := {n};', line)
+            for line in program]
+    return program
+
+def run(engine: str, program: list[str]) -> tuple[float, str]:
+    '''Ejecuta un programa en una VM nueva con el motor indicado y retorna el
+    tiempo transcurrido en segundos y la salida del último comando.
+    '''
+    vm = SVM(engine)
+    start = perf_counter()
+    for line in program:
+        out = vm.process(line)
+        if out.startswith('ERROR'):
+            raise RuntimeError(out)
+    return perf_counter() - start, out
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else None
+
+    print(f'{"simulación":<18}' + ''.join(f'{e:>12}' for e in ENGINES)
+        + f'{"aceleración":>14}')
+    for filename in SIMULATIONS:
+        program = load(filename, n)
+        results = [run(engine, program) for engine in ENGINES]
+        times = [t for t, out in results]
+        row = ''.join(f'{t:>11.3f}s' for t in times)
+        print(f'{filename:<18}{row}{times[0] / times[-1]:>13.1f}x')
+
+        for engine, (t, out) in zip(ENGINES, results):
+            print(f'    {engine}: {out}')
+
+if __name__ == '__main__':
+    main()
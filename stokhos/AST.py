@@ -16,6 +16,7 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+from array import array as _array
 from math import floor
 from typing import Union
 
@@ -24,12 +25,37 @@ from .utils.custom_exceptions import *
 
 
 class AST:
+    # Llave estructural de la subexpresión, si es pura y depende de
+    # variables, y si se comparte con otra subexpresión idéntica (ver
+    # ASTCommonSubexpressionMarker)
+    cse_key = None
+    cse_shared = False
+
+    # Clase de efecto y variables leídas al evaluar el nodo (ver
+    # ASTEffectAnalyzer)
+    effect = PURE
+    reads = frozenset()
+
     def __repr__(self) -> str:
         return self.ast2str()
 
     def ast2str(self) -> str:
         return self.__str__()
 
+    def ast2parts(self) -> Union[list, None]:
+        '''Retorna las partes de la representación del nodo (ver render):
+        cadenas y nodos hijos, en orden, o None si el nodo se representa
+        directamente con ast2str.
+        '''
+        return None
+
+    def __getstate__(self) -> dict:
+        # Al copiar el nodo a otro proceso no se incluyen los atributos
+        # privados, que los motores de evaluación usan para guardar lo que
+        # compilan (closures, bytecode...)
+        return {key: value for key, value in self.__dict__.items()
+            if not key.startswith('_')}
+
 # -------- TERMINALES --------
 class Terminal(AST):
     def __str__(self) -> str:
@@ -143,7 +169,10 @@ class BinOp(AST):
         return self.ast2str()[1:-1]
 
     def ast2str(self) -> str:
-        return f'({self.lhs.ast2str()} {self.op} {self.rhs.ast2str()})'
+        return render(self)
+
+    def ast2parts(self) -> list:
+        return ['(', self.lhs, f' {self.op} ', self.rhs, ')']
 
     def __eq__(self, other):
         if isinstance(other, type(self)):
@@ -167,7 +196,10 @@ class UnOp(AST):
         return self.ast2str()[1:-1]
 
     def ast2str(self) -> str:
-        return f'({self.op}{self.term.ast2str()})'
+        return render(self)
+
+    def ast2parts(self) -> list:
+        return [f'({self.op}', self.term, ')']
 
     def __eq__(self, other: object) -> bool:
         if isinstance(other, type(self)):
@@ -185,7 +217,10 @@ class Quoted(AST):
         return f"'{self.expr}'"
 
     def ast2str(self) -> str:
-        return f"'{self.expr.ast2str()}'"
+        return render(self)
+
+    def ast2parts(self) -> list:
+        return ["'", self.expr, "'"]
 
     def __eq__(self, other: object) -> bool:
         if isinstance(other, type(self)):
@@ -201,8 +236,10 @@ class Array(AST):
         return f'{self.elements}'
 
     def ast2str(self) -> str:
-        els_str = ', '.join([el.ast2str() for el in self.elements])
-        return f'[{els_str}]'
+        return render(self)
+
+    def ast2parts(self) -> list:
+        return ['[', *separated(self.elements), ']']
 
     def __eq__(self, other: object) -> bool:
         if isinstance(other, type(self)):
@@ -219,7 +256,131 @@ class Array(AST):
     def __setitem__(self, index: int, value: AST):
         self.elements[index] = value
 
+class PackedArray(Array):
+    '''Arreglo de valores ya evaluados de un mismo tipo nativo (enteros,
+    flotantes o booleanos), guardados en un buffer contiguo en lugar de una
+    lista de terminales. Los elementos se envuelven en terminales solo al
+    accederse uno a uno.
+
+    Los arreglos con elementos de distinto tipo nativo (por ejemplo, enteros
+    y flotantes) o con expresiones acotadas se guardan como Array.
+    '''
+    def __init__(self, buffer: _array):
+        self.type = None
+        self.buffer = buffer
+
+    @property
+    def elements(self) -> list[AST]:
+        return list(self)
+
+    @property
+    def terminal(self) -> type:
+        '''Clase de terminal de los elementos del arreglo.'''
+        return Boolean if self.buffer.typecode == 'b' else Number
+
+    def __str__(self) -> str:
+        if self.buffer.typecode == 'b':
+            values = ['true' if value else 'false' for value in self.buffer]
+        else:
+            values = map(str, self.buffer)
+        return f"[{', '.join(values)}]"
+
+    def ast2str(self) -> str:
+        return self.__str__()
+
+    def ast2parts(self) -> None:
+        return None
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, PackedArray):
+            return (self.terminal is other.terminal
+                and self.buffer == other.buffer)
+        if isinstance(other, Array):
+            return self.elements == other.elements
+        return False
+
+    def __len__(self) -> int:
+        return len(self.buffer)
+
+    def __iter__(self):
+        terminal = self.terminal
+        for value in self.buffer:
+            yield terminal(bool(value) if terminal is Boolean else value)
+
+    def __getitem__(self, index: int) -> Terminal:
+        value = self.buffer[index]
+        if self.buffer.typecode == 'b':
+            return Boolean(bool(value))
+        return Number(value)
+
+    def __setitem__(self, index: int, value: Terminal):
+        if not self.accepts(value):
+            raise TypeError(f'{value} no se puede guardar en el arreglo')
+        self.buffer[index] = value.value
+
+    def accepts(self, value: AST) -> bool:
+        '''Indica si el valor se puede guardar en el buffer sin cambiar el
+        tipo nativo de sus elementos.
+        '''
+        typecode = self.buffer.typecode
+        if typecode == 'b':
+            return type(value) is Boolean
+        if type(value) is not Number:
+            return False
+        if typecode == 'd':
+            return type(value.value) is float
+        return type(value.value) is int and -2**63 <= value.value < 2**63
+
+    def copy(self) -> 'PackedArray':
+        return PackedArray(self.buffer[:])
+
+    def unpack(self) -> Array:
+        '''Retorna el arreglo equivalente con una lista de terminales.'''
+        return Array(self.elements)
+
+def pack_values(values: list, _type: Type) -> Array:
+    '''Retorna un arreglo con los valores nativos indicados, de tipo num o
+    bool, compacto si todos tienen el mismo tipo nativo.
+    '''
+    if not values:
+        return Array([])
+
+    if _type == BOOL:
+        return PackedArray(_array('b', values))
+
+    if all(type(value) is float for value in values):
+        return PackedArray(_array('d', values))
+
+    if all(type(value) is int for value in values):
+        try:
+            return PackedArray(_array('q', values))
+        except OverflowError:
+            pass
+
+    return Array([Number(value) for value in values])
+
+def pack_array(elements: list[AST]) -> Array:
+    '''Retorna un arreglo con los elementos indicados, compacto si todos
+    son terminales del mismo tipo nativo.
+    '''
+    if elements and all(type(el) is Number for el in elements):
+        packed = pack_values([el.value for el in elements], NUM)
+        return packed if isinstance(packed, PackedArray) else Array(elements)
+
+    if elements and all(type(el) is Boolean for el in elements):
+        return pack_values([el.value for el in elements], BOOL)
+
+    return Array(elements)
+
 class FunctionCall(AST):
+    # Si es una reducción que se calcula sin crear el arreglo que recibe
+    # (ver ASTReductionFuser)
+    fused = False
+
+    # Identificador del sitio de la llamada, para las funciones que usan
+    # números aleatorios (ver SymTable.new_site), o None
+    site = None
+
     def __init__(self, _id: Id, _args: list[AST]):
         self.type = None
         self.id = _id
@@ -230,8 +391,10 @@ class FunctionCall(AST):
         return f'{self.id}({args_str[1:-1]})'
 
     def ast2str(self) -> str:
-        args_str = ', '.join([arg.ast2str() for arg in self.args])
-        return f'{self.id}({args_str})'
+        return render(self)
+
+    def ast2parts(self) -> list:
+        return [f'{self.id}(', *separated(self.args), ')']
 
     def __eq__(self, other: object) -> bool:
         if isinstance(other, type(self)):
@@ -300,6 +463,39 @@ class AssignArrayElement(AST):
                 and self.rhs == other.rhs)
         return False
 
+# -------- OPTIMIZACIONES --------
+class Folded(AST):
+    '''Nodo que sustituye a una subexpresión cuyo valor se calculó durante
+    la validación (ver ASTConstantFolder). Se evalúa como expr, pero se
+    muestra como la subexpresión original.
+    '''
+    def __init__(self, original: AST, expr: AST):
+        self.type = original.type
+        self.original = original
+        self.expr = expr
+
+    @property
+    def effect(self) -> int:
+        return self.expr.effect
+
+    @property
+    def reads(self) -> frozenset:
+        return self.expr.reads
+
+    def __str__(self) -> str:
+        return self.original.__str__()
+
+    def ast2str(self) -> str:
+        return self.original.ast2str()
+
+    def ast2parts(self) -> list:
+        return [self.original]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, type(self)):
+            return self.original == other.original
+        return self.original == other
+
 # --- AST DE ERROR ---
 class Error(AST):
     def __init__(self, cause: str):
@@ -316,3 +512,35 @@ NUM_ARRAY = Type(TypedArray('num'))
 BOOL_ARRAY = Type(TypedArray('bool'))
 # De utilidad para 'inferencia de tipos'
 ANY_ARRAY = Type(TypedArray('any'))
+
+def render(ast: AST) -> str:
+    '''Retorna la representación de un AST (ver ast2str) construida con una
+    pila explícita de partes por escribir en lugar de la recursión de
+    Python, de modo que se pueden mostrar expresiones de cualquier
+    profundidad.
+    '''
+    out = []
+    work = [ast]
+
+    while work:
+        part = work.pop()
+        if isinstance(part, str):
+            out.append(part)
+            continue
+
+        parts = part.ast2parts()
+        if parts is None:
+            out.append(part.ast2str())
+        else:
+            work.extend(reversed(parts))
+
+    return ''.join(out)
+
+def separated(nodes: list[AST]) -> list:
+    '''Retorna las partes de una lista de nodos separados por comas.'''
+    parts = []
+    for i, node in enumerate(nodes):
+        if i:
+            parts.append(', ')
+        parts.append(node)
+    return parts
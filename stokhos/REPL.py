@@ -98,6 +98,24 @@ class StokhosCMD(Cmd):
         out = self.vm.testparser(command)
         self.handle_output(out)
 
+    def send_bytecode(self, command: str):
+        """Envía un comando al compilador de bytecode de Stókhos.
+
+        Imprime el bytecode desensamblado que retorna la VM en la salida
+        estándar.
+        """
+        out = self.vm.disassemble(command)
+        self.handle_output(out)
+
+    def send_effect(self, command: str):
+        """Envía un comando al analizador de efectos de Stókhos.
+
+        Imprime la clase de efecto y las variables leídas que retorna la VM
+        en la salida estándar.
+        """
+        out = self.vm.effect(command)
+        self.handle_output(out)
+
     def send_process(self, command: str):
         """Envia un comando al intérprete de Stókhos.
 
@@ -200,6 +218,69 @@ class StokhosCMD(Cmd):
     def send_print(self, str_to_print: str):
         self.handle_output(f'MESSAGE: {str_to_print}')
 
+    def send_engine(self, engine: str):
+        """Cambia el motor de evaluación de la VM, o muestra el actual si no
+        se indica ninguno.
+        """
+        if not engine:
+            self.handle_output(f'OK: Motor de evaluación actual: {self.vm.engine}')
+            return
+
+        try:
+            self.vm.set_engine(engine)
+        except ValueError:
+            self.handle_output(prefix_error(error_nonexistent_engine(engine)))
+            return
+        self.handle_output(f'OK: Motor de evaluación cambiado a {engine}')
+
+    def send_workers(self, workers: str):
+        """Cambia el número de procesos entre los que se reparten las
+        muestras de histogram y los elementos de array, y opcionalmente el
+        número mínimo por proceso, o muestra los actuales si no se indica
+        ninguno.
+        """
+        if not workers:
+            self.handle_output(f'OK: Procesos: {self.vm.workers} (umbral: '
+                f'{self.vm.parallel_threshold})')
+            return
+
+        args = workers.split()
+        try:
+            # Se espera el número de procesos y, opcionalmente, el umbral
+            if len(args) > 2:
+                raise ValueError
+            self.vm.set_workers(*[int(arg) for arg in args])
+        except ValueError:
+            self.handle_output(prefix_error(error_invalid_workers(workers)))
+            return
+        self.handle_output(f'OK: Procesos cambiados a {self.vm.workers} '
+            f'(umbral: {self.vm.parallel_threshold})')
+
+    def send_qmc(self, sequence: str):
+        """Cambia la secuencia de baja discrepancia de uniform ('off' para
+        usar números pseudoaleatorios), o muestra la actual si no se indica
+        ninguna.
+        """
+        if not sequence:
+            current = self.vm.symbol_table.rng.sequence or 'off'
+            self.handle_output(f'OK: Secuencia actual: {current}')
+            return
+
+        try:
+            self.vm.set_sequence(None if sequence == 'off' else sequence)
+        except ValueError:
+            self.handle_output(prefix_error(
+                error_nonexistent_sequence(sequence)))
+            return
+        self.handle_output(f'OK: Secuencia cambiada a {sequence}')
+
+    def send_cse(self):
+        """Muestra los contadores de subexpresiones compartidas."""
+        sym_table = self.vm.symbol_table
+        self.handle_output(f'OK: Subexpresiones compartidas: '
+            f'{sym_table.cse_computed} evaluadas, {sym_table.cse_saved} '
+            f'evaluaciones ahorradas')
+
     # ---------- COMANDOS DE DOCUMENTACION DE COMANDOS EN REPL ----------
     def help_lexer(self):
         print(dedent('''
@@ -233,6 +314,31 @@ class StokhosCMD(Cmd):
             Su ejecucion se realiza mediante:
             >>> .ast <entrada>'''))
 
+    def help_bytecode(self):
+        print(dedent('''
+            Compila la entrada a bytecode de pila y muestra sus instrucciones
+            desensambladas, una por línea, con su posición, argumento y
+            descripción.
+
+            Su ejecucion se realiza mediante:
+            >>> .bytecode <entrada>'''))
+
+    def help_effect(self):
+        print(dedent('''
+            Valida la entrada, sin ejecutarla, y muestra su clase de efecto:
+                pure: Su valor depende solo de la propia expresión.
+                reads-variables: Lee variables (se listan entre llaves).
+                random: Usa números aleatorios (uniform, normal...).
+                clock: Lee el reloj (now).
+                state: Modifica el estado de la VM (tick, reset,
+                    histogram, definiciones y asignaciones).
+            Si la entrada lee variables, muestra también su efecto
+            transitivo según las fórmulas de esas variables. De una expresión
+            acotada se muestran los efectos de evaluarla.
+
+            Su ejecucion se realiza mediante:
+            >>> .effect <entrada>'''))
+
     def help_failed(self):
         print(dedent('''
             Imprime la lista de errores de la VM, uno por línea.
@@ -259,6 +365,76 @@ class StokhosCMD(Cmd):
             Su ejecucion se realiza mediante:
             >>> .reset'''))
 
+    def help_engine(self):
+        print(dedent('''
+            Cambia el motor de evaluación de la VM. Sin argumentos, muestra
+            el motor en uso.
+
+            Motores disponibles:
+                tree: Recorre recursivamente el AST (por defecto).
+                closure: Compila el AST a closures de Python una sola vez
+                    y las reutiliza en cada evaluación.
+                bytecode: Compila el AST a bytecode de pila y lo ejecuta
+                    en un ciclo de despacho.
+                iterative: Recorre el AST con una pila de trabajo
+                    explícita, para expresiones muy profundas.
+                unboxed: Calcula las expresiones de tipo num y bool sobre
+                    valores nativos de Python, sin crear un terminal por
+                    operación.
+                vector: Como unboxed, pero calcula en lote las muestras de
+                    histogram y los elementos de array sobre arreglos de
+                    NumPy (si está instalado).
+
+            Su ejecucion se realiza mediante:
+            >>> .engine <motor>'''))
+
+    def help_workers(self):
+        print(dedent(f'''
+            Cambia el número de procesos entre los que se reparten las
+            muestras de histogram y los elementos de array (1 por defecto),
+            y opcionalmente el umbral: el número mínimo de muestras o
+            elementos por proceso ({PARALLEL_THRESHOLD} por defecto). Sin
+            argumentos, muestra los valores en uso. Cada proceso evalúa una
+            parte con su propia secuencia de números aleatorios y los
+            resultados se unen al final.
+
+            Los histogramas y arreglos por debajo del umbral, o de
+            expresiones que modifican el estado de la VM (como tick), se
+            calculan en un solo proceso.
+
+            Su ejecucion se realiza mediante:
+            >>> .workers <n> [<umbral>]'''))
+
+    def help_qmc(self):
+        print(dedent('''
+            Cambia la fuente de los números de uniform y de las
+            distribuciones. Sin argumentos, muestra la actual.
+
+            Las disponibles son:
+                off: Números pseudoaleatorios (por defecto).
+                sobol: Secuencia de Sobol revuelta.
+                halton: Secuencia de Halton revuelta.
+
+            Con sobol y halton (cuasi-Monte Carlo), cada muestra de
+            histogram, stats o quantile es un punto de la secuencia, con
+            una coordenada por llamada a uniform y por elemento de arreglo,
+            de modo que las muestras cubren el espacio de forma más uniforme
+            y las estimaciones convergen con menos muestras. Los números
+            siguen dependiendo de la semilla.
+
+            Su ejecucion se realiza mediante:
+            >>> .qmc <secuencia>'''))
+
+    def help_cse(self):
+        print(dedent('''
+            Muestra cuántas veces se evaluaron las subexpresiones puras que
+            comparten varias fórmulas y cuántas evaluaciones se ahorraron
+            reutilizando su valor en el mismo ciclo de cómputo. Los
+            contadores se reinician con .reset.
+
+            Su ejecucion se realiza mediante:
+            >>> .cse'''))
+
     # -------------- MÉTODOS SUPERCLASE CUSTOMIZADOS --------------
     def cmdloop(self, intro=None):
         """Ver clase base. Agrega manejo de interrupciones del teclado."""
@@ -337,6 +513,16 @@ class StokhosCMD(Cmd):
             command = line[4:].strip()
             self.send_ast(command)
 
+        elif match_magic_command('bytecode', line):
+            # Corta de la entrada '.bytecode' y desensambla el comando
+            command = line[9:].strip()
+            self.send_bytecode(command)
+
+        elif match_magic_command('effect', line):
+            # Corta de la entrada '.effect' y analiza los efectos del comando
+            command = line[7:].strip()
+            self.send_effect(command)
+
         elif match_magic_command('failed', line):
             # Corta de la entrada '.failed' e imprime la lista de errores
             rem = line[7:].strip()
@@ -359,6 +545,32 @@ class StokhosCMD(Cmd):
             
             self.send_reset()
 
+        elif match_magic_command('engine', line):
+            # Corta de la entrada '.engine' y cambia el motor de la VM
+            engine = line[7:].strip()
+            self.send_engine(engine)
+
+        elif match_magic_command('workers', line):
+            # Corta de la entrada '.workers' y cambia los procesos de la VM
+            workers = line[8:].strip()
+            self.send_workers(workers)
+
+        elif match_magic_command('qmc', line):
+            # Corta de la entrada '.qmc' y cambia la secuencia de uniform
+            sequence = line[4:].strip()
+            self.send_qmc(sequence)
+
+        elif match_magic_command('cse', line):
+            # Corta de la entrada '.cse' y muestra los contadores
+            rem = line[4:].strip()
+
+            # Si había en la línea algo más que .cse se usó mal el comando
+            if rem:
+                self.handle_output(prefix_error(error_invalid_arguments('.cse')))
+                return
+
+            self.send_cse()
+
         elif match_magic_command('print', line):
             # Corta de la entrada '.print' e imprime lo restante
             rem = line[6:].strip()
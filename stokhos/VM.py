@@ -21,14 +21,31 @@ import ply.lex as lex
 import ply.yacc as yacc
 
 from . import grammar, tokenrules
-from .AST import AST, VOID, Assign, AssignArrayElement, Error
+from .AST import (AST, EFFECT_NAMES, VOID, Assign, AssignArrayElement, Error,
+    PackedArray, Quoted, SymDef)
 from .symtable import SymTable
+from .utils.bytecode import ASTBytecodeCompiler, ASTBytecodeEvaluator
+from .utils.compilers import ASTClosureEvaluator
+from .utils.constants import PARALLEL_THRESHOLD
 from .utils.custom_exceptions import *
+from .utils.effects import resolve_effect
 from .utils.err_strings import error_invalid_char, error_invalid_id
 from .utils.evaluators import ASTEvaluator
+from .utils.iterative import ASTIterativeEvaluator
 from .utils.helpers import NullLogger
+from .utils.unboxed import ASTUnboxedEvaluator
+from .utils.vectorized import ASTVectorEvaluator
 from .utils.validators import ASTValidator
 
+# Motores de evaluación disponibles para la VM
+EVALUATION_ENGINES = {
+    'tree': ASTEvaluator,
+    'closure': ASTClosureEvaluator,
+    'bytecode': ASTBytecodeEvaluator,
+    'iterative': ASTIterativeEvaluator,
+    'unboxed': ASTUnboxedEvaluator,
+    'vector': ASTVectorEvaluator,
+}
 
 class StokhosVM:
     """Máquina Virtual intérprete del lenguaje Stókhos.
@@ -48,18 +65,118 @@ class StokhosVM:
             los AST obtenidos luego de la traducción dirigida
             por sintaxis.
         evaluator:
-            Instancia de ASTEvaluator que evalúa recursivamente
-            los AST obtenidos luego de la traducción dirigida
+            Instancia de ASTEvaluator (o de una de sus subclases) que
+            evalúa los AST obtenidos luego de la traducción dirigida
             por sintaxis.
+        engine:
+            Nombre del motor de evaluación en uso, una de las llaves
+            de EVALUATION_ENGINES.
+        workers:
+            Número de procesos entre los que se reparten las muestras
+            de histogram y los elementos de array (1 si se evalúan en el
+            proceso de la VM).
+        parallel_threshold:
+            Número mínimo de muestras o elementos por proceso para
+            repartirlos entre varios.
     """
 
-    def __init__(self):
+    def __init__(self, engine: str = 'tree', workers: int = 1,
+        parallel_threshold: int = PARALLEL_THRESHOLD):
         # No se imprime ningún mensaje que pueda generar ply
         self.lex = lex.lex(module=tokenrules)
         self.parser = yacc.yacc(module=grammar, errorlog=NullLogger)
         self.symbol_table = SymTable()
         self.validator = ASTValidator(self.symbol_table)
-        self.evaluator = ASTEvaluator(self.symbol_table)
+        self.workers = 1
+        self.parallel_threshold = PARALLEL_THRESHOLD
+        self.set_engine(engine)
+        self.set_workers(workers, parallel_threshold)
+
+    def set_engine(self, engine: str):
+        """Selecciona el motor de evaluación de la VM.
+
+        Los motores disponibles son:
+            - 'tree': recorrido recursivo del AST (ASTEvaluator).
+            - 'closure': compilación del AST a closures de Python
+                (ASTClosureEvaluator).
+            - 'bytecode': compilación del AST a bytecode de pila y
+                ejecución en un ciclo de despacho (ASTBytecodeEvaluator).
+            - 'iterative': recorrido del AST con una pila de trabajo
+                explícita, sin límite de profundidad
+                (ASTIterativeEvaluator).
+            - 'unboxed': cálculo de las subexpresiones escalares sobre
+                valores nativos de Python, sin crear terminales por
+                operación (ASTUnboxedEvaluator).
+            - 'vector': como 'unboxed', pero las muestras de histogram y los
+                elementos de array se calculan en lote sobre arreglos de
+                NumPy, si está instalado (ASTVectorEvaluator).
+
+        En caso de no existir el motor indicado, lanza una excepción
+        ValueError.
+        """
+        if engine not in EVALUATION_ENGINES:
+            raise ValueError(f'Motor de evaluación "{engine}" inexistente')
+
+        self.engine = engine
+        self.evaluator = EVALUATION_ENGINES[engine](self.symbol_table)
+        self.evaluator.workers = self.workers
+        self.evaluator.parallel_threshold = self.parallel_threshold
+
+    def set_workers(self, workers: int, threshold: int = None):
+        """Selecciona el número de procesos entre los que se reparten las
+        muestras de histogram y los elementos de array, y opcionalmente el
+        número mínimo de muestras o elementos por proceso (threshold). Con 1
+        proceso, se evalúan en el proceso de la VM.
+
+        Los histogramas y arreglos con menos de threshold muestras o
+        elementos por proceso, o de expresiones que modifican el estado de
+        la VM (como tick), se calculan siempre en el proceso de la VM (ver
+        parallel.py).
+
+        En caso de no ser enteros positivos, lanza una excepción
+        ValueError.
+        """
+        if threshold is None:
+            threshold = self.parallel_threshold
+
+        for value in [workers, threshold]:
+            if isinstance(value, bool) or not isinstance(value, int) \
+                or value < 1:
+                raise ValueError(f'Número de procesos o umbral "{value}" '
+                    'inválido')
+
+        self.workers = workers
+        self.parallel_threshold = threshold
+        self.evaluator.workers = workers
+        self.evaluator.parallel_threshold = threshold
+
+    def set_seed(self, seed: int):
+        """Reinicia el generador de números aleatorios de la VM con la
+        semilla indicada, como la función seed. Con la misma semilla, las
+        ejecuciones de un mismo programa producen los mismos resultados.
+
+        En caso de no ser un entero no negativo, lanza una excepción
+        ValueError.
+        """
+        if isinstance(seed, bool) or not isinstance(seed, int) or seed < 0:
+            raise ValueError(f'Semilla "{seed}" inválida')
+
+        self.symbol_table.rng.seed(seed)
+
+    def set_sequence(self, sequence: str = None):
+        """Selecciona el modo cuasi-Monte Carlo del generador de números
+        aleatorios de la VM: con 'sobol' o 'halton', las llamadas a uniform
+        (y a las distribuciones) toman sus números de una secuencia de baja
+        discrepancia revuelta de ese nombre, con un punto por ciclo de
+        cómputo y una dimensión por llamada de la fórmula muestreada (ver
+        RandomSource). Así, las estimaciones con histogram, stats o quantile
+        convergen con menos muestras. Con None, se usan números
+        pseudoaleatorios.
+
+        En caso de no existir la secuencia indicada, lanza una excepción
+        ValueError.
+        """
+        self.symbol_table.rng.set_sequence(sequence)
 
     def process(self, command: str) -> str:
         """Procesa y ejecuta un comando de Stókhos.
@@ -187,6 +304,69 @@ class StokhosVM:
         
         return f'OK: ast("{command}") ==> {out}'
 
+    def disassemble(self, command: str) -> str:
+        """Compila un comando de Stókhos a bytecode y lo desensambla.
+
+        En el caso de definiciones y asignaciones se compila el lado derecho.
+
+        Retorna:
+            Una cadena de caracteres con el listado de instrucciones del
+            bytecode, una por línea. Por ejemplo:
+
+            >>> disassemble("2 * x")
+            'OK: bytecode("2 * x") ==>
+               0 PUSH_CONST       0 (2)
+               2 LOAD_VAR         1 (x)
+               4 BINOP            2 (*)'
+        """
+        ast = self.parse(command)
+        if isinstance(ast, Error):
+            return f'ERROR: {ast.cause}'
+
+        validation = self.validate(ast)
+        if isinstance(validation, Error):
+            return f'ERROR: {validation.cause}'
+
+        if isinstance(ast, (SymDef, Assign, AssignArrayElement)):
+            ast = ast.rhs
+
+        chunk = ASTBytecodeCompiler(self.symbol_table).compile(ast)
+        return f'OK: bytecode("{command}") ==>\n{chunk}'
+
+    def effect(self, command: str) -> str:
+        """Valida un comando de Stókhos y describe sus efectos, sin
+        ejecutarlo.
+
+        En el caso de una expresión acotada se describen los efectos de
+        evaluarla. Si el comando lee variables, se indica también su efecto
+        transitivo según las fórmulas actuales de esas variables.
+
+        Retorna:
+            Una cadena de caracteres con la clase de efecto del comando y las
+            variables que lee. Por ejemplo:
+
+            >>> effect("2 * x")
+            'OK: effect("2 * x") ==> reads-variables {x}, transitivo: random'
+        """
+        ast = self.parse(command)
+        if isinstance(ast, Error):
+            return f'ERROR: {ast.cause}'
+
+        validation = self.validate(ast)
+        if isinstance(validation, Error):
+            return f'ERROR: {validation.cause}'
+
+        if isinstance(ast, Quoted):
+            ast = ast.expr
+
+        out = EFFECT_NAMES[ast.effect]
+        if ast.reads:
+            reads = ', '.join(sorted(ast.reads))
+            transitive = EFFECT_NAMES[resolve_effect(ast, self.symbol_table)]
+            out = f'{out} {{{reads}}}, transitivo: {transitive}'
+
+        return f'OK: effect("{command}") ==> {out}'
+
     def validate(self, ast: AST) -> AST:
         """Valida un Árbol de Sintaxis Abstracta.
 
@@ -199,6 +379,9 @@ class StokhosVM:
             return self.validator.validate(ast)
         except SemanticError as e:
             return Error(e.message)
+        except RecursionError:
+            return Error('Recursión máxima alcanzada, la expresión es '
+                'demasiado profunda para validarse')
 
     def execute(self, ast: AST) -> AST:
         """Ejecuta un Árbol de Sintaxis Abstracta.
@@ -227,8 +410,15 @@ class StokhosVM:
                 try:
                     self.symbol_table.increment_cycle()
 
+                    # Un arreglo compacto solo guarda valores del mismo tipo
+                    # nativo, si no se pasa a una lista de elementos
+                    value = self.symbol_table.lookup(_id).value
+                    if isinstance(value, PackedArray) and not value.accepts(res):
+                        value = value.unpack()
+                        self.symbol_table.update(_id, value)
+
                     # CVALUE(LVALUE(id[index])) = RVALUE(ast.rhs)
-                    self.symbol_table.lookup(_id).value[index] = res
+                    value[index] = res
                 except:
                     self.symbol_table.cycle -= 1
                     return Error('Acceso a arreglo inválido')
@@ -268,8 +458,8 @@ class StokhosVM:
         except (SemanticError, StkRuntimeError) as e:
             return Error(e.message)
         except RecursionError:
-            return Error('Recursión máxima alcanzada, posible dependencia '
-                'circular en la evaluación de la variable')
+            return Error('Recursión máxima alcanzada, la expresión es '
+                'demasiado profunda para el motor de evaluación')
         except:
             return Error('Expresión inválida')
 
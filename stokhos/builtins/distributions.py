@@ -0,0 +1,248 @@
+"""Distribuciones de probabilidad predefinidas de Stókhos.
+
+Copyright (C) 2022 Arturo Yepez - Jesus Bandez - Christopher Gómez
+CI3725 - Traductores e Interpretadores
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from math import cos, exp, floor, inf, lgamma, log, pi, sqrt
+
+# NumPy es opcional: sin él, los motores calculan cada muestra por separado
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from ..utils.constants import (DRAW_STRIDE, POISSON_INVERSION_LIMIT,
+    RANDINT_MAX_RANGE)
+from ..utils.custom_exceptions import StkRuntimeError
+
+# Cada distribución recibe uniform, la función que retorna el número
+# aleatorio (entre 0 y 1) de un sitio en el ciclo y carril actuales, el sitio
+# de la llamada y sus parámetros como valores nativos. El número j-ésimo de
+# la llamada es el del sitio site + j * DRAW_STRIDE (ver RandomSource.sample),
+# de modo que las versiones sobre arreglos de NumPy producen las mismas
+# muestras con los mismos números.
+
+# -------- IMPLEMENTACIONES SOBRE VALORES NATIVOS --------
+def sample_normal(uniform: callable, site: int, mu: float,
+    sigma: float) -> float:
+    '''Retorna una muestra de la distribución normal de media mu y
+    desviación estándar sigma, con la transformación de Box-Muller.
+    '''
+    if not sigma >= 0:
+        raise StkRuntimeError('Se esperaba como desviación estándar un número '
+            f'no negativo, pero se obtuvo {sigma}')
+    radius = sqrt(-2 * log(1 - uniform(site)))
+    return mu + sigma * radius * cos(2 * pi * uniform(site + DRAW_STRIDE))
+
+def sample_exponential(uniform: callable, site: int, rate: float) -> float:
+    '''Retorna una muestra de la distribución exponencial de tasa rate, por
+    inversión.
+    '''
+    if not rate > 0:
+        raise StkRuntimeError('Se esperaba como tasa un número positivo, pero '
+            f'se obtuvo {rate}')
+    return -log(1 - uniform(site)) / rate
+
+def sample_bernoulli(uniform: callable, site: int, p: float) -> int:
+    '''Retorna 1 con probabilidad p, o 0.'''
+    if not 0 <= p <= 1:
+        raise StkRuntimeError('Se esperaba como probabilidad un número entre 0 '
+            f'y 1, pero se obtuvo {p}')
+    return int(uniform(site) < p)
+
+def sample_randint(uniform: callable, site: int, a: float, b: float) -> int:
+    '''Retorna un entero entre a y b (inclusive), con la misma probabilidad
+    cada uno. Hay a lo sumo RANDINT_MAX_RANGE enteros entre los límites.
+    '''
+    if a % 1 != 0 or b % 1 != 0 or a > b:
+        raise StkRuntimeError('Se esperaba como límites dos enteros a <= b, '
+            f'pero se obtuvo {a} y {b}')
+    a, b = int(a), int(b)
+    if b - a >= RANDINT_MAX_RANGE:
+        raise StkRuntimeError('Se esperaban como límites dos enteros a <= b '
+            f'con b - a < 2^53, pero se obtuvo {a} y {b}')
+    return min(a + floor(uniform(site) * (b - a + 1)), b)
+
+def sample_poisson(uniform: callable, site: int, lam: float) -> int:
+    '''Retorna una muestra de la distribución de Poisson de media lam: por
+    inversión (con un solo número) si lam < POISSON_INVERSION_LIMIT, o con
+    el rechazo transformado de Hörmann (PTRS, con dos números por intento)
+    si no.
+    '''
+    if not 0 <= lam < inf:
+        raise StkRuntimeError('Se esperaba como media un número no negativo, '
+            f'pero se obtuvo {lam}')
+
+    if lam < POISSON_INVERSION_LIMIT:
+        u = uniform(site)
+        k, p = 0, exp(-lam)
+        cdf = p
+        while u > cdf and p > 0:
+            k += 1
+            p *= lam / k
+            cdf += p
+        return k
+
+    constants = ptrs_constants(lam)
+    while True:
+        k = ptrs_attempt(lam, constants, uniform(site),
+            uniform(site + DRAW_STRIDE))
+        if k is not None:
+            return k
+        site += 2 * DRAW_STRIDE
+
+def ptrs_constants(lam: float) -> tuple:
+    '''Retorna las constantes del método PTRS para la media lam.'''
+    b = 0.931 + 2.53 * sqrt(lam)
+    a = -0.059 + 0.02483 * b
+    log_alpha = log(1.1239 + 1.1328 / (b - 3.4))
+    vr = 0.9277 - 3.6224 / (b - 2)
+    return a, b, log_alpha, vr, log(lam)
+
+def ptrs_attempt(lam: float, constants: tuple, u: float,
+    v: float) -> object:
+    '''Retorna el entero propuesto por un intento del método PTRS con los
+    números u y v, o None si se rechaza.
+    '''
+    a, b, log_alpha, vr, log_lam = constants
+    u -= 0.5
+    us = 0.5 - abs(u)
+    if us <= 0 or v <= 0:
+        return None
+
+    k = floor((2 * a / us + b) * u + lam + 0.43)
+    if us >= 0.07 and v <= vr:
+        return k
+    if k < 0 or (us < 0.013 and v > us):
+        return None
+    if (log(v) + log_alpha - log(a / (us * us) + b)
+        <= -lam + k * log_lam - lgamma(k + 1)):
+        return k
+    return None
+
+# Nombre de cada distribución, su implementación y su número de parámetros
+DISTRIBUTIONS = {
+    'normal': (sample_normal, 2),
+    'exponential': (sample_exponential, 1),
+    'poisson': (sample_poisson, 1),
+    'bernoulli': (sample_bernoulli, 1),
+    'randint': (sample_randint, 2),
+}
+
+# -------- IMPLEMENTACIONES SOBRE ARREGLOS DE NUMPY --------
+
+# Reciben draw, que retorna un arreglo con el número j-ésimo de cada carril,
+# y parámetros escalares o con un valor por carril. Retornan el arreglo de
+# muestras y la máscara de carriles con parámetros inválidos, cuyos valores
+# no se usan (quien llama los recalcula con la implementación nativa, que
+# lanza el error correspondiente).
+if np is not None:
+    def log_array(x: np.ndarray) -> np.ndarray:
+        '''Logaritmo natural elemento a elemento con math.log, cuyos
+        resultados pueden diferir de los de np.log en el último bit.
+        '''
+        return np.fromiter(map(log, x.tolist()), np.float64, len(x))
+
+    def normal_array(draw: callable, mu: object, sigma: object) -> tuple:
+        invalid = ~(np.asarray(sigma) >= 0)
+        radius = np.sqrt(-2 * log_array(1 - draw(0)))
+        return mu + sigma * radius * np.cos(2 * pi * draw(1)), invalid
+
+    def exponential_array(draw: callable, rate: object) -> tuple:
+        invalid = ~(np.asarray(rate) > 0)
+        return -log_array(1 - draw(0)) / rate, invalid
+
+    def bernoulli_array(draw: callable, p: object) -> tuple:
+        p = np.asarray(p)
+        invalid = ~((p >= 0) & (p <= 1))
+        return (draw(0) < p).astype(np.int64), invalid
+
+    def randint_array(draw: callable, a: object, b: object) -> tuple:
+        a, b = np.asarray(a), np.asarray(b)
+        invalid = (a % 1 != 0) | (b % 1 != 0) | (a > b) \
+            | (b - a >= RANDINT_MAX_RANGE)
+        a, b = np.where(invalid, 0, a), np.where(invalid, 0, b)
+        values = np.minimum(a + np.floor(draw(0) * (b - a + 1)), b)
+        return values.astype(np.int64), invalid
+
+    def poisson_array(draw: callable, lam: object) -> tuple:
+        first = draw(0)
+        n = len(first)
+        scalar = np.ndim(lam) == 0
+        lam = np.broadcast_to(np.asarray(lam, dtype=np.float64), (n,))
+        invalid = ~((lam >= 0) & (lam < inf))
+        values = np.zeros(n, dtype=np.int64)
+
+        # Las funciones trascendentes de los parámetros se calculan con math,
+        # para obtener exactamente los mismos valores que sample_poisson
+        def per_lane(f: callable, lanes: np.ndarray) -> np.ndarray:
+            if scalar:
+                return np.array([f(lam[0].item())] * len(lanes))
+            return np.array([f(x) for x in lam[lanes].tolist()])
+
+        small = np.flatnonzero(~invalid & (lam < POISSON_INVERSION_LIMIT))
+        if len(small):
+            u, x = first[small], lam[small]
+            p = per_lane(lambda x: exp(-x), small)
+            cdf = p.copy()
+            k = 0
+            pending = (u > cdf) & (p > 0)
+            while pending.any():
+                k += 1
+                p = np.where(pending, p * (x / k), p)
+                cdf = np.where(pending, cdf + p, cdf)
+                values[small[pending]] = k
+                pending &= (u > cdf) & (p > 0)
+
+        large = np.flatnonzero(~invalid & (lam >= POISSON_INVERSION_LIMIT))
+        if len(large):
+            x = lam[large]
+            a, b, log_alpha, vr, log_lam = per_lane(ptrs_constants, large).T
+
+        attempt = 0
+        while len(large):
+            u = draw(2 * attempt)[large] - 0.5
+            v = draw(2 * attempt + 1)[large]
+            us = 0.5 - np.abs(u)
+            valid = (us > 0) & (v > 0)
+            k = np.floor((2 * a / us + b) * u + x + 0.43)
+
+            # Como en ptrs_attempt: aceptación rápida, rechazo rápido y, en
+            # los carriles restantes, la prueba exacta con math
+            accepted = valid & (us >= 0.07) & (v <= vr)
+            undecided = valid & ~accepted & (k >= 0) \
+                & ~((us < 0.013) & (v > us))
+            for i in np.flatnonzero(undecided).tolist():
+                accepted[i] = (log(v[i]) + log_alpha[i]
+                    - log(a[i] / (us[i] * us[i]) + b[i])
+                    <= -x[i] + k[i] * log_lam[i] - lgamma(k[i] + 1))
+
+            values[large[accepted]] = k[accepted]
+            keep = ~accepted
+            large, x = large[keep], x[keep]
+            a, b, log_alpha, vr, log_lam = (c[keep]
+                for c in (a, b, log_alpha, vr, log_lam))
+            attempt += 1
+
+        return values, invalid
+
+    VECTOR_DISTRIBUTIONS = {
+        'normal': normal_array,
+        'exponential': exponential_array,
+        'poisson': poisson_array,
+        'bernoulli': bernoulli_array,
+        'randint': randint_array,
+    }
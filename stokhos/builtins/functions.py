@@ -17,19 +17,170 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-from math import floor, log, exp, sin, cos, sqrt
-from random import uniform
+from math import floor, fsum, log, exp, sin, cos, sqrt
 from time import time
 
+# NumPy es opcional: sin él, las reducciones recorren los valores uno a uno
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from ..AST import *
 from ..utils.constants import *
 
 
-def stk_uniform() -> Number:
-    '''Retorna un número aleatorio entre 0 y 1.
+# -------- IMPLEMENTACIONES SOBRE VALORES NATIVOS --------
+
+# Reciben y retornan valores de Python (float, int o bool) en lugar de
+# terminales de Stókhos. Las usan los motores que evalúan sin crear un
+# Number por operación.
+def raw_floor(x: float) -> int:
+    '''Retorna el máximo entero menor o igual a x.'''
+    return floor(x)
+
+def raw_pi() -> float:
+    '''Retorna el valor de pi en formato de doble precisión (IEEE754).'''
+    return 3.141592653589793
+
+def raw_now() -> int:
+    '''Retorna los milisegundos transcurridos desde un punto de referencia
+    en el tiempo.
+    '''
+    return int(round(time() * 1000))
+
+def raw_ln(x: float) -> float:
+    '''Retorna el logaritmo natural de x.'''
+    try:
+        return log(x)
+    except ValueError:
+        raise StkRuntimeError('El logaritmo natural de un número negativo o '
+            'nulo no existe')
+
+def raw_sqrt(x: float) -> float:
+    '''Retorna la raiz cuadrada de x.'''
+    try:
+        return sqrt(x)
+    except ValueError:
+        raise StkRuntimeError('No se puede realizar aritmética con números '
+            'complejos')
+
+raw_exp = exp
+raw_sin = sin
+raw_cos = cos
+
+def raw_values(a: Array):
+    '''Retorna los valores nativos de un arreglo evaluado: su buffer si es
+    compacto, o una lista con el valor de cada elemento si no.
+    '''
+    if isinstance(a, PackedArray):
+        return a.buffer
+    return [el.value for el in a]
+
+def raw_sum(values) -> float:
+    '''Retorna la suma de una secuencia de números en una sola pasada. La
+    suma de enteros es exacta, y la de flotantes se redondea correctamente
+    (math.fsum), de modo que no depende del orden de los elementos.
+    '''
+    typecode = getattr(values, 'typecode', None)
+    if typecode == 'q':
+        return sum(values)
+    if typecode is None:
+        # Valores de un arreglo no compacto (enteros y flotantes mezclados,
+        # o enteros fuera del rango del buffer)
+        total = sum(values)
+        if not isinstance(total, float):
+            return total
+
+    try:
+        return fsum(values)
+    except OverflowError:
+        # Las sumas parciales exceden el rango de los flotantes
+        return sum(values)
+
+def raw_chunked_sum(chunks) -> float:
+    '''Retorna la suma de los valores de una secuencia de porciones (listas
+    de números) en una sola pasada, sin reunirlos, con el mismo resultado
+    que raw_sum sobre todos ellos.
+    '''
+    # La suma de izquierda a derecha (la de sum) se acumula junto con la de
+    # fsum, que consume los valores a medida que se generan
+    total = 0
+
+    def stream():
+        nonlocal total
+        for chunk in chunks:
+            total = sum(chunk, total)
+            yield from chunk
+
+    values = stream()
+    try:
+        rounded = fsum(values)
+    except (OverflowError, ValueError) as e:
+        # Se consumen las porciones restantes, como si estuvieran reunidas
+        for _ in values:
+            pass
+        if isinstance(e, ValueError) and isinstance(total, float):
+            raise
+        rounded = None
+
+    if not isinstance(total, float) or rounded is None:
+        return total
+    return rounded
+
+def raw_moments(values) -> tuple[int, float, float]:
+    '''Retorna el número de valores de una secuencia, su media y la suma de
+    los cuadrados de sus desviaciones respecto a la media, con el algoritmo
+    de Welford, numéricamente estable, en una sola pasada.
+
+    Con NumPy, los buffers de arreglos compactos se recorren una sola vez
+    por bloques de REDUCTION_CHUNK valores. Cada bloque, que cabe en caché,
+    se recorre dos veces (su media y luego sus desviaciones), y sus momentos
+    se combinan con los acumulados (Chan et al.) con la misma estabilidad.
+    '''
+    n, mean, m2 = 0, 0.0, 0.0
+
+    if np is not None and getattr(values, 'typecode', None) in ['q', 'd']:
+        dtype = 'int64' if values.typecode == 'q' else 'float64'
+        data = np.frombuffer(values, dtype=dtype)
+        for start in range(0, len(data), REDUCTION_CHUNK):
+            chunk = data[start:start + REDUCTION_CHUNK]
+            mean_chunk = chunk.mean(dtype=np.float64)
+            deviations = np.subtract(chunk, mean_chunk, dtype=np.float64)
+            n, mean, m2 = merge_moments((n, mean, m2), (len(chunk),
+                float(mean_chunk), float(np.dot(deviations, deviations))))
+        return n, mean, m2
+
+    try:
+        for x in values:
+            n += 1
+            delta = x - mean
+            mean += delta / n
+            m2 += delta * (x - mean)
+    except OverflowError:
+        # Enteros fuera del rango de los flotantes
+        raise StkRuntimeError('No se pueden calcular la media y la varianza '
+            'de números fuera del rango de los flotantes')
+    return n, mean, m2
+
+def merge_moments(a: tuple[int, float, float],
+    b: tuple[int, float, float]) -> tuple[int, float, float]:
+    '''Combina los momentos (número de valores, media y suma de cuadrados de
+    las desviaciones, ver raw_moments) de dos secuencias en los de su
+    concatenación.
     '''
-    return Number(uniform(0, 1))
+    n_a, mean_a, m2_a = a
+    n_b, mean_b, m2_b = b
+    n = n_a + n_b
+    if n == 0:
+        return 0, 0.0, 0.0
 
+    delta = mean_b - mean_a
+    mean = mean_a + delta * n_b / n
+    m2 = m2_a + m2_b + delta * delta * n_a * n_b / n
+    return n, mean, m2
+
+# -------- IMPLEMENTACIONES SOBRE TERMINALES --------
 def stk_floor(x: Number) -> Number:
     '''Retorna el máximo entero menor o igual a x.
     
@@ -52,7 +203,7 @@ def stk_sum(a: Array) -> Number:
     Args:
         l: Arreglo a evaluar.
     '''
-    return sum(a, Number(0))
+    return Number(raw_sum(raw_values(a)))
 
 def stk_avg(a: Array) -> Number:
     '''Retorna la media de los elementos de un arreglo de Number, o 0 si el
@@ -61,11 +212,54 @@ def stk_avg(a: Array) -> Number:
     Args:
         a: Arreglo a evaluar.
     '''
-    return stk_sum(a) / stk_length(a) if a else 0
+    values = raw_values(a)
+    if not values:
+        return Number(0)
+    return Number(raw_sum(values) / len(values))
+
+def stk_min(a: Array) -> Number:
+    '''Retorna el menor de los elementos de un arreglo de Number, o 0 si el
+    arreglo está vacío.
+    
+    Args:
+        a: Arreglo a evaluar.
+    '''
+    values = raw_values(a)
+    return Number(min(values) if values else 0)
+
+def stk_max(a: Array) -> Number:
+    '''Retorna el mayor de los elementos de un arreglo de Number, o 0 si el
+    arreglo está vacío.
+    
+    Args:
+        a: Arreglo a evaluar.
+    '''
+    values = raw_values(a)
+    return Number(max(values) if values else 0)
+
+def stk_var(a: Array) -> Number:
+    '''Retorna la varianza (poblacional) de los elementos de un arreglo de
+    Number, o 0 si el arreglo está vacío.
+    
+    Args:
+        a: Arreglo a evaluar.
+    '''
+    n, mean, m2 = raw_moments(raw_values(a))
+    return Number(m2 / n if n else 0)
+
+def stk_std(a: Array) -> Number:
+    '''Retorna la desviación estándar (poblacional) de los elementos de un
+    arreglo de Number, o 0 si el arreglo está vacío.
+    
+    Args:
+        a: Arreglo a evaluar.
+    '''
+    n, mean, m2 = raw_moments(raw_values(a))
+    return Number(sqrt(m2 / n) if n else 0)
 
 def stk_pi() -> Number:
     '''Retorna el valor de pi en formato de doble precisión (IEEE754).'''
-    return Number(3.141592653589793)
+    return Number(raw_pi())
 
 def stk_now() -> Number:
     '''Retorna un Number correspondiente al los milisegundos transcurridos
@@ -73,7 +267,7 @@ def stk_now() -> Number:
     
     La implementación interna es la de currentmillis.com sugerida para Python.
     '''
-    return Number(int(round(time() * 1000)))
+    return Number(raw_now())
 
 def stk_ln(x: Number) -> Number:
     '''Retorna el logaritmo natural de x.
@@ -81,12 +275,7 @@ def stk_ln(x: Number) -> Number:
     Args:
         x: Número a evaluar.
     '''
-    try:
-        res = Number(log(x.value))
-    except ValueError:
-        raise StkRuntimeError('El logaritmo natural de un número negativo o '
-            'nulo no existe')
-    return res
+    return Number(raw_ln(x.value))
 
 def stk_exp(x: Number) -> Number:
     '''Retorna e elevado a x.
@@ -118,9 +307,4 @@ def stk_sqrt(x: Number) -> Number:
     Args:
         x: Número a evaluar.
     '''
-    try:
-        res = Number(sqrt(x.value))
-    except ValueError:
-        raise StkRuntimeError('No se puede realizar aritmética con números '
-            'complejos')
-    return res
+    return Number(raw_sqrt(x.value))
@@ -0,0 +1,375 @@
+"""Secuencias de baja discrepancia (Sobol y Halton) del modo cuasi-Monte
+Carlo del generador de números aleatorios de Stókhos.
+
+Copyright (C) 2022 Arturo Yepez - Jesus Bandez - Christopher Gómez
+CI3725 - Traductores e Interpretadores
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from typing import Optional
+
+# NumPy es opcional: sin él, cada punto se calcula por separado
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from ..utils.constants import DRAW_STRIDE, QMC_MAX_DIMENSIONS
+
+# Secuencias disponibles para el modo cuasi-Monte Carlo (ver RandomSource)
+QMC_SEQUENCES = ['sobol', 'halton']
+
+# Número de bits de las coordenadas de Sobol: la secuencia se repite cada
+# 2^SOBOL_BITS puntos
+SOBOL_BITS = 32
+SOBOL_MASK = (1 << SOBOL_BITS) - 1
+
+# Número de números de cada llamada que se toman de la secuencia, para las
+# funciones que usan más de uno (ver distributions.py); los siguientes, como
+# los de los rechazos de poisson, son pseudoaleatorios
+QMC_DRAWS = {
+    'normal': 2,
+    'poisson': 2,
+}
+
+# Número máximo de dígitos de las coordenadas de Halton: base^digits no
+# excede 2^HALTON_PRECISION, de modo que se representan exactamente
+HALTON_PRECISION = 53
+
+# Números de dirección iniciales (m_1, ..., m_s) de las dimensiones 1 a 63
+# de Sobol, con s el grado del polinomio primitivo de cada una (Joe y Kuo,
+# 2008). La dimensión 0 es la secuencia de van der Corput en base 2.
+JOE_KUO = (
+    (1,), (1, 3), (1, 3, 1), (1, 1, 1), (1, 1, 3, 3), (1, 3, 5, 13),
+    (1, 1, 5, 5, 17), (1, 1, 5, 5, 5), (1, 1, 7, 11, 19), (1, 1, 5, 1, 1),
+    (1, 1, 1, 3, 11), (1, 3, 5, 5, 31), (1, 3, 3, 9, 7, 49),
+    (1, 1, 1, 15, 21, 21), (1, 3, 1, 13, 27, 49), (1, 1, 1, 15, 7, 5),
+    (1, 3, 1, 15, 13, 25), (1, 1, 5, 5, 19, 61), (1, 3, 7, 11, 23, 15, 103),
+    (1, 3, 7, 13, 13, 15, 69), (1, 1, 3, 13, 7, 35, 63),
+    (1, 3, 5, 9, 1, 25, 53), (1, 3, 1, 13, 9, 35, 107),
+    (1, 3, 1, 5, 27, 61, 31), (1, 1, 5, 11, 19, 41, 61),
+    (1, 3, 5, 3, 3, 13, 69), (1, 1, 7, 13, 1, 19, 1),
+    (1, 3, 7, 5, 13, 19, 59), (1, 1, 3, 9, 25, 29, 41),
+    (1, 3, 5, 13, 23, 1, 55), (1, 3, 7, 3, 13, 59, 17),
+    (1, 3, 1, 3, 5, 53, 69), (1, 1, 5, 5, 23, 33, 13),
+    (1, 1, 7, 7, 1, 61, 123), (1, 1, 7, 9, 13, 61, 49),
+    (1, 3, 3, 5, 3, 55, 33), (1, 3, 1, 15, 31, 13, 49, 245),
+    (1, 3, 5, 15, 31, 59, 63, 97), (1, 3, 1, 11, 11, 11, 77, 249),
+    (1, 3, 1, 11, 27, 43, 71, 9), (1, 1, 7, 15, 21, 11, 81, 45),
+    (1, 3, 7, 3, 25, 31, 65, 79), (1, 3, 1, 1, 19, 11, 3, 205),
+    (1, 1, 5, 9, 19, 21, 29, 157), (1, 3, 7, 11, 1, 33, 89, 185),
+    (1, 3, 3, 3, 15, 9, 79, 71), (1, 3, 7, 11, 15, 39, 119, 27),
+    (1, 1, 3, 1, 11, 31, 97, 225), (1, 1, 1, 3, 23, 43, 57, 177),
+    (1, 3, 7, 7, 17, 17, 37, 71), (1, 3, 1, 5, 27, 63, 123, 213),
+    (1, 1, 3, 5, 11, 43, 53, 133), (1, 3, 5, 5, 29, 17, 47, 173, 479),
+    (1, 3, 3, 11, 3, 1, 109, 9, 69), (1, 1, 1, 5, 17, 39, 23, 5, 343),
+    (1, 3, 1, 5, 25, 15, 31, 103, 499), (1, 1, 1, 11, 11, 17, 63, 105, 183),
+    (1, 1, 5, 11, 9, 29, 97, 231, 363), (1, 1, 5, 15, 19, 45, 41, 7, 383),
+    (1, 3, 7, 7, 31, 19, 83, 137, 221), (1, 1, 1, 3, 23, 15, 111, 223, 83),
+    (1, 1, 5, 13, 31, 15, 55, 25, 161), (1, 1, 3, 13, 25, 47, 39, 87, 257),
+)
+
+# Polinomios primitivos sobre GF(2) en orden creciente (cada bit es un
+# coeficiente), números primos y números de dirección de Sobol calculados
+# hasta ahora; se extienden a medida que se piden más dimensiones
+polynomials = [1]
+primes = [2]
+directions = {}
+
+def formula_dimensions(sites: list[tuple[int, str]],
+    first_site: int) -> tuple[dict, int]:
+    '''Retorna las dimensiones de las llamadas con números aleatorios de
+    una fórmula muestreada, dados sus pares de sitio y nombre de función
+    (ver resolve_sites): el diccionario con la columna de cada sitio
+    relativo (el sitio menos first_site), numeradas desde 0 en orden, y el
+    número de números de cada llamada que se toman de la secuencia (ver
+    QMC_DRAWS). Las llamadas validadas antes del último reinicio del
+    generador no tienen columna.
+    '''
+    columns, draws = {}, 1
+    for site, name in sites:
+        if site > first_site:
+            columns[site - first_site] = len(columns)
+            draws = max(draws, QMC_DRAWS.get(name, 1))
+    return columns, draws
+
+def qmc_dimension(key: int, lane: int, columns: dict,
+    draws: int) -> Optional[int]:
+    '''Retorna la dimensión de la secuencia de baja discrepancia que usa el
+    número de la llamada con sitio relativo key (ver RandomSource.draw) en
+    el carril lane, con las columnas y el número de números por llamada de
+    la fórmula muestreada (ver formula_dimensions), o None si usa un número
+    pseudoaleatorio.
+
+    Las dimensiones de una fórmula son densas: las de su carril raíz (ver
+    child_lane) son primero las de los primeros números de cada llamada, en
+    orden de columna, luego las de los segundos, y así; las de cada
+    elemento de arreglo siguen a las del carril anterior. Así, una fórmula
+    con k llamadas a uniform usa las dimensiones 0 a k - 1 sin importar
+    cuántas otras llamadas se hayan validado antes. Los números a partir del
+    draws-ésimo de una llamada, los carriles de arreglos anidados y las
+    dimensiones a partir de QMC_MAX_DIMENSIONS usan números
+    pseudoaleatorios.
+    '''
+    j, site = divmod(key, DRAW_STRIDE)
+    column = columns.get(site)
+    if key <= 0 or column is None or j >= draws or lane >= QMC_MAX_DIMENSIONS:
+        return None
+    dim = (lane * draws + j) * len(columns) + column
+    return dim if dim < QMC_MAX_DIMENSIONS else None
+
+# -------- SECUENCIA DE SOBOL --------
+def polynomial_mod(a: int, b: int, poly: int, degree: int) -> int:
+    '''Retorna a * b módulo poly, polinomios sobre GF(2) de grado menor al
+    de poly (degree).
+    '''
+    result = 0
+    while b:
+        if b & 1:
+            result ^= a
+        b >>= 1
+        a <<= 1
+        if a >> degree & 1:
+            a ^= poly
+    return result
+
+def is_primitive(poly: int) -> bool:
+    '''Indica si el polinomio poly sobre GF(2) es primitivo: si x tiene
+    orden 2^s - 1 módulo poly, con s su grado.
+    '''
+    degree = poly.bit_length() - 1
+    order = (1 << degree) - 1
+    if degree == 1:
+        return poly == 3
+
+    # Los polinomios con un número par de términos son divisibles entre x + 1
+    if bin(poly).count('1') % 2 == 0:
+        return False
+
+    # squares[i] es x^(2^i) módulo poly: x^(2^s - 1) = 1 si x^(2^s) = x
+    squares = [2]
+    for _ in range(degree):
+        squares.append(polynomial_mod(squares[-1], squares[-1], poly,
+            degree))
+    if squares.pop() != 2:
+        return False
+
+    def power(e: int) -> int:
+        result = 1
+        for i, square in enumerate(squares):
+            if e >> i & 1:
+                result = polynomial_mod(result, square, poly, degree)
+        return result
+
+    factors, n, q = set(), order, 3
+    while q * q <= n:
+        while n % q == 0:
+            factors.add(q)
+            n //= q
+        q += 2
+    if n > 1:
+        factors.add(n)
+    return all(power(order // q) != 1 for q in factors)
+
+def fmix32(h: int) -> int:
+    '''Función de mezcla final de MurmurHash3: una biyección de los enteros
+    de 32 bits en la que cada bit de la entrada afecta a todos los de la
+    salida.
+    '''
+    h = ((h ^ (h >> 16)) * 0x85EBCA6B) & SOBOL_MASK
+    h = ((h ^ (h >> 13)) * 0xC2B2AE35) & SOBOL_MASK
+    return h ^ (h >> 16)
+
+def sobol_directions(dim: int) -> tuple[int, ...]:
+    '''Retorna los SOBOL_BITS números de dirección de la dimensión dim de
+    Sobol, con el primer dígito binario en el bit más significativo.
+
+    Las dimensiones sin números iniciales en JOE_KUO los toman de fmix32
+    (cualquier m_k impar y menor que 2^k es válido): como los de Joe y Kuo,
+    no dependen de la semilla.
+    '''
+    if dim in directions:
+        return directions[dim]
+
+    while len(polynomials) <= dim:
+        poly = polynomials[-1] + 2
+        while not is_primitive(poly):
+            poly += 2
+        polynomials.append(poly)
+
+    poly = polynomials[dim]
+    degree = poly.bit_length() - 1
+    if dim == 0:
+        m = [1] * SOBOL_BITS
+    elif dim <= len(JOE_KUO):
+        m = list(JOE_KUO[dim - 1])
+    else:
+        m = [2 * (fmix32(dim << 5 | k) >> (SOBOL_BITS + 1 - k)) + 1
+            for k in range(1, degree + 1)]
+
+    # Recurrencia de los números de dirección con los coeficientes
+    # intermedios del polinomio
+    for k in range(degree, SOBOL_BITS):
+        value = m[k - degree] ^ (m[k - degree] << degree)
+        for i in range(1, degree):
+            if poly >> (degree - i) & 1:
+                value ^= m[k - i] << i
+        m.append(value)
+
+    directions[dim] = tuple(m[k] << (SOBOL_BITS - 1 - k)
+        for k in range(SOBOL_BITS))
+    return directions[dim]
+
+def scramble_directions(vectors: tuple[int, ...],
+    rows: list[int]) -> tuple[int, ...]:
+    '''Retorna los números de dirección vectors multiplicados por una matriz
+    binaria triangular inferior con unos en la diagonal (el revuelto lineal
+    de Matoušek), cuyas filas son los bits por encima de la diagonal de
+    cada entero de rows.
+    '''
+    matrix = []
+    for i, row in enumerate(rows):
+        above = (SOBOL_MASK << (SOBOL_BITS - i)) & SOBOL_MASK
+        matrix.append((row & above) | 1 << (SOBOL_BITS - 1 - i))
+
+    scrambled = []
+    for v in vectors:
+        value = 0
+        for i, row in enumerate(matrix):
+            if bin(row & v).count('1') & 1:
+                value |= 1 << (SOBOL_BITS - 1 - i)
+        scrambled.append(value)
+    return tuple(scrambled)
+
+def sobol_uniform(vectors: tuple[int, ...], shift: int, index: int,
+    tail: int) -> float:
+    '''Retorna la coordenada del punto index de la secuencia de Sobol con
+    números de dirección vectors, desplazada con XOR por shift. Los bits
+    por debajo de SOBOL_BITS se toman de tail, un entero aleatorio de 64
+    bits.
+    '''
+    x = shift
+    index &= SOBOL_MASK
+    k = 0
+    while index:
+        if index & 1:
+            x ^= vectors[k]
+        index >>= 1
+        k += 1
+    return ((x << (53 - SOBOL_BITS)) | (tail >> (11 + SOBOL_BITS))) \
+        * 2.0 ** -53
+
+# -------- SECUENCIA DE HALTON --------
+def nth_prime(n: int) -> int:
+    '''Retorna el n-ésimo número primo (desde 0), la base de la dimensión n
+    de Halton.
+    '''
+    candidate = primes[-1]
+    while len(primes) <= n:
+        candidate += 1
+        if all(candidate % p for p in primes if p * p <= candidate):
+            primes.append(candidate)
+    return primes[n]
+
+def halton_digits(base: int) -> int:
+    '''Retorna el número de dígitos de las coordenadas de Halton en base
+    base: el máximo k con base^k <= 2^HALTON_PRECISION.
+    '''
+    digits = 0
+    while base ** (digits + 1) <= 1 << HALTON_PRECISION:
+        digits += 1
+    return digits
+
+def halton_uniform(base: int, multiplier: int, shifts: tuple[int, ...],
+    index: int, tail: int) -> float:
+    '''Retorna la coordenada del punto index de la secuencia de Halton en
+    base base, cuyo dígito k-ésimo d se revuelve como (multiplier * d +
+    shifts[k]) mod base. La fracción por debajo del último dígito se toma
+    de tail, un entero aleatorio de 64 bits.
+    '''
+    size = base ** len(shifts)
+    index %= size
+    weight = size // base
+    n = 0
+    for shift in shifts:
+        n += (multiplier * (index % base) + shift) % base * weight
+        index //= base
+        weight //= base
+    return min((n + (tail >> 11) * 2.0 ** -53) / size, 1 - 2.0 ** -53)
+
+# -------- IMPLEMENTACIONES SOBRE ARREGLOS DE NUMPY --------
+
+# Reciben un arreglo por parámetro de las funciones anteriores, con un valor
+# por coordenada (los de cada dimensión se repiten), y producen los mismos
+# resultados
+if np is not None:
+    def qmc_dimension_array(key: int, lanes: np.ndarray, columns: dict,
+        draws: int) -> np.ndarray:
+        '''qmc_dimension sobre un arreglo de carriles, con -1 en lugar de
+        None.
+        '''
+        dims = np.full(len(lanes), -1, dtype=np.int64)
+        j, site = divmod(key, DRAW_STRIDE)
+        column = columns.get(site)
+        if key <= 0 or column is None or j >= draws:
+            return dims
+
+        small = lanes < np.uint64(QMC_MAX_DIMENSIONS)
+        lane = lanes[small].astype(np.int64)
+        dim = (lane * draws + j) * len(columns) + column
+        dims[small] = np.where(dim < QMC_MAX_DIMENSIONS, dim, -1)
+        return dims
+
+    def sobol_uniform_array(vectors: np.ndarray, shifts: np.ndarray,
+        indices: np.ndarray, tails: np.ndarray) -> np.ndarray:
+        x = np.zeros(len(indices), dtype=np.uint64) ^ shifts
+        indices = indices & np.uint64(SOBOL_MASK)
+        first = int(indices[0])
+        if (indices == first).all():
+            # Coordenadas de un mismo punto (como los elementos de un
+            # arreglo): se combinan los números de dirección de sus bits
+            bits = [k for k in range(first.bit_length()) if first >> k & 1]
+            if bits:
+                x ^= np.bitwise_xor.reduce(vectors[:, bits], axis=1)
+        else:
+            for k in range(int(indices.max()).bit_length()):
+                x ^= vectors[:, k] \
+                    * ((indices >> np.uint64(k)) & np.uint64(1))
+        x = (x << np.uint64(53 - SOBOL_BITS)) \
+            | (tails >> np.uint64(11 + SOBOL_BITS))
+        return x.astype(np.float64) * 2.0 ** -53
+
+    def halton_uniform_array(bases: np.ndarray, multipliers: np.ndarray,
+        shifts: np.ndarray, sizes: np.ndarray, indices: np.ndarray,
+        tails: np.ndarray) -> np.ndarray:
+        # Las filas de shifts se completan con ceros: el peso de los dígitos
+        # después del último de cada base es 0. Los dígitos más allá de los
+        # del mayor índice son 0, y su aporte no depende del índice.
+        index = indices % sizes
+        weight = sizes // bases
+        used = int(index.max(initial=0)).bit_length()
+        n = np.zeros(len(indices), dtype=np.uint64)
+        constant = np.zeros(len(bases), dtype=np.uint64)
+        for k in range(shifts.shape[1]):
+            if k < used:
+                n += (multipliers * (index % bases) + shifts[:, k]) \
+                    % bases * weight
+                index //= bases
+            else:
+                constant += shifts[:, k] % bases * weight
+            weight //= bases
+        n += constant
+        fraction = (tails >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+        values = (n.astype(np.float64) + fraction) / sizes.astype(np.float64)
+        return np.minimum(values, 1 - 2.0 ** -53)
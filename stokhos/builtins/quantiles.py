@@ -0,0 +1,92 @@
+"""Estimación de cuantiles de secuencias de números en memoria acotada.
+
+Copyright (C) 2022 Arturo Yepez - Jesus Bandez - Christopher Gómez
+CI3725 - Traductores e Interpretadores
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from ..utils.constants import QUANTILE_CAPACITY
+
+class QuantileSketch:
+    '''Resumen de una secuencia de números que permite estimar sus cuantiles
+    sin guardarlos todos: un compactador por niveles determinista (como el
+    de KLL). Cada valor del nivel h representa 2^h valores de la secuencia.
+
+    Cuando un nivel acumula más de capacity valores, se ordenan y se
+    promueve al nivel siguiente uno de cada dos (alternando entre los de
+    posición par e impar en compactaciones sucesivas). Una compactación
+    del nivel h cambia el rango de cualquier valor en a lo sumo 2^h, por lo
+    que el rango estimado difiere del real en a lo sumo rank_error() <=
+    n * H / capacity, donde H es el número de niveles compactados (cerca de
+    log2(n / capacity)). Con n <= capacity los cuantiles son exactos.
+
+    La memoria usada es de a lo sumo capacity valores por nivel.
+    '''
+    def __init__(self, capacity: int = QUANTILE_CAPACITY):
+        self.capacity = capacity
+        self.levels = [[]]
+        self.compactions = [0]
+        self.n = 0
+
+    def extend(self, values: list):
+        '''Agrega una porción de valores a la secuencia resumida. Lanza
+        ValueError si alguno es nan, que no tiene un orden (como los
+        histogramas, que no lo pueden asignar a un bucket).
+        '''
+        if any(v != v for v in values):
+            raise ValueError('nan no se puede ordenar')
+        self.n += len(values)
+        self.levels[0].extend(values)
+        self.compact()
+
+    def compact(self):
+        '''Compacta los niveles que exceden la capacidad.'''
+        for h, level in enumerate(self.levels):
+            if len(level) <= self.capacity:
+                continue
+
+            # Con un número impar de valores, el mayor se queda en el nivel
+            level.sort()
+            kept = [level.pop()] if len(level) % 2 else []
+            promoted = level[self.compactions[h] % 2::2]
+            self.compactions[h] += 1
+            self.levels[h] = kept
+
+            if h + 1 == len(self.levels):
+                self.levels.append([])
+                self.compactions.append(0)
+            self.levels[h + 1].extend(promoted)
+
+    def rank_error(self) -> int:
+        '''Retorna la cota del error del rango estimado de cualquier valor.'''
+        return sum(c << h for h, c in enumerate(self.compactions))
+
+    def quantiles(self, probabilities: list) -> list:
+        '''Retorna el cuantil estimado de cada probabilidad entre 0 y 1: el
+        menor valor cuyo rango (número de valores menores o iguales) es al
+        menos p * n. Requiere que la secuencia no esté vacía.
+        '''
+        items = sorted((v, 1 << h) for h, level in enumerate(self.levels)
+            for v in level)
+
+        results = []
+        for p in probabilities:
+            target = p * self.n
+            rank = 0
+            for value, weight in items:
+                rank += weight
+                if rank >= target:
+                    break
+            results.append(value)
+        return results
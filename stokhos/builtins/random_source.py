@@ -0,0 +1,510 @@
+"""Generador de números aleatorios de cada VM de Stókhos.
+
+Copyright (C) 2022 Arturo Yepez - Jesus Bandez - Christopher Gómez
+CI3725 - Traductores e Interpretadores
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import sys
+from array import array
+from random import SystemRandom
+
+# NumPy es opcional: sin él, los bloques de números se calculan en Python
+try:
+    import numpy as np
+except ImportError:
+    np = None
+else:
+    from .distributions import VECTOR_DISTRIBUTIONS
+    from .low_discrepancy import (halton_uniform_array, qmc_dimension_array,
+        sobol_uniform_array)
+
+from ..AST import Boolean, Number
+from ..utils.constants import DRAW_STRIDE, MAX_SITE_BLOCKS, UNIFORM_BLOCK
+from ..utils.custom_exceptions import StkRuntimeError
+from .distributions import DISTRIBUTIONS
+from .low_discrepancy import (QMC_SEQUENCES, formula_dimensions,
+    halton_digits, halton_uniform, nth_prime, qmc_dimension,
+    scramble_directions, sobol_directions, sobol_uniform)
+
+# Aritmética de SplitMix64, módulo 2^64
+MASK = (1 << 64) - 1
+GOLDEN = 0x9E3779B97F4A7C15
+MIX_1 = 0xBF58476D1CE4E5B9
+MIX_2 = 0x94D049BB133111EB
+
+def mix(z: int) -> int:
+    '''Función de mezcla de SplitMix64: una biyección de los enteros de 64
+    bits cuyos resultados, para entradas consecutivas, son indistinguibles
+    de números aleatorios.
+    '''
+    z = ((z ^ (z >> 30)) * MIX_1) & MASK
+    z = ((z ^ (z >> 27)) * MIX_2) & MASK
+    return z ^ (z >> 31)
+
+def child_lane(lane: int, i: int) -> int:
+    '''Retorna el carril del elemento i de un arreglo evaluado en el carril
+    lane. Los carriles de elementos consecutivos son consecutivos.
+    '''
+    return (lane * GOLDEN + i + 1) & MASK
+
+def counter_uniform(seed: int, site: int, cycle: int, lane: int) -> float:
+    '''Retorna el número aleatorio entre 0 y 1 de la llamada a uniform con
+    sitio site en el ciclo de cómputo cycle y el carril lane, con la semilla
+    seed. Es una función pura: no depende de los números calculados antes.
+    '''
+    key = mix(mix((seed + site * GOLDEN) & MASK) ^ lane)
+    return (mix((key + (cycle + 1) * GOLDEN) & MASK) >> 11) * 2.0 ** -53
+
+def packed_constants(size: int) -> tuple[int, int, int]:
+    '''Retorna las constantes de counter_uniform_block para bloques de size
+    valores, empaquetados en ranuras de 128 bits de un entero: el entero con
+    un 1 en cada ranura, el que tiene MASK en cada una y el que tiene el
+    índice de la ranura en cada una.
+    '''
+    constants = PACKED_CONSTANTS.get(size)
+    if constants is None:
+        ones = int.from_bytes((b'\x01' + bytes(15)) * size, 'little')
+        steps = int.from_bytes(b''.join(i.to_bytes(16, 'little')
+            for i in range(size)), 'little')
+        if len(PACKED_CONSTANTS) >= MAX_SITE_BLOCKS:
+            PACKED_CONSTANTS.clear()
+        constants = PACKED_CONSTANTS[size] = (ones, MASK * ones, steps)
+    return constants
+
+PACKED_CONSTANTS = {}
+
+def mix_packed(z: int, lanes: int) -> int:
+    '''mix sobre valores de 64 bits empaquetados en ranuras de 128 bits de
+    un entero, donde lanes tiene MASK en cada ranura. Los productos caben en
+    su ranura, y los bits que se desplazan desde la ranura siguiente quedan
+    en la mitad alta, que se descarta.
+    '''
+    z = ((z ^ (z >> 30)) & lanes) * MIX_1 & lanes
+    z = ((z ^ (z >> 27)) & lanes) * MIX_2 & lanes
+    return (z ^ (z >> 31)) & lanes
+
+def counter_uniform_block(seed: int, site: int, cycle: int, lane: int,
+    size: int, by_lane: bool) -> list[float]:
+    '''counter_uniform en size ciclos consecutivos a partir de cycle (o
+    carriles consecutivos a partir de lane, si by_lane), con los mismos
+    resultados. Es la versión sin NumPy del cálculo por bloques: los
+    contadores del bloque se empaquetan en un solo entero y se mezclan a la
+    vez con mix_packed, con unas pocas operaciones sobre enteros grandes.
+    '''
+    ones, lanes, steps = packed_constants(size)
+    base = mix((seed + site * GOLDEN) & MASK)
+
+    if by_lane:
+        z = mix_packed((lane * ones + steps) ^ (base * ones), lanes)
+        z = mix_packed((z + ((cycle + 1) * GOLDEN & MASK) * ones) & lanes,
+            lanes)
+    else:
+        key = mix(base ^ lane)
+        z = mix_packed((((key + (cycle + 1) * GOLDEN) & MASK) * ones
+            + GOLDEN * steps) & lanes, lanes)
+
+    # Los 64 bits bajos de cada ranura son el valor, y los altos son cero
+    words = array('Q', (z >> 11).to_bytes(16 * size, 'little'))
+    if sys.byteorder == 'big':
+        words.byteswap()
+    scale = 2.0 ** -53
+    return [x * scale for x in words[::2]]
+
+if np is not None:
+    def mix_array(z: np.ndarray) -> np.ndarray:
+        '''mix sobre un arreglo de NumPy de enteros de 64 bits sin signo.'''
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(MIX_1)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(MIX_2)
+        return z ^ (z >> np.uint64(31))
+
+    def counter_uniform_array(seed: int, site: int, cycles: object,
+        lanes: object) -> np.ndarray:
+        '''counter_uniform elemento a elemento sobre arreglos de ciclos y
+        carriles (o enteros, que se repiten), con los mismos resultados.
+        '''
+        cycles = np.atleast_1d(np.asarray(cycles, dtype=np.uint64))
+        lanes = np.atleast_1d(np.asarray(lanes, dtype=np.uint64))
+
+        base = mix((seed + site * GOLDEN) & MASK)
+        key = mix_array(np.uint64(base) ^ lanes)
+        z = mix_array(key + (cycles + np.uint64(1)) * np.uint64(GOLDEN))
+        return (z >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+class RandomSource:
+    '''Generador de números aleatorios propio de una tabla de símbolos (y
+    por lo tanto de una VM), independiente del módulo random y de las demás
+    VM del proceso.
+
+    Es un generador basado en contadores (como SplitMix64): el número de
+    cada llamada a uniform es una función pura de la semilla, el sitio de la
+    llamada (un identificador asignado al validarla), el ciclo de cómputo y
+    el carril (el elemento de arreglo en evaluación, ver child_lane), y no
+    del orden en que se evalúan las llamadas. Así, evaluar las muestras de
+    histogram o los elementos de array uno a uno, en lote o repartidos entre
+    procesos produce exactamente los mismos números.
+
+    Los sitios se cuentan a partir del último reinicio del generador, de
+    modo que un programa ejecutado tras seed(n) produce los mismos números
+    que en una VM nueva con la semilla n; las llamadas validadas antes del
+    reinicio conservan sitios distintos a los nuevos.
+
+    Los números de un sitio que avanza por ciclos (como en las muestras de
+    histogram) o por carriles (como en los elementos de array) se calculan
+    por bloques, de hasta block valores, y se sirven desde un buffer por
+    sitio (en cycle_blocks o lane_blocks, respectivamente). Con NumPy, cada
+    bloque se calcula en lote; sin él, con counter_uniform_block.
+
+    En el modo cuasi-Monte Carlo (ver set_sequence), los números de las
+    fórmulas muestreadas (por histogram, stats y quantile) se toman de una
+    secuencia de baja discrepancia revuelta (Sobol o Halton): el punto es
+    el ciclo de cómputo, y la dimensión depende de la posición del sitio
+    entre los de la fórmula y del carril (ver set_dimensions), de modo que
+    las muestras sucesivas de una fórmula cubren el espacio de forma más
+    uniforme que con números pseudoaleatorios. Fuera de las fórmulas
+    muestreadas se usan números pseudoaleatorios. El revuelto depende de la
+    semilla, y los números siguen siendo funciones puras de la semilla, el
+    sitio, el ciclo, el carril y la fórmula muestreada.
+
+    Args:
+        table: Tabla de símbolos con el ciclo de cómputo y el carril.
+        seed: Semilla inicial, o None para tomarla del sistema operativo.
+        block: Número máximo de valores calculados por bloque.
+    '''
+    def __init__(self, table, seed: int = None, block: int = UNIFORM_BLOCK):
+        self.table = table
+        self.block = block
+        self.cycle_blocks = {}
+        self.lane_blocks = {}
+        self.sequence = None
+        self.dimensions = None
+        self.scrambles = {}
+        self.scramble_rows = {}
+        self.seed(seed)
+
+    def seed(self, seed: int = None):
+        '''Reinicia el generador con la semilla indicada (o una del sistema
+        operativo si es None) y descarta los bloques calculados.
+        '''
+        if seed is None:
+            seed = SystemRandom().getrandbits(64)
+        self.seed_value = seed & MASK
+        self.first_site = self.table.sites
+        self.clear_blocks()
+        self.scrambles.clear()
+        self.scramble_rows.clear()
+
+    def set_sequence(self, sequence: str = None):
+        '''Selecciona la secuencia de baja discrepancia del modo cuasi-Monte
+        Carlo (una de QMC_SEQUENCES), o None para usar números
+        pseudoaleatorios, y descarta los bloques calculados.
+
+        En caso de no existir la secuencia indicada, lanza una excepción
+        ValueError.
+        '''
+        if sequence is not None and sequence not in QMC_SEQUENCES:
+            raise ValueError(f'Secuencia "{sequence}" inexistente')
+
+        self.sequence = sequence
+        self.dimensions = None
+        self.clear_blocks()
+        self.scrambles.clear()
+        self.scramble_rows.clear()
+
+    def set_dimensions(self, dimensions: tuple = None):
+        '''Selecciona las dimensiones de la secuencia de baja discrepancia
+        que usan las llamadas de la fórmula muestreada (ver
+        formula_dimensions y qmc_dimension), o None fuera de las fórmulas
+        muestreadas, y descarta los bloques calculados si cambian.
+        '''
+        if dimensions is not self.dimensions:
+            self.dimensions = dimensions
+            self.clear_blocks()
+
+    def sample_dimensions(self, sites: list[tuple[int, str]]) -> tuple:
+        '''Retorna las dimensiones de una fórmula muestreada con las llamadas
+        de los sitios indicados (ver resolve_sites), con sitios relativos al
+        último reinicio del generador.
+        '''
+        return formula_dimensions(sites, self.first_site)
+
+    def uniform(self, site: int = 0) -> float:
+        '''Retorna el número aleatorio entre 0 y 1 de la llamada con sitio
+        site en el ciclo y carril actuales. Las llamadas de AST sin validar
+        comparten el sitio 0.
+        '''
+        table = self.table
+
+        # El caso más común, las muestras sucesivas de un sitio en un mismo
+        # carril, se revisa primero
+        block = self.cycle_blocks.get(site)
+        if block is not None:
+            lane, start, values = block
+            if lane == table.lane and table.cycle >= start:
+                try:
+                    return values[table.cycle - start]
+                except IndexError:
+                    # El ciclo está después del bloque calculado
+                    pass
+        else:
+            block = self.lane_blocks.get(site)
+            if block is not None:
+                cycle, start, values = block
+                if cycle == table.cycle and table.lane >= start:
+                    try:
+                        return values[table.lane - start]
+                    except IndexError:
+                        pass
+        return self.refill(site, table.cycle, table.lane)
+
+    def refill(self, site: int, cycle: int, lane: int) -> float:
+        '''Calcula el número de la llamada con sitio site en el ciclo y
+        carril indicados. Si la llamada anterior del sitio fue en el mismo
+        carril y un ciclo previo, o en el mismo ciclo y un carril previo, se
+        calcula un bloque con los números de los siguientes ciclos o
+        carriles, respectivamente, del doble de tamaño que el anterior.
+        '''
+        by_lane, size = False, 1
+        block = self.cycle_blocks.pop(site, None)
+        if block is not None:
+            last_lane, last_cycle, values = block
+        else:
+            block = self.lane_blocks.pop(site, None)
+            if block is not None:
+                last_cycle, last_lane, values = block
+        if block is not None:
+            if lane == last_lane and cycle > last_cycle:
+                size = min(2 * len(values), self.block)
+            elif cycle == last_cycle and lane > last_lane:
+                by_lane, size = True, min(2 * len(values), self.block,
+                    MASK - lane + 1)
+
+        key = site - self.first_site
+        if size == 1:
+            values = [self.draw(key, cycle, lane)]
+        else:
+            values = self.draw_block(key, cycle, lane, size, by_lane)
+
+        # Los bloques de sitios que ya no se usan no se acumulan
+        if len(self.cycle_blocks) + len(self.lane_blocks) >= MAX_SITE_BLOCKS:
+            self.clear_blocks()
+        if by_lane:
+            self.lane_blocks[site] = (cycle, lane, values)
+        else:
+            self.cycle_blocks[site] = (lane, cycle, values)
+        return values[0]
+
+    def clear_blocks(self):
+        '''Descarta los bloques calculados.'''
+        self.cycle_blocks.clear()
+        self.lane_blocks.clear()
+
+    def uniform_array(self, site: int, cycles: object, lanes: object,
+        j: int = 0) -> 'np.ndarray':
+        '''Retorna un arreglo de NumPy con el número j-ésimo de la llamada
+        con sitio site en cada par de ciclo y carril (para el motor
+        vectorizado, que requiere NumPy).
+        '''
+        return self.draw_array(site - self.first_site + j * DRAW_STRIDE,
+            cycles, lanes)
+
+    def draw(self, key: int, cycle: int, lane: int) -> float:
+        '''Retorna el número de la llamada con sitio relativo key (el sitio
+        menos first_site) en el ciclo y carril indicados: el de
+        counter_uniform o, en el modo cuasi-Monte Carlo, una coordenada de
+        la secuencia de baja discrepancia.
+        '''
+        if self.dimensions is not None:
+            dim = qmc_dimension(key, lane, *self.dimensions)
+            if dim is not None:
+                tail_key, *scramble = self.scramble(dim)
+                tail = mix((tail_key + (cycle + 1) * GOLDEN) & MASK)
+                if self.sequence == 'sobol':
+                    return sobol_uniform(*scramble, cycle, tail)
+                return halton_uniform(*scramble, cycle, tail)
+        return counter_uniform(self.seed_value, key, cycle, lane)
+
+    def draw_block(self, key: int, cycle: int, lane: int, size: int,
+        by_lane: bool) -> list[float]:
+        '''Retorna los números de la llamada con sitio relativo key en size
+        ciclos consecutivos a partir de cycle (o carriles consecutivos a
+        partir de lane, si by_lane), como en draw.
+        '''
+        if np is not None:
+            steps = np.arange(size, dtype=np.uint64)
+            if by_lane:
+                return self.draw_array(key, cycle,
+                    np.uint64(lane) + steps).tolist()
+            return self.draw_array(key, np.uint64(cycle) + steps,
+                lane).tolist()
+
+        if self.dimensions is None:
+            return counter_uniform_block(self.seed_value, key, cycle, lane,
+                size, by_lane)
+        if by_lane:
+            return [self.draw(key, cycle, lane + i) for i in range(size)]
+        return [self.draw(key, cycle + i, lane) for i in range(size)]
+
+    def draw_array(self, key: int, cycles: object,
+        lanes: object) -> 'np.ndarray':
+        '''draw elemento a elemento sobre arreglos de ciclos y carriles (o
+        enteros, que se repiten), con los mismos resultados.
+        '''
+        if self.dimensions is None:
+            return counter_uniform_array(self.seed_value, key, cycles, lanes)
+
+        cycles, lanes = np.broadcast_arrays(
+            np.atleast_1d(np.asarray(cycles, dtype=np.uint64)),
+            np.atleast_1d(np.asarray(lanes, dtype=np.uint64)))
+        dims = qmc_dimension_array(key, lanes, *self.dimensions)
+        quasi = dims >= 0
+        if quasi.all():
+            return self.quasi_uniform_array(dims, cycles)
+
+        values = counter_uniform_array(self.seed_value, key, cycles, lanes)
+        if quasi.any():
+            values[quasi] = self.quasi_uniform_array(dims[quasi],
+                cycles[quasi])
+        return values
+
+    def quasi_uniform_array(self, dims: 'np.ndarray',
+        cycles: 'np.ndarray') -> 'np.ndarray':
+        '''Retorna las coordenadas de las dimensiones dims de los puntos
+        cycles de la secuencia en uso (como en draw).
+        '''
+        # Los parámetros se calculan una vez por dimensión (las muestras de
+        # histogram usan todas la misma) y se guardan por arreglo de
+        # dimensiones distintas, que se repite en bloques sucesivos
+        inverse = None
+        if (dims == dims[0]).all():
+            dims = dims[:1]
+        elif not (np.diff(dims) > 0).all():
+            dims, inverse = np.unique(dims, return_inverse=True)
+
+        rows = self.scramble_rows.get(dims.tobytes())
+        if rows is None:
+            scrambles = [self.scramble(dim) for dim in dims.tolist()]
+            rows = [np.array([s[i] for s in scrambles], dtype=np.uint64)
+                for i in (0, 1, 2)]
+            if self.sequence == 'halton':
+                width = max(len(s[3]) for s in scrambles)
+                rows.append(np.array([s[3] + (0,) * (width - len(s[3]))
+                    for s in scrambles], dtype=np.uint64))
+                rows.append(rows[1] ** np.array([len(s[3])
+                    for s in scrambles], dtype=np.uint64))
+            if len(self.scramble_rows) >= MAX_SITE_BLOCKS:
+                self.scramble_rows.clear()
+            self.scramble_rows[dims.tobytes()] = rows
+        if inverse is not None:
+            rows = [row[inverse] for row in rows]
+
+        tail_keys, *params = rows
+        tails = mix_array(tail_keys
+            + (cycles + np.uint64(1)) * np.uint64(GOLDEN))
+        if self.sequence == 'sobol':
+            return sobol_uniform_array(*params, cycles, tails)
+        return halton_uniform_array(*params, cycles, tails)
+
+    def scramble(self, dim: int) -> tuple:
+        '''Retorna los parámetros del revuelto de la dimensión dim de la
+        secuencia en uso, derivados de la semilla: la llave de los bits
+        aleatorios por debajo de la precisión de la secuencia y, para Sobol,
+        los números de dirección revueltos (ver scramble_directions) y el
+        desplazamiento digital, o para Halton, la base, el multiplicador y
+        el desplazamiento de cada dígito.
+        '''
+        params = self.scrambles.get(dim)
+        if params is not None:
+            return params
+
+        key = mix(mix((self.seed_value + dim * GOLDEN) & MASK) ^ MASK)
+        bits = [mix((key + i * GOLDEN) & MASK) for i in range(34)]
+        if self.sequence == 'sobol':
+            vectors = scramble_directions(sobol_directions(dim),
+                [b >> 32 for b in bits[1:33]])
+            params = (bits[0], vectors, bits[33] >> 32)
+        else:
+            base = nth_prime(dim)
+            digits = halton_digits(base)
+            bits += [mix((key + i * GOLDEN) & MASK)
+                for i in range(34, digits + 2)]
+            params = (bits[0], base, 1 + bits[1] % (base - 1),
+                tuple(b % base for b in bits[2:digits + 2]))
+
+        self.scrambles[dim] = params
+        return params
+
+    def sample(self, sampler: callable, site: int, *params) -> object:
+        '''Retorna una muestra de la distribución sampler (ver
+        distributions.py) en la llamada con sitio site, en el ciclo y carril
+        actuales. Las llamadas que usan varios números toman el j-ésimo del
+        sitio site + j * DRAW_STRIDE, de modo que el primero es el mismo que
+        el de uniform.
+        '''
+        return sampler(self.uniform, site, *params)
+
+    def sample_at(self, sampler: callable, site: int, cycle: int, lane: int,
+        *params) -> object:
+        '''Como sample, en el ciclo y carril indicados.'''
+        first_site = self.first_site
+        return sampler(lambda site: self.draw(site - first_site, cycle,
+            lane), site, *params)
+
+    def sample_array(self, name: str, site: int, cycles: object,
+        lanes: object, n: int, *params) -> tuple:
+        '''Retorna las muestras de la distribución name en n carriles con
+        los ciclos y carriles indicados, y la máscara de carriles con
+        parámetros inválidos (ver VECTOR_DISTRIBUTIONS).
+        '''
+        def draw(j: int) -> np.ndarray:
+            values = self.uniform_array(site, cycles, lanes, j)
+            return np.broadcast_to(values, (n,))
+
+        return VECTOR_DISTRIBUTIONS[name](draw, *params)
+
+    def samplers(self, name: str) -> tuple[callable, callable]:
+        '''Retorna las implementaciones sobre terminales y sobre valores
+        nativos de la distribución name, enlazadas a este generador.
+        '''
+        sampler = DISTRIBUTIONS[name][0]
+        uniform = self.uniform
+
+        # Igual que sample, sin la llamada intermedia
+        def raw(site: int, *params) -> object:
+            return sampler(uniform, site, *params)
+
+        def stk(site: int, *params: Number) -> Number:
+            return Number(self.sample(sampler, site,
+                *[param.value for param in params]))
+
+        raw.__name__, stk.__name__ = name, f'stk_{name}'
+        return stk, raw
+
+    # -------- IMPLEMENTACIONES SOBRE TERMINALES --------
+    def stk_uniform(self, site: int = 0) -> Number:
+        '''Retorna un número aleatorio entre 0 y 1.'''
+        return Number(self.uniform(site))
+
+    def stk_seed(self, n: Number) -> Boolean:
+        '''Reinicia el generador con la semilla n, un entero no negativo.
+
+        Args:
+            n: Semilla del generador.
+        '''
+        if n.value < 0 or n.value % 1 != 0:
+            raise StkRuntimeError('Se esperaba como semilla un entero no '
+                f'negativo, pero se obtuvo {n.value}')
+
+        self.seed(int(n.value))
+        return Boolean(True)
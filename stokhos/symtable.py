@@ -18,9 +18,12 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 from typing import Union
+from weakref import ref
 
 from .AST import *
 from .builtins.functions import *
+from .builtins.distributions import DISTRIBUTIONS
+from .builtins.random_source import RandomSource
 from .utils.custom_exceptions import UndefinedSymbolError
 
 
@@ -39,12 +42,20 @@ class SymFunction(Symbol):
         args: Lista donde cada elemento son los tipos de argumento que
             pide la función en orden.
         type: Tipo de retorno de la función.
+        raw: Implementación opcional de la función sobre valores nativos
+            de Python (sin terminales de Stókhos), o None si no existe.
+        sited: Si la función usa números aleatorios. Sus implementaciones
+            reciben como primer argumento el sitio de la llamada (ver
+            SymTable.new_site).
     '''
     def __init__(self, _callable: callable,
-    _args: list[Type], _type: Type):
+    _args: list[Type], _type: Type, _raw: callable = None,
+    sited: bool = False):
         self.callable = _callable
         self.args = _args
         self.type = _type
+        self.raw = _raw
+        self.sited = sited
 
     def __str__(self) -> str:
         return (f'{self.callable.__name__}({self.args}) '
@@ -61,6 +72,9 @@ class SymVar(Symbol):
         value: Valor de la variable. Normalmente una subclase de Terminal
             o un AST de expresión en caso de que se guarde una expresión
             acotada.
+        hits: Número de veces que se ha evaluado el valor de la variable.
+        compiled: Función de Python compilada a partir del valor de la
+            variable cuando esta se evalúa con frecuencia, o None.
     '''
     def __init__(self, _type: Type, value: AST):
         self.type = _type
@@ -71,6 +85,10 @@ class SymVar(Symbol):
         # For memoization
         self.cache = None
         self.last_cycle = -1
+
+        # Ejecución por niveles (ver ASTEvaluator.visit_Id)
+        self.hits = 0
+        self.compiled = None
     
     def __str__(self):
         return f'({self.type}, {self.value})'
@@ -79,28 +97,42 @@ class SymVar(Symbol):
         return self.__str__()
 
 stk_dummy = lambda: None
-# Funciones precargadas de Stókhos
+# Funciones precargadas de Stókhos. Las que usan números aleatorios (uniform,
+# seed y las distribuciones) se enlazan al generador de cada tabla (ver
+# SymTable.preload)
 PRELOADED_FUNCTIONS = {
     'type': SymFunction(stk_dummy, [VOID], Type('<metatype>')),
     'ltype': SymFunction(stk_dummy, [VOID], Type('<metatype>')),
     'if': SymFunction(stk_dummy, [], None),
     'reset': SymFunction(stk_dummy, [], BOOL),
-    'uniform': SymFunction(stk_uniform, [], NUM,),
-    'floor': SymFunction(stk_floor, [NUM], NUM),
+    'uniform': SymFunction(stk_dummy, [], NUM),
+    'seed': SymFunction(stk_dummy, [NUM], BOOL),
+    'normal': SymFunction(stk_dummy, [NUM, NUM], NUM),
+    'exponential': SymFunction(stk_dummy, [NUM], NUM),
+    'poisson': SymFunction(stk_dummy, [NUM], NUM),
+    'bernoulli': SymFunction(stk_dummy, [NUM], NUM),
+    'randint': SymFunction(stk_dummy, [NUM, NUM], NUM),
+    'floor': SymFunction(stk_floor, [NUM], NUM, raw_floor),
     'length': SymFunction(stk_length, [ANY_ARRAY], NUM),
     'sum': SymFunction(stk_sum, [NUM_ARRAY], NUM),
     'avg': SymFunction(stk_avg, [NUM_ARRAY], NUM),
-    'pi': SymFunction(stk_pi, [], NUM),
-    'now': SymFunction(stk_now, [], NUM),
-    'ln': SymFunction(stk_ln, [NUM], NUM),
-    'exp': SymFunction(stk_exp, [NUM], NUM),
-    'sin': SymFunction(stk_sin, [NUM], NUM),
-    'cos': SymFunction(stk_cos, [NUM], NUM),
+    'min': SymFunction(stk_min, [NUM_ARRAY], NUM),
+    'max': SymFunction(stk_max, [NUM_ARRAY], NUM),
+    'var': SymFunction(stk_var, [NUM_ARRAY], NUM),
+    'std': SymFunction(stk_std, [NUM_ARRAY], NUM),
+    'pi': SymFunction(stk_pi, [], NUM, raw_pi),
+    'now': SymFunction(stk_now, [], NUM, raw_now),
+    'ln': SymFunction(stk_ln, [NUM], NUM, raw_ln),
+    'exp': SymFunction(stk_exp, [NUM], NUM, raw_exp),
+    'sin': SymFunction(stk_sin, [NUM], NUM, raw_sin),
+    'cos': SymFunction(stk_cos, [NUM], NUM, raw_cos),
     'tick': SymFunction(stk_dummy, [], NUM),
     'formula': SymFunction(stk_dummy, [VOID], Type('<metatype>')),
-    'sqrt': SymFunction(stk_sqrt, [NUM], NUM),
+    'sqrt': SymFunction(stk_sqrt, [NUM], NUM, raw_sqrt),
     'array': SymFunction(stk_dummy, [], None),
     'histogram': SymFunction(stk_dummy, [NUM, NUM, NUM, NUM, NUM], NUM_ARRAY),
+    'stats': SymFunction(stk_dummy, [NUM, NUM], NUM_ARRAY),
+    'quantile': SymFunction(stk_dummy, [NUM, NUM, NUM], NUM),
 }
 
 # --- IMPLEMENTACIÓN DE TABLA DE SÍMBOLOS ---
@@ -118,14 +150,29 @@ class SymTable:
     '''
     def __init__(self, preloaded: Boolean = True):
         self.preloaded = preloaded
-        if self.preloaded:
-            self.table = PRELOADED_FUNCTIONS.copy()
-        else:
-            self.table = {}
-        
+
         # Ciclo de cómputo (se inicializa a 0)
         self.cycle = 0
 
+        # Carril de la evaluación en curso (ver child_lane) y número de
+        # sitios de llamadas a uniform asignados (ver new_site)
+        self.lane = ROOT_LANE
+        self.sites = 0
+
+        # Generador de números aleatorios propio de la tabla
+        self.rng = RandomSource(self)
+        self.preload()
+
+        # Subexpresiones comunes: llaves estructurales asignadas, nodos
+        # registrados por llave, valores calculados en el ciclo cse_cycle y
+        # contadores de evaluaciones realizadas y ahorradas
+        self.cse_keys = {}
+        self.cse_registry = {}
+        self.cse_cache = {}
+        self.cse_cycle = -1
+        self.cse_saved = 0
+        self.cse_computed = 0
+
     def __str__(self) -> str:
         return str(self.table)
 
@@ -160,6 +207,11 @@ class SymTable:
         '''
         if self.exists(_id):
             self.table[_id].value = value
+
+            # La fórmula compilada ya no corresponde al nuevo valor
+            self.table[_id].hits = 0
+            self.table[_id].compiled = None
+
             if isinstance(value, Array):
                 self.table[_id].cache = [None for i in range(len(value))]
             return True
@@ -223,10 +275,78 @@ class SymTable:
         '''Limpia la tabla de símbolos. Vuelve a precargar las funciones si
         self.preloaded se estableció como True.
         '''
-        if self.preloaded:
-            self.table = PRELOADED_FUNCTIONS.copy()
-        else:
+        self.preload()
+
+        self.cse_cache.clear()
+        self.cse_cycle = -1
+        self.cse_saved = 0
+        self.cse_computed = 0
+
+    def preload(self):
+        '''Reinicia la tabla con solo las funciones precargadas, si
+        self.preloaded se estableció como True, o vacía si no. uniform, seed
+        y las distribuciones usan el generador de números aleatorios de la
+        tabla.
+        '''
+        if not self.preloaded:
             self.table = {}
+            return
+
+        self.table = PRELOADED_FUNCTIONS.copy()
+        self.table['uniform'] = SymFunction(self.rng.stk_uniform, [], NUM,
+            self.rng.uniform, sited=True)
+        self.table['seed'] = SymFunction(self.rng.stk_seed, [NUM], BOOL)
+        for name, (sampler, n_params) in DISTRIBUTIONS.items():
+            stk, raw = self.rng.samplers(name)
+            self.table[name] = SymFunction(stk, [NUM] * n_params, NUM, raw,
+                sited=True)
+
+    def subexpression_key(self, parts: tuple) -> int:
+        '''Retorna la llave estructural de una subexpresión a partir de la
+        tupla con su clase, operador u función y las llaves de sus hijos:
+        un entero, el mismo para tuplas iguales. Así las llaves no anidan
+        las de sus hijos, y calcularlas o buscarlas no depende de la
+        profundidad de la subexpresión.
+        '''
+        key = self.cse_keys.get(parts)
+        if key is None:
+            key = self.cse_keys[parts] = len(self.cse_keys)
+        return key
+
+    def register_subexpression(self, key: int, ast: AST):
+        '''Registra un nodo con la llave estructural de su subexpresión. Si
+        la llave ya estaba registrada por otro nodo vivo, se marcan todos
+        como compartidos.
+        '''
+        ast.cse_key = key
+
+        # Los nodos se referencian débilmente para no retener fórmulas
+        # descartadas (los AST no son hashables)
+        nodes = [node for node in self.cse_registry.get(key, [])
+            if node() is not None and node() is not ast]
+        nodes.append(ref(ast))
+        self.cse_registry[key] = nodes
+
+        if len(nodes) > 1:
+            for node in nodes:
+                node().cse_shared = True
+
+    def subexpression_values(self) -> dict:
+        '''Retorna el diccionario de valores de subexpresiones compartidas
+        calculados en el ciclo de cómputo actual.
+        '''
+        if self.cse_cycle != self.cycle:
+            self.cse_cache.clear()
+            self.cse_cycle = self.cycle
+        return self.cse_cache
+
+    def new_site(self) -> int:
+        '''Retorna un nuevo identificador de sitio para una llamada a
+        uniform. Los sitios se asignan en orden al validar, de modo que un
+        mismo programa los obtiene iguales en cada ejecución.
+        '''
+        self.sites += 1
+        return self.sites
 
     def increment_cycle(self):
         '''Incrementa el ciclo de cómputo de la tabla de símbolos y retorna
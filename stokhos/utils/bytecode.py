@@ -0,0 +1,407 @@
+"""Bytecode de pila para la VM de Stókhos.
+Copyright (C) 2022 Arturo Yepez - Jesus Bandez - Christopher Gómez
+CI3725 - Traductores e Interpretadores
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from array import array
+from functools import partial
+
+from ..AST import *
+from ..symtable import SymTable
+from .evaluators import (BINARY_OP, SHORT_CIRCUIT_OP,
+    UNARY_OP, ASTEvaluator, special_handler)
+from .helpers import ASTNodeVisitor
+from .operators import apply_elementwise, is_elementwise
+
+# -------- CONJUNTO DE INSTRUCCIONES --------
+# Cada instrucción ocupa dos posiciones del código: (opcode, argumento). El
+# argumento es un índice en la tabla de constantes del Chunk, un número de
+# elementos o una posición de salto, según la instrucción.
+PUSH_CONST = 0      # Apila consts[arg]
+LOAD_VAR = 1        # Apila el valor (memoizado) de la variable consts[arg]
+BINOP = 2           # Desapila dos operandos y apila consts[arg] aplicado
+COMPARE = 3         # Igual que BINOP, para comparaciones
+UNOP = 4            # Desapila un operando y apila consts[arg] aplicado
+CALL_BUILTIN = 5    # Desapila los argumentos de consts[arg] y apila la llamada
+CALL_SPECIAL = 6    # Apila el resultado del handler de función especial
+INDEX = 7           # Desapila arreglo e índice y apila el elemento
+INDEX_VAR = 8       # Apila un elemento (memoizado) de un arreglo en variable
+EVAL_ARRAY = 9      # Apila el arreglo consts[arg] con sus elementos evaluados
+JUMP_IF_FALSE = 10  # Desapila un Boolean y salta a arg si es falso
+JUMP = 11           # Salta a arg
+SHARED_LOAD = 12    # Si la subexpresión consts[arg][0] está compartida y ya
+                    # se calculó en el ciclo, apila su valor y salta a
+                    # consts[arg][1]
+SHARED_STORE = 13   # Guarda el tope como valor de la subexpresión consts[arg]
+ELEMENTWISE = 14    # Desapila dos operandos y apila el operador del nodo
+                    # consts[arg] aplicado elemento a elemento
+
+OPCODE_NAMES = {
+    PUSH_CONST: 'PUSH_CONST',
+    LOAD_VAR: 'LOAD_VAR',
+    BINOP: 'BINOP',
+    COMPARE: 'COMPARE',
+    UNOP: 'UNOP',
+    CALL_BUILTIN: 'CALL_BUILTIN',
+    CALL_SPECIAL: 'CALL_SPECIAL',
+    INDEX: 'INDEX',
+    INDEX_VAR: 'INDEX_VAR',
+    EVAL_ARRAY: 'EVAL_ARRAY',
+    JUMP_IF_FALSE: 'JUMP_IF_FALSE',
+    JUMP: 'JUMP',
+    SHARED_LOAD: 'SHARED_LOAD',
+    SHARED_STORE: 'SHARED_STORE',
+    ELEMENTWISE: 'ELEMENTWISE',
+}
+
+class Chunk:
+    '''Unidad de bytecode compilado a partir de un AST.
+
+    Atributos:
+        code: Arreglo plano de enteros con pares (opcode, argumento).
+        consts: Tabla de constantes referenciadas por las instrucciones.
+    '''
+    def __init__(self, code: array, consts: list):
+        self.code = code
+        self.consts = consts
+
+    def __len__(self) -> int:
+        return len(self.code) // 2
+
+    def __str__(self) -> str:
+        return disassemble(self)
+
+class ASTBytecodeCompiler(ASTNodeVisitor):
+    '''Subclase que implementa el patrón de diseño de Visitor para traducir
+    un AST ya validado a un Chunk de bytecode de pila.
+
+    El Chunk compilado se guarda en el propio nodo, de modo que un mismo AST
+    se compila una sola vez. El código de las subexpresiones candidatas a
+    compartirse (con cse_key) se rodea de SHARED_LOAD y SHARED_STORE.
+    '''
+    def __init__(self, sym_table: SymTable):
+        self.sym_table = sym_table
+        self.code = None
+        self.consts = None
+
+    def compile(self, ast: AST) -> Chunk:
+        '''Retorna el Chunk asociado al AST, compilándolo si no existe.'''
+        try:
+            return ast._chunk
+        except AttributeError:
+            pass
+
+        outer = self.code, self.consts
+        self.code, self.consts = array('i'), []
+        try:
+            self.visit(ast)
+            chunk = Chunk(self.code, self.consts)
+        finally:
+            self.code, self.consts = outer
+
+        ast._chunk = chunk
+        return chunk
+
+    def visit(self, ast: AST):
+        if ast.cse_key is None:
+            return super().visit(ast)
+
+        target = [ast, 0]
+        self.emit(SHARED_LOAD, self.const(target))
+        super().visit(ast)
+        self.emit(SHARED_STORE, self.const(ast))
+        target[1] = len(self.code)
+
+    def emit(self, opcode: int, arg: int = 0) -> int:
+        '''Agrega una instrucción al código y retorna su posición.'''
+        self.code.append(opcode)
+        self.code.append(arg)
+        return len(self.code) - 2
+
+    def const(self, value: object) -> int:
+        '''Agrega un valor a la tabla de constantes y retorna su índice.'''
+        self.consts.append(value)
+        return len(self.consts) - 1
+
+    # ---- CASOS BASE (TERMINALES) ----
+    def visit_Number(self, ast: Number):
+        self.emit(PUSH_CONST, self.const(ast))
+
+    def visit_Boolean(self, ast: Boolean):
+        self.emit(PUSH_CONST, self.const(ast))
+
+    def visit_Quoted(self, ast: Quoted):
+        self.emit(PUSH_CONST, self.const(ast.expr))
+
+    def visit_Id(self, ast: Id):
+        self.emit(LOAD_VAR, self.const(ast))
+
+    def visit_Folded(self, ast: Folded):
+        self.visit(ast.expr)
+
+    # ---- OPERADORES ----
+    def visit_BinOp(self, ast: BinOp):
+        if ast.op in SHORT_CIRCUIT_OP:
+            self.short_circuit(ast)
+            return
+
+        self.visit(ast.lhs)
+        self.visit(ast.rhs)
+        if is_elementwise(ast):
+            self.emit(ELEMENTWISE, self.const(ast))
+            return
+        self.emit(BINOP, self.const((BINARY_OP[ast.op], ast)))
+
+    def short_circuit(self, ast: BinOp):
+        '''Compila && y || con saltos: el operando derecho se salta si el
+        izquierdo determina el resultado, que se apila como constante.
+        '''
+        self.visit(ast.lhs)
+        jump_false = self.emit(JUMP_IF_FALSE)
+
+        if ast.op == '&&':
+            self.visit(ast.rhs)
+            jump_end = self.emit(JUMP)
+            self.code[jump_false + 1] = len(self.code)
+            self.emit(PUSH_CONST, self.const(Boolean(False)))
+        else:
+            self.emit(PUSH_CONST, self.const(Boolean(True)))
+            jump_end = self.emit(JUMP)
+            self.code[jump_false + 1] = len(self.code)
+            self.visit(ast.rhs)
+
+        self.code[jump_end + 1] = len(self.code)
+
+    def visit_Comparison(self, ast: Comparison):
+        self.visit(ast.lhs)
+        self.visit(ast.rhs)
+        if is_elementwise(ast):
+            self.emit(ELEMENTWISE, self.const(ast))
+            return
+        self.emit(COMPARE, self.const((BINARY_OP[ast.op], ast)))
+
+    def visit_UnOp(self, ast: UnOp):
+        self.visit(ast.term)
+        self.emit(UNOP, self.const((UNARY_OP[ast.op], ast)))
+
+    # ---- OTRAS EXPRESIONES ----
+    def visit_Array(self, ast: Array):
+        # Los elementos se evalúan al ejecutar, pues la asignación a un
+        # elemento del arreglo modifica el nodo
+        self.emit(EVAL_ARRAY, self.const(ast))
+
+    def visit_ArrayAccess(self, ast: ArrayAccess):
+        # Los arreglos en variables tienen su propia memoización
+        if isinstance(ast.expr, Id):
+            self.emit(INDEX_VAR, self.const(ast))
+            return
+
+        # Se evalúa primero el índice, como en ASTEvaluator
+        self.visit(ast.index)
+        self.visit(ast.expr)
+        self.emit(INDEX, self.const(ast))
+
+    def visit_FunctionCall(self, ast: FunctionCall):
+        name = ast.id.value
+
+        if name == 'if':
+            condition, exprT, exprF = ast.args
+            self.visit(condition)
+            jump_false = self.emit(JUMP_IF_FALSE)
+            self.visit(exprT)
+            jump_end = self.emit(JUMP)
+            self.code[jump_false + 1] = len(self.code)
+            self.visit(exprF)
+            self.code[jump_end + 1] = len(self.code)
+            return
+
+        handler = special_handler(ast)
+        if handler is not None:
+            self.emit(CALL_SPECIAL, self.const((handler, ast)))
+            return
+
+        for arg in ast.args:
+            self.visit(arg)
+        f = self.sym_table.get_value(name)
+        if ast.site is not None:
+            f = partial(f, ast.site)
+        self.emit(CALL_BUILTIN, self.const((f, len(ast.args), ast)))
+
+    def generic_visit(self, ast: AST):
+        raise Exception(f'Compilador de bytecode de {type(ast).__name__} no '
+            'implementado')
+
+
+class ASTBytecodeEvaluator(ASTEvaluator):
+    '''Evaluador que compila cada AST a bytecode de pila (una sola vez por
+    nodo) y lo ejecuta en un ciclo de despacho.
+
+    Produce los mismos resultados que ASTEvaluator. La memoización de
+    variables y arreglos reutiliza los métodos del evaluador base, cuyas
+    sub-evaluaciones se ejecutan también como bytecode.
+    '''
+    def __init__(self, sym_table: SymTable):
+        super().__init__(sym_table)
+        self.compiler = ASTBytecodeCompiler(sym_table)
+
+    def visit(self, ast: AST) -> AST:
+        return self.run(self.compiler.compile(ast))
+
+    def evaluate(self, ast: AST) -> AST:
+        return self.run(self.compiler.compile(ast))
+
+    def run(self, chunk: Chunk) -> AST:
+        '''Ejecuta un Chunk de bytecode y retorna el tope de la pila.'''
+        code = chunk.code
+        consts = chunk.consts
+        end = len(code)
+
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        pc = 0
+
+        # Ciclos en los que se empezó a calcular cada subexpresión compartida
+        cycles = []
+        sym_table = self.sym_table
+
+        while pc < end:
+            opcode = code[pc]
+            arg = code[pc + 1]
+            pc += 2
+
+            if opcode == PUSH_CONST:
+                push(consts[arg])
+            elif opcode == LOAD_VAR:
+                push(self.visit_Id(consts[arg]))
+            elif opcode == BINOP:
+                f, ast = consts[arg]
+                rhs = pop()
+                try:
+                    res = f(pop(), rhs)
+                except ZeroDivisionError:
+                    raise StkRuntimeError(f'División por cero en la '
+                        f'expresión {ast}')
+                if isinstance(res.value, complex):
+                    raise StkRuntimeError(f'No se puede realizar aritmética '
+                        f'con números complejos')
+                push(res)
+            elif opcode == COMPARE:
+                rhs = pop()
+                push(consts[arg][0](pop(), rhs))
+            elif opcode == ELEMENTWISE:
+                rhs = pop()
+                push(apply_elementwise(consts[arg], pop(), rhs))
+            elif opcode == CALL_BUILTIN:
+                f, n_args, _ = consts[arg]
+                if n_args:
+                    args = stack[-n_args:]
+                    del stack[-n_args:]
+                    push(f(*args))
+                else:
+                    push(f())
+            elif opcode == JUMP_IF_FALSE:
+                if not pop():
+                    pc = arg
+            elif opcode == JUMP:
+                pc = arg
+            elif opcode == UNOP:
+                push(consts[arg][0](pop()))
+            elif opcode == CALL_SPECIAL:
+                handler, ast = consts[arg]
+                push(handler(self, *ast.args))
+            elif opcode == INDEX:
+                expr = pop()
+                push(self.index(consts[arg], expr, pop()))
+            elif opcode == INDEX_VAR:
+                push(self.visit_ArrayAccess(consts[arg]))
+            elif opcode == EVAL_ARRAY:
+                push(self.visit_Array(consts[arg]))
+            elif opcode == SHARED_LOAD:
+                ast, target = consts[arg]
+                if ast.cse_shared:
+                    values = sym_table.subexpression_values()
+                    if ast.cse_key in values:
+                        sym_table.cse_saved += 1
+                        push(values[ast.cse_key])
+                        pc = target
+                    else:
+                        cycles.append(sym_table.cycle)
+            elif opcode == SHARED_STORE:
+                ast = consts[arg]
+                if ast.cse_shared:
+                    sym_table.cse_computed += 1
+                    # Como en ASTEvaluator.shared
+                    if cycles.pop() == sym_table.cycle:
+                        values = sym_table.subexpression_values()
+                        values[ast.cse_key] = stack[-1]
+            else:
+                raise Exception(f'Instrucción {opcode} desconocida')
+
+        return stack[-1]
+
+    def index(self, ast: ArrayAccess, expr: AST, index: Number) -> AST:
+        '''Accede a un elemento de una expresión ya evaluada, con los mismos
+        errores que ASTEvaluator.visit_ArrayAccess.
+        '''
+        if index.value < 0:
+            raise StkRuntimeError(f'Se esperaba un índice entero no negativo, '
+                f'pero se obtuvo {index.value}')
+
+        # Tratar de convertir a entero
+        index_val = int(index.value) if index.value % 1 == 0 else index.value
+
+        try:
+            return expr[index_val]
+        except (IndexError, AttributeError):
+            raise StkRuntimeError(f'El indice {index.value} no está dentro del '
+                f'rango de la expresión {ast.expr}')
+        except TypeError:
+            raise StkRuntimeError(f'Se esperaba un índice entero no negativo, '
+                f'pero se obtuvo {index.value}')
+
+# -------- DESENSAMBLADOR --------
+def disassemble(chunk: Chunk) -> str:
+    '''Retorna una representación legible de un Chunk, una instrucción por
+    línea, con su posición, nombre, argumento y una descripción del mismo.
+    '''
+    lines = []
+    code, consts = chunk.code, chunk.consts
+
+    for pc in range(0, len(code), 2):
+        opcode, arg = code[pc], code[pc + 1]
+
+        if opcode in (PUSH_CONST, LOAD_VAR):
+            detail = f'({consts[arg]})'
+        elif opcode in (BINOP, COMPARE, UNOP):
+            detail = f'({consts[arg][1].op})'
+        elif opcode == ELEMENTWISE:
+            detail = f'({consts[arg].op})'
+        elif opcode == CALL_BUILTIN:
+            f, n_args, ast = consts[arg]
+            detail = f'({ast.id}, {n_args} args)'
+        elif opcode == CALL_SPECIAL:
+            detail = f'({consts[arg][1]})'
+        elif opcode in (INDEX, INDEX_VAR, EVAL_ARRAY, SHARED_STORE):
+            detail = f'({consts[arg]})'
+        elif opcode == SHARED_LOAD:
+            ast, target = consts[arg]
+            detail = f'({ast} -> {target})'
+        else:
+            detail = f'(-> {arg})'
+
+        lines.append(f'{pc:>4} {OPCODE_NAMES[opcode]:<14}{arg:>4} {detail}')
+
+    return '\n'.join(lines)
@@ -0,0 +1,203 @@
+"""Generación de código fuente de Python para fórmulas de Stókhos.
+Copyright (C) 2022 Arturo Yepez - Jesus Bandez - Christopher Gómez
+CI3725 - Traductores e Interpretadores
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from functools import partial
+from math import isfinite
+
+from ..AST import *
+from ..symtable import SymFunction, stk_dummy
+from .helpers import ASTNodeVisitor
+
+# -------- FUNCIONES DE APOYO DEL CÓDIGO GENERADO --------
+
+# Operadores que pueden fallar, con los mismos errores que ASTEvaluator
+def _div(p, q, ast: BinOp):
+    try:
+        return p / q
+    except ZeroDivisionError:
+        raise StkRuntimeError(f'División por cero en la expresión {ast}')
+
+def _mod(p, q, ast: BinOp):
+    try:
+        return p % q
+    except ZeroDivisionError:
+        raise StkRuntimeError(f'División por cero en la expresión {ast}')
+
+def _pow(p, q, ast: BinOp):
+    try:
+        res = p ** q
+    except ZeroDivisionError:
+        raise StkRuntimeError(f'División por cero en la expresión {ast}')
+
+    if isinstance(res, complex):
+        raise StkRuntimeError(f'No se puede realizar aritmética con '
+            f'números complejos')
+    return res
+
+# Plantillas de código por operador, sobre valores nativos de Python. Los
+# operadores lógicos de Python tienen el mismo cortocircuito que los de
+# Stókhos (ver SHORT_CIRCUIT_OP)
+BINARY_OP_SOURCE = {
+    '+': '({} + {})',
+    '-': '({} - {})',
+    '*': '({} * {})',
+    '/': '_div({}, {}, {})',
+    '%': '_mod({}, {}, {})',
+    '^': '_pow({}, {}, {})',
+    '<': '({} < {})',
+    '<=': '({} <= {})',
+    '>': '({} > {})',
+    '>=': '({} >= {})',
+    '=': '({} == {})',
+    '<>': '({} != {})',
+    '&&': '({} and {})',
+    '||': '({} or {})',
+}
+UNARY_OP_SOURCE = {
+    '+': '(+{})',
+    '-': '(-{})',
+    '!': '(not {})',
+}
+
+class ASTPySourceGenerator(ASTNodeVisitor):
+    '''Subclase que implementa el patrón de diseño de Visitor para traducir
+    una fórmula ya validada (de tipo num o bool) a una función de Python
+    equivalente, que opera sobre valores nativos y retorna el terminal
+    correspondiente.
+
+    Las variables referenciadas por la fórmula se cargan a través del
+    evaluador, respetando su memoización. Si la fórmula contiene nodos que no
+    se pueden traducir, se lanza una excepción CodegenError.
+    '''
+    def __init__(self, evaluator):
+        self.evaluator = evaluator
+        self.sym_table = evaluator.sym_table
+        self.namespace = None
+
+    def generate(self, ast: AST) -> str:
+        '''Retorna el código fuente de la función _formula equivalente al
+        AST, y deja en self.namespace los nombres que esta referencia.
+        '''
+        if ast.type not in [NUM, BOOL]:
+            raise CodegenError(f'No se puede compilar una fórmula de tipo '
+                f'{ast.type}')
+
+        self.namespace = {
+            'Number': Number,
+            'Boolean': Boolean,
+            '_div': _div,
+            '_mod': _mod,
+            '_pow': _pow,
+        }
+
+        box = 'Number' if ast.type == NUM else 'Boolean'
+        return f'def _formula():\n    return {box}({self.visit(ast)})\n'
+
+    def compile(self, ast: AST, name: str = '<fórmula>') -> callable:
+        '''Genera, compila y retorna la función de Python equivalente al AST.
+        El código fuente generado queda en el atributo source de la función.
+        '''
+        source = self.generate(ast)
+        code = compile(source, f'<stókhos: {name}>', 'exec')
+        exec(code, self.namespace)
+
+        formula = self.namespace['_formula']
+        formula.source = source
+        return formula
+
+    def bind(self, value: object) -> str:
+        '''Agrega un valor al espacio de nombres del código generado y
+        retorna el nombre con el que se referencia.
+        '''
+        name = f'_c{len(self.namespace)}'
+        self.namespace[name] = value
+        return name
+
+    def check_scalar(self, ast: AST):
+        if ast.type not in [NUM, BOOL]:
+            raise CodegenError(f'No se puede compilar {ast} de tipo {ast.type}')
+
+    # ---- CASOS BASE (TERMINALES) ----
+    def visit_Number(self, ast: Number) -> str:
+        # inf y nan no tienen literal en Python
+        if isinstance(ast.value, float) and not isfinite(ast.value):
+            return self.bind(ast.value)
+        return f'({ast.value!r})'
+
+    def visit_Boolean(self, ast: Boolean) -> str:
+        return f'{ast.value!r}'
+
+    def visit_Folded(self, ast: Folded) -> str:
+        return self.visit(ast.expr)
+
+    def visit_Id(self, ast: Id) -> str:
+        self.check_scalar(ast)
+        load = self.bind(partial(self.evaluator.visit_Id, ast))
+        return f'{load}().value'
+
+    # ---- OPERADORES ----
+    def visit_BinOp(self, ast: BinOp) -> str:
+        # También visita los nodos Comparison, subclase de BinOp
+        self.check_scalar(ast)
+        lhs = self.visit(ast.lhs)
+        rhs = self.visit(ast.rhs)
+        return BINARY_OP_SOURCE[ast.op].format(lhs, rhs, self.bind(ast))
+
+    def visit_UnOp(self, ast: UnOp) -> str:
+        self.check_scalar(ast)
+        return UNARY_OP_SOURCE[ast.op].format(self.visit(ast.term))
+
+    # ---- OTRAS EXPRESIONES ----
+    def visit_FunctionCall(self, ast: FunctionCall) -> str:
+        name = ast.id.value
+
+        if name == 'if':
+            self.check_scalar(ast)
+            condition, exprT, exprF = [self.visit(arg) for arg in ast.args]
+            return f'({exprT} if {condition} else {exprF})'
+
+        # Las funciones especiales (tick, array, histogram...) no se compilan
+        function = self.sym_table.lookup(name)
+        if (not isinstance(function, SymFunction)
+            or function.callable is stk_dummy
+            or function.type not in [NUM, BOOL]
+        ):
+            raise CodegenError(f'No se puede compilar la función "{name}"')
+
+        # Funciones con implementación sobre valores nativos
+        if function.raw is not None:
+            args = [self.visit(arg) for arg in ast.args]
+            if ast.site is not None:
+                args.insert(0, str(ast.site))
+            return f'{self.bind(function.raw)}({", ".join(args)})'
+
+        # Las demás reciben terminales (por ejemplo, arreglos en variables)
+        args = []
+        for arg in ast.args:
+            if isinstance(arg, Id) and isinstance(arg.type.type, TypedArray):
+                args.append(f'{self.bind(partial(self.evaluator.visit_Id, arg))}()')
+            elif arg.type == NUM:
+                args.append(f'Number({self.visit(arg)})')
+            elif arg.type == BOOL:
+                args.append(f'Boolean({self.visit(arg)})')
+            else:
+                raise CodegenError(f'No se puede compilar el argumento {arg}')
+
+        return f'{self.bind(function.callable)}({", ".join(args)}).value'
+
+    def generic_visit(self, ast: AST):
+        raise CodegenError(f'No se puede compilar {type(ast).__name__}')
@@ -0,0 +1,245 @@
+"""Compiladores de AST de Stókhos a closures de Python.
+Copyright (C) 2022 Arturo Yepez - Jesus Bandez - Christopher Gómez
+CI3725 - Traductores e Interpretadores
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from functools import partial
+
+from ..AST import *
+from ..builtins.random_source import child_lane
+from ..symtable import SymFunction, SymTable
+from .constants import ROOT_LANE
+from .evaluators import (BINARY_OP, SHORT_CIRCUIT_OP,
+    UNARY_OP, ASTEvaluator, special_handler)
+from .helpers import ASTNodeVisitor
+from .operators import apply_elementwise, is_elementwise
+
+
+class ASTClosureCompiler(ASTNodeVisitor):
+    '''Subclase que implementa el patrón de diseño de Visitor para traducir
+    un AST ya validado (anotado con sus tipos) a closures de Python anidadas.
+
+    Cada closure no recibe argumentos y retorna el mismo resultado que
+    retornaría ASTEvaluator al visitar el nodo correspondiente. La closure
+    compilada se guarda en el propio nodo, de modo que un mismo AST (por
+    ejemplo, la fórmula de una variable acotada) se compila una sola vez.
+
+    Las subexpresiones candidatas a compartirse (con cse_key) se envuelven en
+    una closure que consulta, al ejecutarse, si están compartidas; de este
+    modo no hay que recompilar las fórmulas cuando otra fórmula posterior
+    comparte alguna de sus subexpresiones.
+    '''
+    def __init__(self, evaluator: ASTEvaluator):
+        self.evaluator = evaluator
+        self.sym_table = evaluator.sym_table
+
+    def compile(self, ast: AST) -> callable:
+        '''Retorna la closure asociada al AST, compilándola si no existe.'''
+        try:
+            return ast._closure
+        except AttributeError:
+            closure = self.visit(ast)
+            if ast.cse_key is not None:
+                closure = self.share(ast, closure)
+            ast._closure = closure
+            return closure
+
+    def share(self, ast: AST, closure: callable) -> callable:
+        '''Envuelve la closure de una subexpresión candidata para que, si
+        está compartida, se calcule una sola vez por ciclo de cómputo.
+        '''
+        shared = self.evaluator.shared
+        key = ast.cse_key
+
+        def load_shared():
+            if ast.cse_shared:
+                return shared(key, closure)
+            return closure()
+
+        return load_shared
+
+    # ---- CASOS BASE (TERMINALES) ----
+    def visit_Number(self, ast: Number) -> callable:
+        return lambda: ast
+
+    def visit_Boolean(self, ast: Boolean) -> callable:
+        return lambda: ast
+
+    def visit_Quoted(self, ast: Quoted) -> callable:
+        expr = ast.expr
+        return lambda: expr
+
+    def visit_Folded(self, ast: Folded) -> callable:
+        return self.compile(ast.expr)
+
+    # ---- NODOS RECURSIVOS ----
+    def visit_Id(self, ast: Id) -> callable:
+        name = ast.value
+        sym_table = self.sym_table
+        evaluator = self.evaluator
+        in_progress = evaluator.in_progress
+        at_lane = evaluator.at_lane
+
+        def load_id():
+            lookup = sym_table.lookup(name)
+
+            if isinstance(lookup, SymFunction):
+                raise StkRuntimeError('No se puede evaluar una función como '
+                    'una expresión')
+
+            # Misma memoización que ASTEvaluator.visit_Id
+            if sym_table.cycle != lookup.last_cycle:
+                evaluator.enter(name, name)
+                try:
+                    val = at_lane(ROOT_LANE, lookup.value)
+                finally:
+                    in_progress.discard(name)
+
+                lookup.cache = val
+                lookup.last_cycle = sym_table.cycle
+                return val
+
+            if isinstance(lookup.cache, list):
+                for i in range(0, len(lookup.cache)):
+                    if lookup.cache[i] is None:
+                        evaluator.enter((name, i), f'{name}[{i}]')
+                        try:
+                            lookup.cache[i] = at_lane(child_lane(ROOT_LANE,
+                                i), lookup.value[i])
+                        finally:
+                            in_progress.discard((name, i))
+            return lookup.cache
+
+        return load_id
+
+    # ---- OPERADORES ----
+    def visit_BinOp(self, ast: BinOp) -> callable:
+        op = BINARY_OP[ast.op]
+        lhs = self.compile(ast.lhs)
+        rhs = self.compile(ast.rhs)
+
+        if ast.op in SHORT_CIRCUIT_OP:
+            decisive = SHORT_CIRCUIT_OP[ast.op]
+
+            def logical():
+                p = lhs()
+                if bool(p.value) is decisive:
+                    return Boolean(p.value)
+                return Boolean(rhs().value)
+
+            return logical
+
+        if is_elementwise(ast):
+            return lambda: apply_elementwise(ast, lhs(), rhs())
+
+        def binop():
+            try:
+                res = op(lhs(), rhs())
+
+                if isinstance(res.value, complex):
+                    raise StkRuntimeError(f'No se puede realizar aritmética '
+                        f'con números complejos')
+                return res
+            except ZeroDivisionError:
+                raise StkRuntimeError(f'División por cero en la expresión {ast}')
+
+        return binop
+
+    def visit_Comparison(self, ast: Comparison) -> callable:
+        op = BINARY_OP[ast.op]
+        lhs = self.compile(ast.lhs)
+        rhs = self.compile(ast.rhs)
+
+        if is_elementwise(ast):
+            return lambda: apply_elementwise(ast, lhs(), rhs())
+        return lambda: op(lhs(), rhs())
+
+    def visit_UnOp(self, ast: UnOp) -> callable:
+        op = UNARY_OP[ast.op]
+        term = self.compile(ast.term)
+        return lambda: op(term())
+
+    # ---- OTRAS EXPRESIONES ----
+    def visit_Array(self, ast: Array) -> callable:
+        # Los elementos se compilan al ejecutar, pues la asignación a un
+        # elemento del arreglo modifica el nodo. Cada uno se evalúa en su
+        # carril
+        sym_table = self.sym_table
+        at_lane = self.evaluator.at_lane
+
+        def array():
+            lane = sym_table.lane
+            return pack_array([at_lane(child_lane(lane, i), expr)
+                for i, expr in enumerate(ast)])
+
+        return array
+
+    def visit_PackedArray(self, ast: PackedArray) -> callable:
+        return ast.copy
+
+    def visit_ArrayAccess(self, ast: ArrayAccess) -> callable:
+        # La memoización de arreglos tiene varios casos degenerados, por lo
+        # que se delega en el evaluador (sus hijos se evalúan compilados)
+        return partial(self.evaluator.visit_ArrayAccess, ast)
+
+    def visit_FunctionCall(self, ast: FunctionCall) -> callable:
+        name = ast.id.value
+        evaluator = self.evaluator
+
+        # Tratamiento de funciones especiales
+        if name == 'if':
+            condition, exprT, exprF = [self.compile(arg) for arg in ast.args]
+            return lambda: exprT() if condition() else exprF()
+
+        handler = special_handler(ast)
+        if handler is not None:
+            args = ast.args
+            return lambda: handler(evaluator, *args)
+
+        f = self.sym_table.get_value(name)
+        if ast.site is not None:
+            f = partial(f, ast.site)
+        args = [self.compile(arg) for arg in ast.args]
+
+        # Casos especializados por aridad, los más comunes
+        if len(args) == 0:
+            return f
+        if len(args) == 1:
+            arg, = args
+            return lambda: f(arg())
+        return lambda: f(*[arg() for arg in args])
+
+    def generic_visit(self, ast: AST):
+        raise Exception(f'Compilador de {type(ast).__name__} no implementado')
+
+
+class ASTClosureEvaluator(ASTEvaluator):
+    '''Evaluador que compila cada AST a closures de Python (una sola vez por
+    nodo) y ejecuta la closure resultante, evitando el despacho del Visitor
+    en cada nodo visitado.
+
+    Produce los mismos resultados que ASTEvaluator. Los métodos visit_* del
+    evaluador base que se reutilizan (acceso a arreglos y funciones
+    especiales) evalúan a sus hijos a través de las closures compiladas.
+    '''
+    def __init__(self, sym_table: SymTable):
+        super().__init__(sym_table)
+        self.compiler = ASTClosureCompiler(self)
+
+    def visit(self, ast: AST) -> AST:
+        return self.compiler.compile(ast)()
+
+    def evaluate(self, ast: AST) -> AST:
+        return self.compiler.compile(ast)()
@@ -17,6 +17,81 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 VERSION = '1.0.0'
 
+# Número de evaluaciones de una fórmula acotada a partir del cual se compila
+# a código de Python (ver ASTEvaluator.visit_Id)
+HOT_FORMULA_THRESHOLD = 1000
+
+# Número de evaluaciones de una misma fórmula a partir del cual el motor
+# vectorizado las calcula en lote sobre arreglos de NumPy (ver vectorized.py)
+VECTOR_MIN_LANES = 64
+
+# Número máximo de muestras (de histogram o stats) o de elementos de array
+# que se calculan juntos en lote
+SAMPLE_CHUNK = 65536
+
+# Número de muestras de histogram que se clasifican juntas en buckets
+HISTOGRAM_CHUNK = 4096
+
+# Número de valores de un arreglo compacto cuyos momentos (media y suma de
+# cuadrados de las desviaciones) se calculan juntos en var y std
+REDUCTION_CHUNK = 65536
+
+# Número máximo de valores de uniform() que el generador de cada VM calcula
+# juntos para un mismo sitio de llamada, y número máximo de sitios con
+# valores calculados (ver RandomSource)
+UNIFORM_BLOCK = 4096
+MAX_SITE_BLOCKS = 256
+
+# Distancia entre los sitios de los números sucesivos de una llamada que usa
+# varios (como las de normal, ver distributions.py)
+DRAW_STRIDE = 1 << 32
+
+# Número máximo de dimensiones de las secuencias de baja discrepancia del
+# modo cuasi-Monte Carlo; las llamadas con dimensiones mayores usan números
+# pseudoaleatorios (ver qmc_dimension)
+QMC_MAX_DIMENSIONS = 4096
+
+# Número máximo de bits del resultado de una potencia entera que se calcula al
+# plegar constantes; las mayores se dejan para la evaluación, pues su costo
+# crece con el tamaño del resultado (ver ASTConstantFolder.visit_BinOp)
+MAX_FOLDED_POWER_BITS = 1 << 16
+
+# Media a partir de la cual poisson usa el método de rechazo PTRS en lugar de
+# la inversión, cuyo costo crece con la media (ver sample_poisson)
+POISSON_INVERSION_LIMIT = 10
+
+# Número máximo de enteros entre los límites de randint, pues cada muestra
+# se toma de un solo número de uniform(), con 53 bits (ver sample_randint)
+RANDINT_MAX_RANGE = 1 << 53
+
+# Carril de las evaluaciones que no son elementos de un arreglo: la de las
+# expresiones de la VM y las fórmulas de variables (ver child_lane)
+ROOT_LANE = 0
+
+# Número de valores por nivel del estimador de cuantiles de quantile, que es
+# exacto con hasta esta cantidad de muestras (ver QuantileSketch)
+QUANTILE_CAPACITY = 8192
+
+# Número mínimo, por defecto, de muestras de histogram o de elementos de
+# array por proceso al repartirlos entre varios (ver parallel.py)
+PARALLEL_THRESHOLD = 20000
+
+# Clases de efectos de una expresión, ordenadas de menor a mayor: el efecto
+# de un nodo es el mayor entre el suyo y los de sus hijos (ver effects.py)
+PURE = 0        # Su valor depende solo de la propia expresión
+READS = 1       # Lee variables de la tabla de símbolos
+RANDOM = 2      # Usa números aleatorios (uniform, normal...)
+CLOCK = 3       # Lee el reloj (now)
+STATE = 4       # Modifica el estado de la VM (tick, reset, asignaciones...)
+
+EFFECT_NAMES = {
+    PURE: 'pure',
+    READS: 'reads-variables',
+    RANDOM: 'random',
+    CLOCK: 'clock',
+    STATE: 'state',
+}
+
 # Lista de colores a utilizar para la impresión
 BOLD = '\033[1m'
 BLUE = '\33[96m'
@@ -36,6 +36,16 @@ class StkRuntimeError(Exception):
         self.message = message
         super().__init__(self.message)
 
+class CodegenError(Exception):
+    def __init__(self, message: str):
+        self.message = message
+        super().__init__(self.message)
+
+class VectorizeError(Exception):
+    def __init__(self, message: str):
+        self.message = message
+        super().__init__(self.message)
+
 # Errores de validadores semánticos
 class UndefinedSymbolError(Exception):
     def __init__(self, _id: str):
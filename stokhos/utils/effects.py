@@ -0,0 +1,280 @@
+"""Análisis de efectos de las expresiones de Stókhos.
+Copyright (C) 2022 Arturo Yepez - Jesus Bandez - Christopher Gómez
+CI3725 - Traductores e Interpretadores
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from ..AST import *
+from ..symtable import SymTable, SymVar
+from .helpers import ASTStackVisitor
+
+# Efecto propio de cada función predefinida, sin contar el de sus argumentos
+FUNCTION_EFFECTS = {
+    'type': PURE,
+    'ltype': PURE,
+    'formula': PURE,
+    'if': PURE,
+    'array': PURE,
+    'reset': STATE,
+    'tick': STATE,
+    'histogram': STATE,
+    'stats': STATE,
+    'quantile': STATE,
+    'uniform': RANDOM,
+    'normal': RANDOM,
+    'exponential': RANDOM,
+    'poisson': RANDOM,
+    'bernoulli': RANDOM,
+    'randint': RANDOM,
+    'seed': STATE,
+    'now': CLOCK,
+    'floor': PURE,
+    'length': PURE,
+    'sum': PURE,
+    'avg': PURE,
+    'min': PURE,
+    'max': PURE,
+    'var': PURE,
+    'std': PURE,
+    'pi': PURE,
+    'ln': PURE,
+    'exp': PURE,
+    'sin': PURE,
+    'cos': PURE,
+    'sqrt': PURE,
+}
+
+# Funciones que inspeccionan la sintaxis de su argumento sin evaluarlo
+SYNTACTIC_FUNCTIONS = ['type', 'ltype', 'formula']
+
+# Funciones que evalúan las expresiones acotadas que reciben
+QUOTED_EVALUATING_FUNCTIONS = ['array', 'histogram', 'stats', 'quantile']
+
+class ASTEffectAnalyzer(ASTStackVisitor):
+    '''Subclase que implementa el patrón de diseño de Visitor para anotar
+    cada nodo de un AST validado con su clase de efecto (atributo effect,
+    ver constants.py) y el conjunto de nombres de variables que lee al
+    evaluarse (atributo reads).
+
+    El efecto de un nodo es el mayor entre el suyo propio y los de los hijos
+    que se evalúan con él. Las expresiones acotadas no se evalúan, por lo que
+    son puras, salvo como argumento de funciones que sí las evalúan (array e
+    histogram). El efecto de las variables leídas no se incluye, pues sus
+    fórmulas pueden cambiar; ver resolve_effect.
+
+    Recorre el AST con una pila explícita (ver ASTStackVisitor).
+    '''
+    def analyze(self, ast: AST):
+        '''Anota los efectos de todos los nodos del AST.'''
+        self.visit(ast)
+
+    def annotate(self, ast: AST, effect: int, children: list[AST]):
+        '''Anota un nodo con su efecto propio combinado con el de sus hijos.'''
+        reads = frozenset()
+        for child in children:
+            effect = max(effect, child.effect)
+            reads = reads | child.reads
+
+        ast.effect = effect
+        ast.reads = reads
+
+    # ---- CASOS BASE (TERMINALES) ----
+    def visit_Number(self, ast: Number):
+        pass
+
+    def visit_Boolean(self, ast: Boolean):
+        pass
+
+    def visit_Id(self, ast: Id):
+        ast.effect = READS
+        ast.reads = frozenset([ast.value])
+
+    def visit_Folded(self, ast: Folded):
+        # Ya analizado y sustituido al validar los argumentos de una función
+        # especial, su efecto es el de la expresión sustituta
+        pass
+
+    # ---- OPERADORES ----
+    def visit_BinOp(self, ast: BinOp):
+        # También visita los nodos Comparison, subclase de BinOp
+        yield ast.lhs
+        yield ast.rhs
+        self.annotate(ast, PURE, [ast.lhs, ast.rhs])
+
+    def visit_UnOp(self, ast: UnOp):
+        yield ast.term
+        self.annotate(ast, PURE, [ast.term])
+
+    # ---- DEFINICIONES Y ASIGNACIONES ----
+    def visit_SymDef(self, ast: SymDef):
+        yield ast.rhs
+        self.annotate(ast, STATE, [ast.rhs])
+
+    def visit_Assign(self, ast: Assign):
+        yield ast.rhs
+        self.annotate(ast, STATE, [ast.rhs])
+
+    def visit_AssignArrayElement(self, ast: AssignArrayElement):
+        index = ast.array_access.index
+        yield index
+        yield ast.rhs
+        self.annotate(ast, STATE, [index, ast.rhs])
+
+    # ---- OTRAS EXPRESIONES ----
+    def visit_Quoted(self, ast: Quoted):
+        yield ast.expr
+
+    def visit_Array(self, ast: Array):
+        for el in ast.elements:
+            yield el
+        self.annotate(ast, PURE, ast.elements)
+
+    def visit_ArrayAccess(self, ast: ArrayAccess):
+        yield ast.index
+        yield ast.expr
+        self.annotate(ast, PURE, [ast.index, ast.expr])
+
+    def visit_FunctionCall(self, ast: FunctionCall):
+        name = ast.id.value
+
+        if name in SYNTACTIC_FUNCTIONS:
+            return
+
+        for arg in ast.args:
+            yield arg
+
+        # Las expresiones acotadas se evalúan dentro de la función
+        if name in QUOTED_EVALUATING_FUNCTIONS:
+            children = [arg.expr if isinstance(arg, Quoted) else arg
+                for arg in ast.args]
+        else:
+            children = ast.args
+
+        self.annotate(ast, FUNCTION_EFFECTS.get(name, STATE), children)
+
+    def generic_visit(self, ast: AST):
+        raise Exception(f'Analizador de efectos de {type(ast).__name__} no '
+            'implementado')
+
+def resolve_effect(ast: AST, sym_table: SymTable) -> int:
+    '''Retorna el efecto de un nodo incluyendo, transitivamente, el de las
+    fórmulas de las variables que lee según la tabla de símbolos.
+    '''
+    effect = ast.effect
+    for name in resolve_reads(ast, sym_table):
+        for value in formula_values(name, sym_table):
+            effect = max(effect, value.effect)
+    return effect
+
+def resolve_reads(ast: AST, sym_table: SymTable) -> set[str]:
+    '''Retorna los nombres de las variables que lee un nodo incluyendo,
+    transitivamente, las que leen las fórmulas de esas variables.
+    '''
+    pending = list(ast.reads)
+    seen = set(pending)
+
+    while pending:
+        name = pending.pop()
+        for value in formula_values(name, sym_table):
+            for read in value.reads - seen:
+                seen.add(read)
+                pending.append(read)
+
+    return seen
+
+class ASTSiteCollector(ASTStackVisitor):
+    '''Subclase que implementa el patrón de diseño de Visitor para reunir
+    los pares de sitio y nombre de función de las llamadas con números
+    aleatorios (ver SymTable.new_site) de un AST validado, incluidas las de
+    sus expresiones acotadas. Recorre el AST con una pila explícita (ver
+    ASTStackVisitor).
+    '''
+    def collect(self, ast: AST) -> set[tuple[int, str]]:
+        '''Retorna el conjunto de sitios de las llamadas del AST.'''
+        self.sites = set()
+        self.visit(ast)
+        return self.sites
+
+    # ---- CASOS BASE (TERMINALES) ----
+    def visit_Terminal(self, ast: Terminal):
+        pass
+
+    def visit_PackedArray(self, ast: PackedArray):
+        pass
+
+    def visit_Folded(self, ast: Folded):
+        # Un if con condición constante se sustituye por la rama elegida
+        yield ast.expr
+
+    # ---- OPERADORES ----
+    def visit_BinOp(self, ast: BinOp):
+        yield ast.lhs
+        yield ast.rhs
+
+    def visit_UnOp(self, ast: UnOp):
+        yield ast.term
+
+    # ---- OTRAS EXPRESIONES ----
+    def visit_Quoted(self, ast: Quoted):
+        yield ast.expr
+
+    def visit_Array(self, ast: Array):
+        for el in ast.elements:
+            yield el
+
+    def visit_ArrayAccess(self, ast: ArrayAccess):
+        yield ast.index
+        yield ast.expr
+
+    def visit_FunctionCall(self, ast: FunctionCall):
+        if ast.id.value in SYNTACTIC_FUNCTIONS:
+            return
+
+        if ast.site is not None:
+            self.sites.add((ast.site, ast.id.value))
+        for arg in ast.args:
+            yield arg
+
+    def generic_visit(self, ast: AST):
+        raise Exception(f'Recolector de sitios de {type(ast).__name__} no '
+            'implementado')
+
+def resolve_sites(ast: AST, sym_table: SymTable) -> list[tuple[int, str]]:
+    '''Retorna, ordenados, los pares de sitio y nombre de función de las
+    llamadas con números aleatorios que se evalúan con un nodo incluyendo,
+    transitivamente, las de las fórmulas de las variables que lee.
+    '''
+    collector = ASTSiteCollector()
+    sites = collector.collect(ast)
+    for name in resolve_reads(ast, sym_table):
+        for value in formula_values(name, sym_table):
+            sites |= collector.collect(value)
+    return sorted(sites)
+
+def formula_values(name: str, sym_table: SymTable) -> list[AST]:
+    '''Retorna los AST que se evalúan al leer una variable: su valor, o los
+    elementos si es un arreglo. Los elementos de un arreglo compacto ya
+    están evaluados, y los de un arreglo con fórmulas se evalúan por
+    separado.
+    '''
+    if not sym_table.exists(name):
+        return []
+
+    lookup = sym_table.lookup(name)
+    if not isinstance(lookup, SymVar) or isinstance(lookup.value, PackedArray):
+        return []
+
+    if isinstance(lookup.value, Array):
+        return list(lookup.value.elements)
+    return [lookup.value]
@@ -81,5 +81,20 @@ def error_non_implemented_interpretation() -> str:
 def error_invalid_arguments(command: str) -> str:
     return f'{command} no acepta argumentos'
 
+def error_circular_variable(name: str) -> str:
+    return f'Dependencia circular en la evaluación de "{name}"'
+
+def error_nonexistent_engine(engine: str) -> str:
+    return f'Motor de evaluación "{engine}" inexistente'
+
+def error_invalid_workers(workers: str) -> str:
+    return f'Se esperaba como número de procesos y umbral enteros positivos, pero se obtuvo "{workers}"'
+
+def error_nonexistent_sequence(sequence: str) -> str:
+    return f'Secuencia de baja discrepancia "{sequence}" inexistente'
+
+def error_nan_sample() -> str:
+    return 'Se esperaban muestras con un orden, pero se obtuvo nan'
+
 def prefix_error(err) -> str:
     return f"ERROR: {err}"
@@ -16,12 +16,31 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import operator
+from array import array
+from itertools import islice
 from math import floor
-from typing import Union
+from typing import Optional, Union
+
+# NumPy es opcional: sin él, las muestras de histogram se clasifican una a una
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 from ..AST import *
-from ..symtable import SymFunction, SymTable
+from ..builtins.functions import (merge_moments, raw_chunked_sum, raw_moments,
+    raw_values)
+from ..builtins.quantiles import QuantileSketch
+from ..builtins.random_source import MASK, child_lane
+from ..symtable import SymFunction, SymTable, SymVar
+from .codegen import ASTPySourceGenerator
+from .constants import (HISTOGRAM_CHUNK, HOT_FORMULA_THRESHOLD,
+    PARALLEL_THRESHOLD, ROOT_LANE, SAMPLE_CHUNK)
+from .effects import resolve_sites
+from .err_strings import error_circular_variable, error_nan_sample
 from .helpers import ASTNodeVisitor
+from .operators import apply_elementwise, is_elementwise
+from .parallel import parallel_elements, parallel_samples
 
 # Diccionarios de operadores
 BINARY_OP = {
@@ -46,9 +65,45 @@ UNARY_OP = {
     '!': lambda p: Boolean(not p.value)
 }
 
+# Operadores lógicos con cortocircuito y el valor del operando izquierdo que
+# determina su resultado. El operando derecho solo se evalúa si el izquierdo
+# no lo determina; si no se evalúa, sus efectos no ocurren, igual que en la
+# rama no elegida de un if: sus llamadas a uniform() no consumen números
+# aleatorios y sus llamadas a tick() o reset() no modifican el ciclo de
+# cómputo. Todos los motores de evaluación siguen esta regla.
+SHORT_CIRCUIT_OP = {
+    '&&': False,
+    '||': True,
+}
+
 class ASTEvaluator(ASTNodeVisitor):
+    '''Subclase que implementa el patrón de diseño de Visitor para evaluar
+    recursivamente los AST ya validados.
+
+    Las fórmulas acotadas en variables se interpretan recorriendo su AST
+    hasta que se evalúan hot_threshold veces; a partir de ese momento se
+    traducen a una función de Python compilada (ver tier_up). Asignar o
+    redefinir la variable descarta la función compilada. Con hot_threshold
+    igual a None las fórmulas siempre se interpretan.
+
+    Las subexpresiones compartidas entre fórmulas (ver cse_shared) se
+    calculan una sola vez por ciclo de cómputo (ver shared). Las funciones
+    compiladas no consultan estos valores, pero sí la memoización de las
+    variables que referencian.
+
+    Las variables (y elementos de arreglos en variables) en evaluación se
+    registran en in_progress, para detectar las dependencias circulares.
+
+    Con workers mayor a 1, las muestras de histogram y los elementos de
+    array se reparten entre varios procesos si cada uno recibe al menos
+    parallel_threshold (ver parallel.py).
+    '''
     def __init__(self, sym_table: SymTable):
         self.sym_table = sym_table
+        self.hot_threshold = HOT_FORMULA_THRESHOLD
+        self.in_progress = set()
+        self.workers = 1
+        self.parallel_threshold = PARALLEL_THRESHOLD
 
     # ---- CASOS BASE (TERMINALES) ----
     def visit_Number(self, ast: Number) -> Number:
@@ -60,6 +115,9 @@ class ASTEvaluator(ASTNodeVisitor):
     def visit_Quoted(self, ast: Quoted) -> AST:
         return ast.expr
 
+    def visit_Folded(self, ast: Folded) -> AST:
+        return self.visit(ast.expr)
+
     # ---- NODOS RECURSIVOS ----
     def visit_Id(self, ast: Id) -> AST:
         lookup = self.sym_table.lookup(ast.value)
@@ -68,9 +126,25 @@ class ASTEvaluator(ASTNodeVisitor):
             raise StkRuntimeError('No se puede evaluar una función como una '
                 'expresión')
 
-        # Implementación de memoización para Ids
+        # Implementación de memoización para Ids. Las fórmulas se evalúan
+        # en el carril raíz, sin importar desde qué elemento se leen
         if self.sym_table.cycle != lookup.last_cycle:
-            val = self.visit(lookup.value)
+            self.enter(ast.value, ast.value)
+            lane = self.sym_table.lane
+            self.sym_table.lane = ROOT_LANE
+            try:
+                if lookup.compiled is not None:
+                    val = lookup.compiled()
+                else:
+                    val = self.visit(lookup.value)
+
+                    # Conteo de evaluaciones para la ejecución por niveles
+                    lookup.hits += 1
+                    if lookup.hits == self.hot_threshold:
+                        self.tier_up(ast.value, lookup)
+            finally:
+                self.in_progress.discard(ast.value)
+                self.sym_table.lane = lane
 
             lookup.cache = val
             lookup.last_cycle = self.sym_table.cycle
@@ -79,11 +153,31 @@ class ASTEvaluator(ASTNodeVisitor):
         if isinstance(lookup.cache, list):
             for i in range(0, len(lookup.cache)):
                 if lookup.cache[i] is None:
-                    lookup.cache[i] = self.visit(lookup.value[i])
+                    self.enter((ast.value, i), f'{ast.value}[{i}]')
+                    try:
+                        lookup.cache[i] = self.at_lane(
+                            child_lane(ROOT_LANE, i), lookup.value[i])
+                    finally:
+                        self.in_progress.discard((ast.value, i))
         return lookup.cache
 
     # ---- OPERADORES ----
     def visit_BinOp(self, ast: BinOp) -> AST:
+        if ast.cse_shared:
+            return self.shared(ast.cse_key, self.compute_BinOp, ast)
+        return self.compute_BinOp(ast)
+
+    def compute_BinOp(self, ast: BinOp) -> AST:
+        if ast.op in SHORT_CIRCUIT_OP:
+            lhs = self.visit(ast.lhs)
+            if bool(lhs.value) is SHORT_CIRCUIT_OP[ast.op]:
+                return Boolean(lhs.value)
+            return Boolean(self.visit(ast.rhs).value)
+
+        if is_elementwise(ast):
+            return apply_elementwise(ast, self.visit(ast.lhs),
+                self.visit(ast.rhs))
+
         try:
             res = BINARY_OP[ast.op](
                 self.visit(ast.lhs),
@@ -98,23 +192,44 @@ class ASTEvaluator(ASTNodeVisitor):
             raise StkRuntimeError(f'División por cero en la expresión {ast}')
 
     def visit_Comparison(self, ast: Comparison) -> AST:
+        if ast.cse_shared:
+            return self.shared(ast.cse_key, self.compute_Comparison, ast)
+        return self.compute_Comparison(ast)
+
+    def compute_Comparison(self, ast: Comparison) -> AST:
+        if is_elementwise(ast):
+            return apply_elementwise(ast, self.visit(ast.lhs),
+                self.visit(ast.rhs))
+
         return BINARY_OP[ast.op](
             self.visit(ast.lhs),
             self.visit(ast.rhs)
         )
 
     def visit_UnOp(self, ast: UnOp) -> AST:
+        if ast.cse_shared:
+            return self.shared(ast.cse_key, self.compute_UnOp, ast)
+        return self.compute_UnOp(ast)
+
+    def compute_UnOp(self, ast: UnOp) -> AST:
         return UNARY_OP[ast.op](self.visit(ast.term))
 
     # ---- OTRAS EXPRESIONES ----
     def visit_Array(self, ast: Array) -> AST:
-        # Se evaluan todas las expresiones dentro del arreglo
+        # Se evaluan todas las expresiones dentro del arreglo, cada una en
+        # su carril
+        lane = self.sym_table.lane
         evaluated_list = []
-        for expr in ast:
-            evaluated_list.append(self.visit(expr))
+        for i, expr in enumerate(ast):
+            evaluated_list.append(self.at_lane(child_lane(lane, i), expr))
 
         # Se retorna un arreglo con su lista de elementos evaluada        
-        return Array(evaluated_list)
+        return pack_array(evaluated_list)
+
+    def visit_PackedArray(self, ast: PackedArray) -> AST:
+        # Los elementos ya están evaluados, se copia el buffer para que la
+        # asignación a un elemento no modifique el resultado
+        return ast.copy()
 
     def visit_ArrayAccess(self, ast: ArrayAccess) -> AST:
         # Evaluar el indice
@@ -135,21 +250,33 @@ class ASTEvaluator(ASTNodeVisitor):
 
             # Implementación de memoización para Arrays
             # CASO DEGENERADO!!
+            name = ast.expr.value
             if not isinstance(lookup.value, Array):
                 if self.sym_table.cycle != lookup.last_cycle:
-                    lookup.cache = self.visit(lookup.value)
+                    self.enter(name, name)
+                    try:
+                        lookup.cache = self.at_lane(ROOT_LANE, lookup.value)
+                    finally:
+                        self.in_progress.discard(name)
                     lookup.last_cycle = self.sym_table.cycle
                 return lookup.cache[index_val]
 
-            # Otros casos
-            if (self.sym_table.cycle != lookup.last_cycle
-                or lookup.cache is None 
-                or lookup.cache[index_val] is None
-            ):
-                val = self.visit(lookup.value[index_val])
+            # Otros casos. En un nuevo ciclo, se descartan los valores
+            # memoizados de todos los elementos, no solo del que se lee
+            if self.sym_table.cycle != lookup.last_cycle:
+                lookup.cache = [None] * len(lookup.value)
+                lookup.last_cycle = self.sym_table.cycle
+
+            if lookup.cache[index_val] is None:
+                element = lookup.value[index_val]
+                self.enter((name, index_val), f'{name}[{index_val}]')
+                try:
+                    val = self.at_lane(child_lane(ROOT_LANE, index_val),
+                        element)
+                finally:
+                    self.in_progress.discard((name, index_val))
 
                 lookup.cache[index_val] = val
-                lookup.last_cycle = self.sym_table.cycle
 
             return lookup.cache[index_val]
         except (IndexError, AttributeError):
@@ -160,21 +287,110 @@ class ASTEvaluator(ASTNodeVisitor):
                 f'obtuvo {index.value}')
 
     def visit_FunctionCall(self, ast: FunctionCall):
+        if ast.cse_shared:
+            return self.shared(ast.cse_key, self.compute_FunctionCall, ast)
+        return self.compute_FunctionCall(ast)
+
+    def compute_FunctionCall(self, ast: FunctionCall):
+        # Las funciones con números aleatorios reciben el sitio de la llamada,
+        # y ninguna es especial
+        if ast.site is not None:
+            f = self.sym_table.get_value(ast.id.value)
+            if ast.args:
+                return f(ast.site, *[self.visit(arg) for arg in ast.args])
+            return f(ast.site)
+
         # Tratamiento de funciones especiales
-        if ast.id.value in SPECIAL_FUNCTION_HANDLERS:
-            return SPECIAL_FUNCTION_HANDLERS[ast.id.value](self, *ast.args)
+        handler = special_handler(ast)
+        if handler is not None:
+            return handler(self, *ast.args)
 
         args = [self.visit(arg) for arg in ast.args]
         f = self.sym_table.get_value(ast.id.value)
-
         return f(*args)
                         
+    def at_lane(self, lane: int, ast: AST) -> AST:
+        '''Evalúa un AST en el carril indicado (ver child_lane), y luego
+        restaura el carril actual.
+        '''
+        sym_table = self.sym_table
+        current = sym_table.lane
+        sym_table.lane = lane
+        try:
+            return self.visit(ast)
+        finally:
+            sym_table.lane = current
+
+    def enter(self, key: Union[str, tuple], name: str):
+        '''Registra el inicio de la evaluación de una variable (o de un
+        elemento de un arreglo en variable). Si ya estaba en evaluación, la
+        dependencia es circular y se lanza una excepción.
+        '''
+        if key in self.in_progress:
+            raise StkRuntimeError(error_circular_variable(name))
+        self.in_progress.add(key)
+
+    def shared(self, key: tuple, compute: callable, *args) -> AST:
+        '''Retorna el valor de la subexpresión compartida con llave key en el
+        ciclo de cómputo actual, calculándolo con compute(*args) solo si es
+        la primera vez que se requiere en el ciclo.
+        '''
+        sym_table = self.sym_table
+        values = sym_table.subexpression_values()
+        if key in values:
+            sym_table.cse_saved += 1
+            return values[key]
+
+        cycle = sym_table.cycle
+        val = compute(*args)
+        sym_table.cse_computed += 1
+
+        # Si el cálculo avanzó el ciclo (por ejemplo, con tick), el valor no
+        # corresponde al nuevo ciclo y no se guarda
+        if sym_table.cycle == cycle:
+            sym_table.subexpression_values()[key] = val
+        return val
+
+    def tier_up(self, name: str, lookup: SymVar):
+        '''Compila a una función de Python la fórmula acotada en la variable.
+        Si la fórmula no se puede compilar, se sigue interpretando.
+        '''
+        if isinstance(lookup.value, (Terminal, Array)):
+            return
+
+        try:
+            generator = ASTPySourceGenerator(self)
+            lookup.compiled = generator.compile(lookup.value, name)
+        except (CodegenError, RecursionError, MemoryError):
+            lookup.compiled = None
+
     def generic_visit(self, ast: AST):
         raise Exception(f'Evaluador de {type(ast).__name__} no implementado')
 
     def evaluate(self, ast: AST) -> AST:
         return self.visit(ast)
 
+    def evaluate_value(self, ast: AST) -> object:
+        '''Evalúa un AST escalar y retorna su valor nativo de Python. Los
+        motores que calculan sobre valores nativos evitan así crear el
+        terminal del resultado.
+        '''
+        return self.evaluate(ast).value
+
+    def evaluate_lanes(self, ast: AST, n: int, per_cycle: bool,
+        first: int = 0) -> Optional[tuple[list, dict]]:
+        '''Evalúa n veces seguidas un AST escalar, en lote. Con per_cycle,
+        cada evaluación ocurre en un nuevo ciclo de cómputo (como con tick);
+        si no, todas en el ciclo actual, como los elementos first a
+        first + n - 1 de un arreglo (cada uno en su carril).
+
+        Retorna la lista de valores nativos obtenidos y un diccionario con la
+        excepción de cada evaluación que falló, o None si el motor no evalúa
+        en lote (o no puede hacerlo con este AST); en ese caso, quien llama
+        debe evaluar el AST una vez por muestra.
+        '''
+        return None
+
 # -------- FUNCIONES ESPECIALES --------
 
 # Son funciones que reciben el evaluador y pasan los argumentos
@@ -247,7 +463,7 @@ def stk_ltype(evaluator: ASTEvaluator,  expr: AST) -> Type:
 
 def stk_tick(evaluator: ASTEvaluator) -> Number:
     '''Incrementa el ciclo de cómputo en 1 y retorna su nuevo valor.'''
-    return evaluator.sym_table.increment_cycle()
+    return Number(evaluator.sym_table.increment_cycle())
 
 def stk_formula(evaluator: ASTEvaluator,  expr: AST) -> AST:
     '''Retorna el CVALUE de la expresión pasada como argumento, si lo tiene.
@@ -278,19 +494,146 @@ def stk_array(evaluator: ASTEvaluator,  size: AST, expr: AST) -> Array:
         size: Tamaño del arreglo a retornar
         expr: Expresión a evaluar para obtener cada elemento del arreglo.
     '''
+    n_val, init = array_init(evaluator, size, expr)
+
+    # Evaluar una expresión acotada retorna siempre la misma expresión
+    if isinstance(init, Quoted):
+        return Array([init.expr] * n_val)
+
+    # Con varios procesos, cada uno evalúa una parte de los elementos
+    partial = parallel_elements(evaluator, init, n_val, array_task)
+    if partial is not None:
+        return stitch(partial, init.type)
+
+    values = []
+    for chunk in array_chunks(evaluator, init, n_val):
+        values.extend(chunk)
+    return pack_values(values, init.type)
+
+def array_task(evaluator: ASTEvaluator, n: int, first: int,
+    init: AST) -> object:
+    '''Evalúa los n elementos de array con init a partir del índice first
+    en un proceso (ver parallel_elements) y retorna sus valores nativos: en
+    un buffer si son de un mismo tipo (ver pack_values), o en una lista.
+    '''
+    values = []
+    for chunk in array_chunks(evaluator, init, n, first):
+        values.extend(chunk)
+
+    packed = pack_values(values, init.type)
+    return packed.buffer if isinstance(packed, PackedArray) else values
+
+def stitch(parts: list, _type: Type) -> Array:
+    '''Une los valores de las partes de un arreglo (ver array_task) en un
+    solo arreglo, el mismo que si se hubieran evaluado juntas.
+    '''
+    typecodes = {getattr(part, 'typecode', None) for part in parts}
+    if len(typecodes) == 1 and None not in typecodes:
+        buffer = array(typecodes.pop())
+        for part in parts:
+            buffer.extend(part)
+        return PackedArray(buffer)
+
+    return pack_values([v for part in parts for v in part], _type)
+
+def array_init(evaluator: ASTEvaluator, size: AST,
+    expr: AST) -> tuple[int, AST]:
+    '''Evalúa los argumentos de array y retorna el tamaño del arreglo y la
+    expresión con la que se inicializa cada elemento.
+    '''
     n = evaluator.evaluate(size)
 
     if n.value < 0 or n.value % 1 != 0:
         raise StkRuntimeError(f'Se esperaba como tamaño un entero no negativo, pero se '
             f'obtuvo {n.value}')
 
-    arr = []
-    n_val = int(n.value)
-    init = evaluator.evaluate(expr)
+    return int(n.value), evaluator.evaluate(expr)
+
+def array_chunks(evaluator: ASTEvaluator, init: AST, n: int, first: int = 0):
+    '''Genera, por porciones, los valores nativos de n evaluaciones de init
+    en el ciclo de cómputo actual (los elementos de un arreglo, cada uno en
+    su carril). Si una evaluación falla, se lanza su error.
+
+    Args:
+        evaluator: Instancia de evaluador de Stokhos.
+        init: Expresión escalar con la que se inicializa cada elemento.
+        n: Número de elementos.
+        first: Índice del primer elemento.
+    '''
+    while n > 0:
+        size = min(n, SAMPLE_CHUNK)
+        batch = evaluator.evaluate_lanes(init, size, False, first)
+        if batch is None:
+            break
+
+        values, errors = batch
+        if errors:
+            raise errors[min(errors)]
+        yield values
+        n -= size
+        first += size
+
+    sym_table = evaluator.sym_table
+    lane = sym_table.lane
+    while n > 0:
+        size = min(n, SAMPLE_CHUNK)
+        values = []
+        # Los carriles de elementos consecutivos son consecutivos
+        start = child_lane(lane, first)
+        try:
+            for element_lane in range(start, start + size):
+                sym_table.lane = element_lane & MASK
+                values.append(evaluator.evaluate_value(init))
+        finally:
+            sym_table.lane = lane
+        yield values
+        n -= size
+        first += size
+
+def stk_samples(evaluator: ASTEvaluator, x: AST, n_samples: int):
+    '''Genera los valores nativos de n_samples evaluaciones de x, cada una
+    en un nuevo ciclo de cómputo. Las evaluaciones que fallan se saltan.
 
-    for i in range(n_val):
-        arr.append(evaluator.evaluate(init))
-    return Array(arr)
+    Args:
+        evaluator: Instancia de evaluador de Stokhos.
+        x: Expresión a muestrear.
+        n_samples: Número de muestras.
+    '''
+    # En el modo cuasi-Monte Carlo, las llamadas con números aleatorios que
+    # se evalúan con x tienen sus propias dimensiones (ver qmc_dimension)
+    rng = evaluator.sym_table.rng
+    outer = rng.dimensions
+    if rng.sequence is not None:
+        rng.set_dimensions(rng.sample_dimensions(
+            resolve_sites(x, evaluator.sym_table)))
+
+    try:
+        # Las muestras se calculan en lote por porciones, de modo que la memoria
+        # usada no depende del número de muestras
+        while n_samples > 0:
+            size = min(n_samples, SAMPLE_CHUNK)
+            batch = evaluator.evaluate_lanes(x, size, True)
+            if batch is None:
+                break
+
+            values, errors = batch
+            for i, sample in enumerate(values):
+                if i not in errors:
+                    yield sample
+            n_samples -= size
+
+        for i in range(n_samples):
+            # Avanza el ciclo de cómputo (como tick) por cada iteración
+            evaluator.sym_table.increment_cycle()
+
+            try:
+                sample = evaluator.evaluate_value(x)
+            except:
+                # Si hay un error en un sample se salta
+                continue
+            yield sample
+    finally:
+        rng.set_dimensions(outer)
 
 def stk_histogram(evaluator: ASTEvaluator, x: AST,
     NS: AST, NB: AST, LB: AST, UB: AST) -> Array:
@@ -312,34 +655,244 @@ def stk_histogram(evaluator: ASTEvaluator, x: AST,
         f' negativo, pero se obtuvo {n_samples}')
         
     n_buckets, n_samples = int(n_buckets), int(n_samples)
-    
-    histogram = [Number(0) for i in range(n_buckets + 2)]
+    sample_eval = evaluator.evaluate(x)
+    bounds = (n_buckets, lower_bound, upper_bound)
+
+    # Con varios procesos, cada uno cuenta una parte de las muestras
+    partial = parallel_samples(evaluator, sample_eval, n_samples, stk_counts,
+        *bounds)
+    if partial is None:
+        histogram = stk_counts(evaluator, sample_eval, n_samples, *bounds)
+    else:
+        histogram = [sum(counts) for counts in zip(*partial)]
+
+    return pack_values(histogram, NUM)
+
+def stk_counts(evaluator: ASTEvaluator, x: AST, n_samples: int,
+    n_buckets: int, lower_bound: float, upper_bound: float) -> list[int]:
+    '''Muestrea x n_samples veces (ver stk_samples) y retorna los conteos
+    de histogram de las muestras, como enteros nativos.
+    '''
+    histogram = [0] * (n_buckets + 2)
 
     delta = (upper_bound - lower_bound) / n_buckets
-    sample_eval = evaluator.evaluate(x)
-    for i in range(n_samples):
-        # Llama a tick por cada iteración
-        stk_tick(evaluator)
+    samples = stk_samples(evaluator, x, n_samples)
+
+    # Las muestras se clasifican por porciones
+    chunk = list(islice(samples, HISTOGRAM_CHUNK))
+    while chunk:
+        stk_bin(histogram, chunk, lower_bound, upper_bound, delta)
+        chunk = list(islice(samples, HISTOGRAM_CHUNK))
 
+    return histogram
+
+def stk_bin(histogram: list[int], samples: list, lower_bound: float,
+    upper_bound: float, delta: float):
+    '''Suma a los conteos de histogram los de una porción de muestras. El
+    primer bucket cuenta las muestras menores a lower_bound, el último las
+    mayores o iguales a upper_bound, y los demás tienen ancho delta.
+
+    Args:
+        histogram: Conteos por bucket, se modifican en el lugar.
+        samples: Valores nativos de las muestras.
+        lower_bound: Límite inferior del histograma.
+        upper_bound: Límite superior del histograma.
+        delta: Ancho de cada bucket.
+    '''
+    values = None
+    if np is not None:
         try:
-            sample = evaluator.evaluate(sample_eval).value
-        except:
-            # Si hay un error en un sample se salta
-            continue
-
-        # Calcula el bucket correspondiente
-        # (Fórmula derivada manualmente)
-        # bucket = floor(((sample - lower_bound) / delta) + 1)
-        if sample < lower_bound:
-            histogram[0] += Number(1)
-        elif sample >= upper_bound:
-            histogram[-1] += Number(1)
-        else:
-            bucket = floor((sample - lower_bound) / delta + 1)
-            histogram[bucket] += Number(1)
+            values = np.asarray(samples, dtype=float)
+        except OverflowError:
+            # Hay enteros fuera del rango de los flotantes, que se comparan
+            # con los límites uno a uno
+            pass
+
+    if values is None:
+        for sample in samples:
+            # Calcula el bucket correspondiente
+            # (Fórmula derivada manualmente)
+            # bucket = floor(((sample - lower_bound) / delta) + 1)
+            if sample < lower_bound:
+                histogram[0] += 1
+            elif sample >= upper_bound:
+                histogram[-1] += 1
+            elif sample != sample:
+                # nan no es menor ni mayor que los límites
+                raise StkRuntimeError(error_nan_sample())
+            else:
+                bucket = floor((sample - lower_bound) / delta + 1)
+                histogram[bucket] += 1
+        return
+
+    below = values < lower_bound
+    above = values >= upper_bound
+    inside = values[~(below | above)]
+
+    # nan no es menor ni mayor que los límites
+    if np.isnan(inside).any():
+        raise StkRuntimeError(error_nan_sample())
+
+    buckets = np.floor((inside - lower_bound) / delta + 1).astype(np.intp)
+    counts = np.bincount(buckets, minlength=len(histogram))
+    counts[0] += np.count_nonzero(below)
+    counts[-1] += np.count_nonzero(above)
+
+    for i, count in enumerate(counts.tolist()):
+        histogram[i] += count
+
+def stk_stats(evaluator: ASTEvaluator, x: AST, NS: AST) -> Array:
+    '''Muestrea x NS veces, cada una en un nuevo ciclo de cómputo (como
+    histogram), y retorna el arreglo [n, media, varianza, mínimo, máximo] de
+    las n muestras que no fallan, o [0, 0, 0, 0, 0] si no hay ninguna. La
+    varianza es poblacional, como en var. Las muestras nan son un error
+    (ver reject_nan).
+
+    Las muestras se acumulan por porciones sin guardarlas, de modo que la
+    memoria usada no depende de NS.
+    
+    Args:
+        x: Expresión a muestrear.
+        NS: Número de muestras.
+    '''
+    n_samples = evaluator.evaluate(NS).value
+
+    if n_samples < 0 or n_samples % 1 != 0:
+        raise StkRuntimeError(f'Se esperaba como numero de samples un entero no'
+        f' negativo, pero se obtuvo {n_samples}')
+
+    sample_eval = evaluator.evaluate(x)
+    samples = stk_samples(evaluator, sample_eval, int(n_samples))
+    moments = (0, 0.0, 0.0)
+    low = high = 0
+
+    chunk = list(islice(samples, HISTOGRAM_CHUNK))
+    while chunk:
+        reject_nan(chunk)
+        if moments[0] == 0:
+            low, high = chunk[0], chunk[0]
+        low, high = min(low, min(chunk)), max(high, max(chunk))
+        moments = merge_moments(moments, raw_moments(raw_chunk(chunk)))
+        chunk = list(islice(samples, HISTOGRAM_CHUNK))
+
+    n, mean, m2 = moments
+    return pack_array([Number(n), Number(mean), Number(m2 / n if n else 0.0),
+        Number(low), Number(high)])
+
+def stk_quantile(evaluator: ASTEvaluator, x: AST, NS: AST, P: AST) -> AST:
+    '''Muestrea x NS veces, cada una en un nuevo ciclo de cómputo (como
+    histogram), y retorna el cuantil estimado de probabilidad P de las
+    muestras que no fallan, o un arreglo con el de cada probabilidad si P
+    es un arreglo.
+
+    Las muestras se resumen por porciones en un QuantileSketch, en memoria
+    acotada; el rango de cada cuantil estimado difiere del exacto en a lo
+    sumo NS * log2(NS / QUANTILE_CAPACITY) / QUANTILE_CAPACITY.
+
+    Args:
+        x: Expresión a muestrear.
+        NS: Número de muestras.
+        P: Probabilidad (o arreglo de probabilidades) entre 0 y 1.
+    '''
+    n_samples = evaluator.evaluate(NS).value
+
+    if n_samples < 0 or n_samples % 1 != 0:
+        raise StkRuntimeError(f'Se esperaba como numero de samples un entero no'
+        f' negativo, pero se obtuvo {n_samples}')
+
+    probabilities = evaluator.evaluate(P)
+    if isinstance(probabilities, Terminal):
+        ps = [probabilities.value]
+    else:
+        ps = list(raw_values(probabilities))
 
-    return Array(histogram)
+    for p in ps:
+        if not 0 <= p <= 1:
+            raise StkRuntimeError(f'Se esperaba una probabilidad entre 0 y 1, '
+                f'pero se obtuvo {p}')
 
+    sample_eval = evaluator.evaluate(x)
+    samples = stk_samples(evaluator, sample_eval, int(n_samples))
+    sketch = QuantileSketch()
+
+    chunk = list(islice(samples, HISTOGRAM_CHUNK))
+    while chunk:
+        reject_nan(chunk)
+        sketch.extend(chunk)
+        chunk = list(islice(samples, HISTOGRAM_CHUNK))
+
+    if sketch.n == 0:
+        raise StkRuntimeError(f'No se obtuvo ninguna muestra de la expresión '
+            f'{x} para estimar sus cuantiles')
+
+    values = sketch.quantiles(ps)
+    if isinstance(probabilities, Terminal):
+        return Number(values[0])
+    return pack_array([Number(v) for v in values])
+
+def reject_nan(samples: list):
+    '''Lanza un error si alguna muestra de la porción es nan, que no tiene un
+    orden: stats, quantile e histogram no la pueden resumir.
+    '''
+    if any(sample != sample for sample in samples):
+        raise StkRuntimeError(error_nan_sample())
+
+def raw_chunk(samples: list):
+    '''Retorna una porción de muestras numéricas en un buffer de flotantes,
+    sobre el que raw_moments usa NumPy, o la misma lista si algún entero no
+    cabe en un flotante.
+    '''
+    try:
+        return array('d', samples)
+    except OverflowError:
+        return samples
+
+def fused_chunks(evaluator: ASTEvaluator, name: str, call: FunctionCall):
+    '''Evalúa los argumentos de la llamada a array que recibe una reducción
+    fusionada y retorna el tamaño del arreglo y el generador de porciones
+    de sus valores, o el resultado de la reducción sobre el arreglo si sus
+    elementos son expresiones acotadas (que no se evalúan).
+    '''
+    n, init = array_init(evaluator, *call.args)
+    if isinstance(init, Quoted):
+        f = evaluator.sym_table.get_value(name)
+        return n, f(Array([init.expr] * n))
+    return n, array_chunks(evaluator, init, n)
+
+def stk_fused_sum(evaluator: ASTEvaluator, call: FunctionCall) -> Number:
+    '''Calcula sum(array(...)) sin crear el arreglo.'''
+    n, chunks = fused_chunks(evaluator, 'sum', call)
+    if isinstance(chunks, Number):
+        return chunks
+    return Number(raw_chunked_sum(chunks))
+
+def stk_fused_avg(evaluator: ASTEvaluator, call: FunctionCall) -> Number:
+    '''Calcula avg(array(...)) sin crear el arreglo.'''
+    n, chunks = fused_chunks(evaluator, 'avg', call)
+    if isinstance(chunks, Number):
+        return chunks
+    total = raw_chunked_sum(chunks)
+    return Number(total / n) if n else Number(0)
+
+def stk_fused_length(evaluator: ASTEvaluator, call: FunctionCall) -> Number:
+    '''Calcula length(array(...)) sin crear el arreglo. Los elementos se
+    evalúan igualmente, por sus efectos y errores.
+    '''
+    n, chunks = fused_chunks(evaluator, 'length', call)
+    if isinstance(chunks, Number):
+        return chunks
+    for chunk in chunks:
+        pass
+    return Number(n)
+
+def special_handler(ast: FunctionCall) -> Optional[callable]:
+    '''Retorna el handler con el que se evalúa la llamada a función (que
+    recibe el evaluador y los argumentos sin evaluar), o None si es una
+    función predefinida que recibe sus argumentos evaluados.
+    '''
+    if ast.fused:
+        return FUSED_REDUCTION_HANDLERS[ast.id.value]
+    return SPECIAL_FUNCTION_HANDLERS.get(ast.id.value)
 
 # Diccionario de handlers de funciones especiales
 SPECIAL_FUNCTION_HANDLERS = {
@@ -351,4 +904,14 @@ SPECIAL_FUNCTION_HANDLERS = {
     'formula': stk_formula,
     'array': stk_array,
     'histogram': stk_histogram,
+    'stats': stk_stats,
+    'quantile': stk_quantile,
+}
+
+# Diccionario de handlers de reducciones aplicadas directamente a una llamada
+# a array, que se calculan sin crear el arreglo (ver ASTReductionFuser)
+FUSED_REDUCTION_HANDLERS = {
+    'sum': stk_fused_sum,
+    'avg': stk_fused_avg,
+    'length': stk_fused_length,
 }
@@ -17,6 +17,7 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 import re
+from types import GeneratorType
 
 
 def match_magic_command(name: str, line: str) -> bool:
@@ -47,11 +48,100 @@ class NullLogger():
 class ASTNodeVisitor(object):
     '''Clase que implementa el patrón de diseño de Visitor para el AST
     de Stókhos.
+
+    Al crearse cada subclase se construye su tabla de métodos visit_*
+    (incluidos los heredados) por nombre de nodo. El despacho se hace con un
+    diccionario por clase indexado por el tipo del nodo, que se llena la
+    primera vez que se visita cada tipo: si no hay un visit_* para el tipo,
+    se usa el de la clase de nodo más cercana en su jerarquía que lo tenga,
+    y en último caso generic_visit.
     '''
+    _methods = {}
+    _dispatch = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._methods = {
+            name[6:]: getattr(cls, name)
+            for name in dir(cls) if name.startswith('visit_')
+        }
+        cls._dispatch = {}
+
     def visit(self, node):
-        method_name = 'visit_' + type(node).__name__
-        visitor = getattr(self, method_name, self.generic_visit)
-        return visitor(node)
+        try:
+            visitor = self._dispatch[type(node)]
+        except KeyError:
+            visitor = self.resolve(type(node))
+        return visitor(self, node)
+
+    @classmethod
+    def resolve(cls, node_type: type) -> callable:
+        '''Retorna y registra en la tabla de despacho de la clase el método
+        que visita los nodos del tipo indicado.
+        '''
+        for base in node_type.__mro__:
+            if base.__name__ in cls._methods:
+                visitor = cls._methods[base.__name__]
+                break
+        else:
+            visitor = cls.generic_visit
+
+        cls._dispatch[node_type] = visitor
+        return visitor
 
     def generic_visit(self, node):
         raise Exception(f'No hay método visit_{type(node).__name__}')
+
+class ASTStackVisitor(ASTNodeVisitor):
+    '''Visitor que recorre los AST con una pila explícita de visitas en
+    curso en lugar de la recursión de Python, de modo que la profundidad de
+    los árboles no está limitada por la pila nativa.
+
+    Los visit_* que visitan hijos son generadores: en lugar de llamar a
+    self.visit(hijo), producen el hijo (valor = yield hijo) y reciben el
+    resultado de su visita, o la excepción que esta lanzó. Los visit_* que
+    no visitan hijos pueden ser funciones normales. El resultado de un
+    generador es el valor que retorna. Se visitan los nodos en el mismo
+    orden que con la recursión, por lo que se reportan los mismos errores.
+    '''
+    def visit(self, node):
+        frames = []
+        pending = node
+        value = error = None
+
+        while True:
+            # Inicia la visita del nodo producido por el último generador
+            if pending is not None:
+                try:
+                    visitor = self._dispatch[type(pending)]
+                except KeyError:
+                    visitor = self.resolve(type(pending))
+
+                try:
+                    value = visitor(self, pending)
+                except Exception as e:
+                    error = e
+                else:
+                    if type(value) is GeneratorType:
+                        frames.append(value)
+                        value = None
+                pending = None
+
+            if not frames:
+                if error is not None:
+                    raise error
+                return value
+
+            # Continúa el generador en el tope con el resultado de su hijo
+            try:
+                if error is not None:
+                    e, error = error, None
+                    pending = frames[-1].throw(e)
+                else:
+                    pending = frames[-1].send(value)
+            except StopIteration as stop:
+                frames.pop()
+                value = stop.value
+            except Exception as e:
+                frames.pop()
+                error = e
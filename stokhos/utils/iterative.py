@@ -0,0 +1,392 @@
+"""Evaluador iterativo de AST de Stókhos, con pila de trabajo explícita.
+Copyright (C) 2022 Arturo Yepez - Jesus Bandez - Christopher Gómez
+CI3725 - Traductores e Interpretadores
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from ..AST import *
+from ..builtins.random_source import child_lane
+from ..symtable import SymFunction, SymTable, SymVar
+from .constants import ROOT_LANE
+from .evaluators import (BINARY_OP, SHORT_CIRCUIT_OP,
+    UNARY_OP, ASTEvaluator, special_handler)
+from .operators import apply_elementwise, is_elementwise
+
+
+class ASTIterativeEvaluator(ASTEvaluator):
+    '''Evaluador que recorre los AST con una pila de trabajo explícita en
+    lugar de la recursión de Python, de modo que la profundidad de las
+    expresiones (por ejemplo, cadenas largas de variables acotadas) no está
+    limitada por la pila nativa.
+
+    La pila de trabajo contiene pares (paso, argumento): expand apila el
+    trabajo necesario para evaluar un nodo, y los demás pasos combinan los
+    valores ya calculados de la pila de valores. Produce los mismos
+    resultados que ASTEvaluator, incluida la memoización de variables y
+    arreglos y la detección de dependencias circulares.
+
+    Las funciones especiales (array, histogram...) se ejecutan con sus
+    handlers, que vuelven a entrar al evaluador, por lo que solo su
+    anidamiento usa la pila nativa. Las fórmulas no se compilan a Python
+    (hot_threshold es None), pues las funciones compiladas evalúan sus
+    variables recursivamente.
+    '''
+    def __init__(self, sym_table: SymTable):
+        super().__init__(sym_table)
+        self.hot_threshold = None
+
+        # Pasos que expanden cada tipo de nodo
+        self.expanders = {
+            Number: self.expand_terminal,
+            Boolean: self.expand_terminal,
+            Quoted: self.expand_Quoted,
+            Folded: self.expand_Folded,
+            Id: self.expand_Id,
+            BinOp: self.expand_BinOp,
+            Comparison: self.expand_BinOp,
+            UnOp: self.expand_UnOp,
+            Array: self.expand_Array,
+            PackedArray: self.expand_PackedArray,
+            ArrayAccess: self.expand_ArrayAccess,
+            FunctionCall: self.expand_FunctionCall,
+        }
+
+        # Pasos que terminan la evaluación de una variable o elemento de
+        # arreglo en evaluación (registrada en in_progress)
+        self.store_steps = (self.store_Id, self.store_cached_element,
+            self.store_element, self.store_degenerate)
+
+    def visit(self, ast: AST) -> AST:
+        return self.run(ast)
+
+    def evaluate(self, ast: AST) -> AST:
+        return self.run(ast)
+
+    def run(self, ast: AST) -> AST:
+        '''Evalúa un AST con una pila de trabajo y retorna su valor.'''
+        work = [(self.expand, ast)]
+        values = []
+        lane = self.sym_table.lane
+
+        try:
+            while work:
+                step, arg = work.pop()
+                step(work, values, arg)
+        except BaseException:
+            # Las variables cuya evaluación quedó pendiente dejan de estar
+            # en evaluación
+            for step, arg in work:
+                if step in self.store_steps:
+                    self.in_progress.discard(arg[0])
+            self.sym_table.lane = lane
+            raise
+
+        return values.pop()
+
+    # ---- EXPANSIÓN DE NODOS ----
+    def expand(self, work: list, values: list, ast: AST):
+        try:
+            expander = self.expanders[type(ast)]
+        except KeyError:
+            self.generic_visit(ast)
+        expander(work, values, ast)
+
+    def expand_at_lane(self, work: list, lane: int, ast: AST):
+        '''Apila la evaluación de un AST en el carril indicado (ver
+        ASTEvaluator.at_lane), seguida de la restauración del actual.
+        '''
+        work.append((self.set_lane, self.sym_table.lane))
+        work.append((self.expand, ast))
+        work.append((self.set_lane, lane))
+
+    def expand_terminal(self, work: list, values: list, ast: Terminal):
+        values.append(ast)
+
+    def expand_Quoted(self, work: list, values: list, ast: Quoted):
+        values.append(ast.expr)
+
+    def expand_Folded(self, work: list, values: list, ast: Folded):
+        work.append((self.expand, ast.expr))
+
+    def expand_Id(self, work: list, values: list, ast: Id):
+        name = ast.value
+        lookup = self.sym_table.lookup(name)
+
+        if isinstance(lookup, SymFunction):
+            raise StkRuntimeError('No se puede evaluar una función como una '
+                'expresión')
+
+        # Misma memoización que ASTEvaluator.visit_Id
+        if self.sym_table.cycle != lookup.last_cycle:
+            self.enter(name, name)
+            work.append((self.store_Id, (name, lookup)))
+            self.expand_at_lane(work, ROOT_LANE, lookup.value)
+            return
+
+        # Elementos del arreglo pendientes de evaluar, en orden
+        work.append((self.load_cache, lookup))
+        if isinstance(lookup.cache, list):
+            for i in reversed(range(0, len(lookup.cache))):
+                if lookup.cache[i] is None:
+                    self.enter((name, i), f'{name}[{i}]')
+                    work.append((self.store_cached_element,
+                        ((name, i), lookup, i)))
+                    self.expand_at_lane(work, child_lane(ROOT_LANE, i),
+                        lookup.value[i])
+
+    def expand_shared(self, work: list, values: list, ast: AST) -> bool:
+        '''Si el nodo es una subexpresión compartida ya calculada en el
+        ciclo, apila su valor y retorna True. Si no, agrega el paso que
+        guarda el valor al calcularse (ver ASTEvaluator.shared).
+        '''
+        sym_table = self.sym_table
+        shared_values = sym_table.subexpression_values()
+        if ast.cse_key in shared_values:
+            sym_table.cse_saved += 1
+            values.append(shared_values[ast.cse_key])
+            return True
+
+        work.append((self.store_shared, (ast.cse_key, sym_table.cycle)))
+        return False
+
+    def expand_BinOp(self, work: list, values: list, ast: BinOp):
+        if ast.cse_shared and self.expand_shared(work, values, ast):
+            return
+
+        if ast.op in SHORT_CIRCUIT_OP:
+            work.append((self.short_circuit, ast))
+            work.append((self.expand, ast.lhs))
+            return
+
+        # También se expanden los nodos Comparison
+        apply = self.apply_BinOp if type(ast) is BinOp else self.apply_Comparison
+        work.append((apply, ast))
+        work.append((self.expand, ast.rhs))
+        work.append((self.expand, ast.lhs))
+
+    def expand_UnOp(self, work: list, values: list, ast: UnOp):
+        if ast.cse_shared and self.expand_shared(work, values, ast):
+            return
+
+        work.append((self.apply_UnOp, ast))
+        work.append((self.expand, ast.term))
+
+    def expand_Array(self, work: list, values: list, ast: Array):
+        work.append((self.build_Array, len(ast.elements)))
+        lane = self.sym_table.lane
+        for i in reversed(range(len(ast.elements))):
+            self.expand_at_lane(work, child_lane(lane, i), ast.elements[i])
+
+    def expand_PackedArray(self, work: list, values: list,
+        ast: PackedArray):
+        values.append(ast.copy())
+
+    def expand_ArrayAccess(self, work: list, values: list, ast: ArrayAccess):
+        # Se evalúa primero el índice, como en ASTEvaluator
+        work.append((self.access, ast))
+        work.append((self.expand, ast.index))
+
+    def expand_FunctionCall(self, work: list, values: list, ast: FunctionCall):
+        if ast.cse_shared and self.expand_shared(work, values, ast):
+            return
+
+        name = ast.id.value
+        if name == 'if':
+            condition, exprT, exprF = ast.args
+            work.append((self.select, ast))
+            work.append((self.expand, condition))
+            return
+
+        handler = special_handler(ast)
+        if handler is not None:
+            values.append(handler(self, *ast.args))
+            return
+
+        work.append((self.call, ast))
+        for arg in reversed(ast.args):
+            work.append((self.expand, arg))
+
+    # ---- COMBINACIÓN DE VALORES ----
+    def apply_BinOp(self, work: list, values: list, ast: BinOp):
+        rhs = values.pop()
+        lhs = values.pop()
+        if is_elementwise(ast):
+            values.append(apply_elementwise(ast, lhs, rhs))
+            return
+
+        try:
+            res = BINARY_OP[ast.op](lhs, rhs)
+        except ZeroDivisionError:
+            raise StkRuntimeError(f'División por cero en la expresión {ast}')
+
+        if isinstance(res.value, complex):
+            raise StkRuntimeError(f'No se puede realizar aritmética con '
+                f'números complejos')
+        values.append(res)
+
+    def short_circuit(self, work: list, values: list, ast: BinOp):
+        lhs = values.pop()
+        if bool(lhs.value) is SHORT_CIRCUIT_OP[ast.op]:
+            values.append(Boolean(lhs.value))
+        else:
+            work.append((self.expand, ast.rhs))
+
+    def apply_Comparison(self, work: list, values: list, ast: Comparison):
+        rhs = values.pop()
+        if is_elementwise(ast):
+            values.append(apply_elementwise(ast, values.pop(), rhs))
+            return
+        values.append(BINARY_OP[ast.op](values.pop(), rhs))
+
+    def apply_UnOp(self, work: list, values: list, ast: UnOp):
+        values.append(UNARY_OP[ast.op](values.pop()))
+
+    def build_Array(self, work: list, values: list, size: int):
+        elements = values[len(values) - size:]
+        del values[len(values) - size:]
+        values.append(pack_array(elements))
+
+    def select(self, work: list, values: list, ast: FunctionCall):
+        condition, exprT, exprF = ast.args
+        work.append((self.expand, exprT if values.pop() else exprF))
+
+    def call(self, work: list, values: list, ast: FunctionCall):
+        n_args = len(ast.args)
+        args = values[len(values) - n_args:]
+        del values[len(values) - n_args:]
+
+        f = self.sym_table.get_value(ast.id.value)
+        if ast.site is not None:
+            values.append(f(ast.site, *args))
+        else:
+            values.append(f(*args))
+
+    def set_lane(self, work: list, values: list, lane: int):
+        self.sym_table.lane = lane
+
+    def store_shared(self, work: list, values: list, arg: tuple):
+        key, cycle = arg
+        self.sym_table.cse_computed += 1
+        if self.sym_table.cycle == cycle:
+            self.sym_table.subexpression_values()[key] = values[-1]
+
+    # ---- MEMOIZACIÓN DE VARIABLES ----
+    def store_Id(self, work: list, values: list, arg: tuple):
+        name, lookup = arg
+        self.in_progress.discard(name)
+
+        lookup.hits += 1
+        lookup.cache = values[-1]
+        lookup.last_cycle = self.sym_table.cycle
+
+    def load_cache(self, work: list, values: list, lookup: SymVar):
+        values.append(lookup.cache)
+
+    def store_cached_element(self, work: list, values: list, arg: tuple):
+        key, lookup, i = arg
+        self.in_progress.discard(key)
+        lookup.cache[i] = values.pop()
+
+    # ---- ACCESO A ARREGLOS ----
+    def access(self, work: list, values: list, ast: ArrayAccess):
+        index = values.pop()
+        if index.value < 0:
+            raise StkRuntimeError(f'Se esperaba un índice entero no negativo, '
+                f'pero se obtuvo {index.value}')
+
+        # Tratar de convertir a entero
+        index_val = int(index.value) if index.value % 1 == 0 else index.value
+
+        if not isinstance(ast.expr, Id):
+            work.append((self.subscript, (ast, index, index_val)))
+            work.append((self.expand, ast.expr))
+            return
+
+        # Misma memoización que ASTEvaluator.visit_ArrayAccess
+        name = ast.expr.value
+        try:
+            lookup = self.sym_table.lookup(name)
+
+            # CASO DEGENERADO!!
+            if not isinstance(lookup.value, Array):
+                if self.sym_table.cycle != lookup.last_cycle:
+                    self.enter(name, name)
+                    work.append((self.store_degenerate,
+                        (name, lookup, ast, index, index_val)))
+                    self.expand_at_lane(work, ROOT_LANE, lookup.value)
+                    return
+                values.append(lookup.cache[index_val])
+                return
+
+            # Otros casos
+            if self.sym_table.cycle != lookup.last_cycle:
+                lookup.cache = [None] * len(lookup.value)
+                lookup.last_cycle = self.sym_table.cycle
+
+            if lookup.cache[index_val] is None:
+                element = lookup.value[index_val]
+                self.enter((name, index_val), f'{name}[{index_val}]')
+                work.append((self.store_element,
+                    ((name, index_val), lookup, ast, index, index_val)))
+                self.expand_at_lane(work, child_lane(ROOT_LANE, index_val),
+                    element)
+                return
+
+            values.append(lookup.cache[index_val])
+        except (IndexError, AttributeError):
+            raise self.range_error(ast, index)
+        except TypeError:
+            raise self.index_error(index)
+
+    def subscript(self, work: list, values: list, arg: tuple):
+        ast, index, index_val = arg
+        try:
+            values.append(values.pop()[index_val])
+        except (IndexError, AttributeError):
+            raise self.range_error(ast, index)
+        except TypeError:
+            raise self.index_error(index)
+
+    def store_degenerate(self, work: list, values: list, arg: tuple):
+        name, lookup, ast, index, index_val = arg
+        self.in_progress.discard(name)
+
+        lookup.cache = values.pop()
+        lookup.last_cycle = self.sym_table.cycle
+        try:
+            values.append(lookup.cache[index_val])
+        except (IndexError, AttributeError):
+            raise self.range_error(ast, index)
+        except TypeError:
+            raise self.index_error(index)
+
+    def store_element(self, work: list, values: list, arg: tuple):
+        key, lookup, ast, index, index_val = arg
+        self.in_progress.discard(key)
+
+        try:
+            lookup.cache[index_val] = values.pop()
+            values.append(lookup.cache[index_val])
+        except (IndexError, AttributeError):
+            raise self.range_error(ast, index)
+        except TypeError:
+            raise self.index_error(index)
+
+    def range_error(self, ast: ArrayAccess, index: Number) -> StkRuntimeError:
+        return StkRuntimeError(f'El indice {index.value} no está dentro del '
+            f'rango de la expresión {ast.expr}')
+
+    def index_error(self, index: Number) -> StkRuntimeError:
+        return StkRuntimeError(f'Se esperaba un índice entero no negativo, '
+            f'pero se obtuvo {index.value}')
@@ -0,0 +1,182 @@
+"""Operadores de Stókhos sobre valores nativos de Python, escalares y
+elemento a elemento sobre arreglos.
+Copyright (C) 2022 Arturo Yepez - Jesus Bandez - Christopher Gómez
+CI3725 - Traductores e Interpretadores
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import operator
+from array import array
+from itertools import repeat
+
+# NumPy es opcional: sin él, los operadores elemento a elemento se aplican
+# sobre los valores nativos uno a uno
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from ..AST import *
+from ..builtins.functions import raw_values
+
+# Operadores sobre valores nativos. La división por cero y la aritmética
+# con números complejos se verifican en apply_binop
+RAW_BINARY_OP = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '^': operator.pow,
+    '%': operator.mod,
+    '/': operator.truediv,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '=': operator.eq,
+    '<>': operator.ne,
+}
+RAW_UNARY_OP = {
+    '+': operator.pos,
+    '-': operator.neg,
+    '!': operator.not_,
+}
+
+# Tipos de dato de NumPy de los buffers de arreglos compactos
+BUFFER_DTYPES = {'q': 'int64', 'd': 'float64', 'b': 'int8'}
+
+if np is not None:
+    # Operadores elemento a elemento que NumPy calcula igual que Python, con
+    # las clases de valores nativos de los operandos para las que coinciden
+    # (ver elementwise_kinds)
+    NUMPY_BINARY_OP = {
+        '+': np.add,
+        '-': np.subtract,
+        '*': np.multiply,
+        '/': np.true_divide,
+        '<': np.less,
+        '<=': np.less_equal,
+        '>': np.greater,
+        '>=': np.greater_equal,
+        '=': np.equal,
+        '<>': np.not_equal,
+    }
+
+def apply_binop(ast: BinOp, p: object, q: object) -> object:
+    '''Aplica el operador (no lógico) de ast a los valores nativos p y q, con
+    los mismos errores que ASTEvaluator.
+    '''
+    try:
+        res = RAW_BINARY_OP[ast.op](p, q)
+    except ZeroDivisionError:
+        raise StkRuntimeError(f'División por cero en la expresión {ast}')
+
+    if isinstance(res, complex):
+        raise StkRuntimeError(f'No se puede realizar aritmética con '
+            f'números complejos')
+    return res
+
+def is_elementwise(ast: BinOp) -> bool:
+    '''Indica si el operador del nodo se aplica elemento a elemento, es
+    decir, si el validador lo anotó con un tipo de arreglo.
+    '''
+    return isinstance(getattr(ast.type, 'type', None), TypedArray)
+
+def operand_kind(values: object) -> str:
+    '''Retorna la clase de valores nativos de un operando: 'b' (bool), 'i'
+    (int) o 'f' (float), o None si es un arreglo no compacto.
+    '''
+    if isinstance(values, array):
+        return {'q': 'i', 'd': 'f', 'b': 'b'}[values.typecode]
+    if isinstance(values, list):
+        return None
+    if isinstance(values, bool):
+        return 'b'
+    return 'i' if isinstance(values, int) else 'f'
+
+def elementwise_kinds(op: str, p: str, q: str) -> bool:
+    '''Indica si NumPy calcula el operador igual que Python para operandos
+    con las clases de valores nativos indicadas.
+
+    La aritmética con un operando flotante convierte el otro a flotante,
+    como Python. La de enteros (que puede desbordar int64) y los operadores
+    % y ^ (con casos de signo y números complejos) se calculan en Python,
+    al igual que las comparaciones entre enteros y flotantes, que Python
+    hace sin redondear el entero.
+    '''
+    if p is None or q is None or op not in NUMPY_BINARY_OP:
+        return False
+    if op in ['+', '-', '*', '/']:
+        return 'f' in [p, q] and 'b' not in [p, q]
+    return p == q
+
+def to_numpy(values: object) -> object:
+    '''Retorna el operando como arreglo de NumPy, sin copiar el buffer de un
+    arreglo compacto, o el mismo valor si es escalar.
+    '''
+    if isinstance(values, array):
+        return np.frombuffer(values, dtype=BUFFER_DTYPES[values.typecode])
+    return values
+
+def apply_numpy(op: str, p: object, q: object) -> object:
+    '''Aplica un operador de NUMPY_BINARY_OP a los operandos. Retorna None
+    si el resultado no coincide con el de Python: una división por cero, que
+    se reporta como error, o un entero escalar fuera del rango de int64.
+    '''
+    if op == '/' and not np.all(q != 0):
+        return None
+
+    # Los desbordamientos a inf y los nan se propagan igual que en Python,
+    # sin advertencias
+    try:
+        with np.errstate(all='ignore'):
+            return NUMPY_BINARY_OP[op](p, q)
+    except OverflowError:
+        return None
+
+def apply_elementwise(ast: BinOp, lhs: AST, rhs: AST) -> Array:
+    '''Aplica el operador de ast elemento a elemento a los operandos ya
+    evaluados. Un operando escalar se combina con cada elemento del otro, y
+    dos arreglos deben tener el mismo tamaño. Cada elemento se calcula con
+    la misma semántica (y los mismos errores) que el operador escalar.
+
+    Los operandos compactos se calculan en NumPy cuando coincide con Python
+    (ver elementwise_kinds), y los demás sobre sus valores nativos. El
+    resultado es un arreglo compacto si sus valores son de un mismo tipo.
+    '''
+    p = lhs.value if isinstance(lhs, Terminal) else raw_values(lhs)
+    q = rhs.value if isinstance(rhs, Terminal) else raw_values(rhs)
+
+    sizes = [len(v) for v in [p, q] if not isinstance(v, (bool, int, float))]
+    if sizes[0] != sizes[-1]:
+        raise StkRuntimeError(f'Los arreglos de la expresión {ast} tienen '
+            f'tamaños distintos ({sizes[0]} y {sizes[1]})')
+
+    _type = BOOL if isinstance(ast, Comparison) else NUM
+    if (np is not None and sizes[0] > 0
+        and elementwise_kinds(ast.op, operand_kind(p), operand_kind(q))
+    ):
+        res = apply_numpy(ast.op, to_numpy(p), to_numpy(q))
+        if res is not None:
+            if _type == BOOL:
+                return PackedArray(array('b', res.astype(np.int8).tobytes()))
+            return PackedArray(array('d', res.astype(np.float64).tobytes()))
+
+    ps = repeat(p) if isinstance(p, (bool, int, float)) else p
+    qs = repeat(q) if isinstance(q, (bool, int, float)) else q
+    if ast.op in ['/', '%', '^']:
+        values = [apply_binop(ast, x, y) for x, y in zip(ps, qs)]
+    else:
+        op = RAW_BINARY_OP[ast.op]
+        values = [op(x, y) for x, y in zip(ps, qs)]
+    return pack_values(values, _type)
@@ -0,0 +1,381 @@
+"""Optimizaciones sobre AST ya validados de Stókhos.
+Copyright (C) 2022 Arturo Yepez - Jesus Bandez - Christopher Gómez
+CI3725 - Traductores e Interpretadores
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from math import log2
+from typing import Union
+
+from ..AST import *
+from ..symtable import SymTable
+from .constants import MAX_FOLDED_POWER_BITS
+from .effects import SYNTACTIC_FUNCTIONS
+from .evaluators import (FUSED_REDUCTION_HANDLERS, SHORT_CIRCUIT_OP,
+    ASTEvaluator)
+from .helpers import ASTStackVisitor
+
+class ASTConstantFolder(ASTStackVisitor):
+    '''Subclase que implementa el patrón de diseño de Visitor para calcular,
+    una sola vez, las subexpresiones de un AST validado que no dependen de
+    variables ni de funciones con efectos (uniform, now, tick, reset...).
+
+    Requiere que el AST esté anotado con sus efectos (ver ASTEffectAnalyzer).
+    Cada visit_* retorna el nodo por el que se puede sustituir el visitado
+    (un terminal si es constante), o None si no hay sustitución. Las
+    sustituciones se hacen en el nodo padre envolviendo al hijo en un nodo
+    Folded, que conserva la subexpresión original para mostrarla. La raíz
+    del AST nunca se sustituye.
+
+    Si el cálculo de una subexpresión falla (por ejemplo, una división por
+    cero), esta se deja intacta para que el error se reporte al evaluarla.
+    Las subexpresiones que nunca se evalúan (el operando derecho de un
+    operador lógico decidido por el izquierdo, o la rama descartada de un if
+    con condición constante) no se visitan, y las potencias enteras con
+    resultados muy grandes no se calculan (ver MAX_FOLDED_POWER_BITS).
+
+    Recorre el AST con una pila explícita (ver ASTStackVisitor): fold_child
+    es un generador que se usa con yield from.
+    '''
+    def __init__(self, sym_table: SymTable):
+        self.evaluator = ASTEvaluator(sym_table)
+        self.evaluator.hot_threshold = None
+
+    def fold(self, ast: AST):
+        '''Sustituye en el AST todas las subexpresiones constantes.'''
+        self.visit(ast)
+
+    def fold_child(self, child: AST) -> Union[AST, None]:
+        '''Visita un hijo y retorna el nodo que debe ocupar su lugar en el
+        padre: un nodo Folded si hubo sustitución, o el mismo hijo.
+        '''
+        replacement = yield child
+        if replacement is None or isinstance(child, (Terminal, Folded)):
+            return child
+        return Folded(child, replacement)
+
+    def compute(self, ast: AST) -> Union[Terminal, None]:
+        '''Evalúa un nodo con hijos constantes. Retorna None si falla.'''
+        try:
+            return self.evaluator.evaluate(ast)
+        except Exception:
+            return None
+
+    # ---- CASOS BASE (TERMINALES) ----
+    def visit_Number(self, ast: Number) -> Number:
+        return ast
+
+    def visit_Boolean(self, ast: Boolean) -> Boolean:
+        return ast
+
+    def visit_Id(self, ast: Id) -> None:
+        return None
+
+    def visit_Folded(self, ast: Folded) -> Union[AST, None]:
+        return ast.expr
+
+    # ---- OPERADORES ----
+    def visit_BinOp(self, ast: BinOp) -> Union[Terminal, None]:
+        # También visita los nodos Comparison, subclase de BinOp
+        ast.lhs = yield from self.fold_child(ast.lhs)
+
+        # Si el operando izquierdo constante determina el resultado de un
+        # operador lógico, el derecho nunca se evalúa (ver SHORT_CIRCUIT_OP)
+        if ast.op in SHORT_CIRCUIT_OP and is_constant(ast.lhs):
+            lhs = constant_value(ast.lhs)
+            if lhs is SHORT_CIRCUIT_OP[ast.op]:
+                return Boolean(lhs)
+
+        ast.rhs = yield from self.fold_child(ast.rhs)
+
+        if not (is_constant(ast.lhs) and is_constant(ast.rhs)):
+            return None
+        if ast.op == '^' and not is_small_power(constant_value(ast.lhs),
+            constant_value(ast.rhs)):
+            return None
+        return self.compute(ast)
+
+    def visit_UnOp(self, ast: UnOp) -> Union[Terminal, None]:
+        ast.term = yield from self.fold_child(ast.term)
+
+        if is_constant(ast.term):
+            return self.compute(ast)
+        return None
+
+    # ---- DEFINICIONES Y ASIGNACIONES ----
+    def visit_SymDef(self, ast: SymDef) -> None:
+        ast.rhs = yield from self.fold_child(ast.rhs)
+
+    def visit_Assign(self, ast: Assign) -> None:
+        ast.rhs = yield from self.fold_child(ast.rhs)
+
+    def visit_AssignArrayElement(self, ast: AssignArrayElement) -> None:
+        # El índice del lado izquierdo se usa tal cual al ejecutar
+        ast.rhs = yield from self.fold_child(ast.rhs)
+
+    # ---- OTRAS EXPRESIONES ----
+    def visit_Quoted(self, ast: Quoted) -> None:
+        # El valor de una expresión acotada es su AST, no se sustituye
+        ast.expr = yield from self.fold_child(ast.expr)
+
+    def visit_Array(self, ast: Array) -> None:
+        for i, el in enumerate(ast.elements):
+            ast.elements[i] = yield from self.fold_child(el)
+
+    def visit_ArrayAccess(self, ast: ArrayAccess) -> None:
+        ast.index = yield from self.fold_child(ast.index)
+        if not isinstance(ast.expr, Id):
+            ast.expr = yield from self.fold_child(ast.expr)
+
+    def visit_FunctionCall(self, ast: FunctionCall) -> Union[AST, None]:
+        name = ast.id.value
+
+        # Funciones que inspeccionan la sintaxis de su argumento
+        if name in SYNTACTIC_FUNCTIONS:
+            return None
+
+        # Un if con condición constante se sustituye por la rama elegida, la
+        # otra nunca se evalúa
+        if name == 'if':
+            condition, exprT, exprF = ast.args
+            condition = yield from self.fold_child(condition)
+            if not is_constant(condition):
+                exprT = yield from self.fold_child(exprT)
+                exprF = yield from self.fold_child(exprF)
+                ast.args = [condition, exprT, exprF]
+                return None
+
+            ast.args[0] = condition
+            branch = exprT if constant_value(condition) else exprF
+            replacement = yield branch
+            return branch if replacement is None else replacement
+
+        args = []
+        for arg in ast.args:
+            args.append((yield from self.fold_child(arg)))
+        ast.args = args
+
+        if ast.effect == PURE and all(is_constant(arg) for arg in ast.args):
+            return self.compute(ast)
+        return None
+
+    def generic_visit(self, ast: AST):
+        raise Exception(f'Optimizador de {type(ast).__name__} no implementado')
+
+class ASTCommonSubexpressionMarker(ASTStackVisitor):
+    '''Subclase que implementa el patrón de diseño de Visitor para identificar
+    las subexpresiones sin más efectos que leer variables (operadores, if y
+    funciones puras) dentro de las expresiones acotadas de un AST validado y
+    anotado con sus efectos.
+
+    Cada visit_* retorna la llave estructural del nodo, o None si el nodo no
+    es candidato. La llave identifica la tupla con su clase, operador u
+    función y las llaves de sus hijos (ver SymTable.subexpression_key), por
+    lo que su tamaño no crece con la profundidad. Las subexpresiones que leen variables se registran
+    en la tabla de símbolos, que marca como compartidas las que tienen una
+    llave idéntica a la de otra fórmula viva. Los evaluadores calculan una
+    sola vez por ciclo de cómputo las subexpresiones compartidas.
+
+    Solo se consideran las expresiones acotadas: las expresiones evaluadas
+    directamente se calculan una única vez. Recorre el AST con una pila
+    explícita (ver ASTStackVisitor).
+    '''
+    def __init__(self, sym_table: SymTable):
+        self.sym_table = sym_table
+        self.quoted = 0
+
+    def mark(self, ast: AST):
+        '''Registra todas las subexpresiones candidatas del AST.'''
+        self.visit(ast)
+
+    def share(self, ast: AST, key: tuple) -> int:
+        key = self.sym_table.subexpression_key(key)
+        if ast.reads and self.quoted:
+            self.sym_table.register_subexpression(key, ast)
+        return key
+
+    # ---- CASOS BASE (TERMINALES) ----
+    def visit_Number(self, ast: Number) -> int:
+        # 1 y 1.0 no se imprimen igual, y 0.0 y -0.0 son iguales pero dan
+        # resultados distintos: la llave usa la representación del valor
+        return self.sym_table.subexpression_key(
+            ('Number', type(ast.value).__name__, repr(ast.value)))
+
+    def visit_Boolean(self, ast: Boolean) -> int:
+        return self.sym_table.subexpression_key(('Boolean', ast.value))
+
+    def visit_Id(self, ast: Id) -> int:
+        return self.sym_table.subexpression_key(('Id', ast.value))
+
+    def visit_Folded(self, ast: Folded) -> Union[int, None]:
+        return (yield ast.expr)
+
+    # ---- OPERADORES ----
+    def visit_BinOp(self, ast: BinOp) -> Union[int, None]:
+        # También visita los nodos Comparison, subclase de BinOp
+        lhs = yield ast.lhs
+        rhs = yield ast.rhs
+
+        if lhs is None or rhs is None:
+            return None
+        return self.share(ast, (type(ast).__name__, ast.op, lhs, rhs))
+
+    def visit_UnOp(self, ast: UnOp) -> Union[int, None]:
+        term = yield ast.term
+
+        if term is None:
+            return None
+        return self.share(ast, ('UnOp', ast.op, term))
+
+    # ---- DEFINICIONES Y ASIGNACIONES ----
+    def visit_SymDef(self, ast: SymDef) -> None:
+        yield ast.rhs
+
+    def visit_Assign(self, ast: Assign) -> None:
+        yield ast.rhs
+
+    def visit_AssignArrayElement(self, ast: AssignArrayElement) -> None:
+        yield ast.rhs
+
+    # ---- OTRAS EXPRESIONES ----
+    def visit_Quoted(self, ast: Quoted) -> None:
+        # El valor de una expresión acotada es su AST, no es candidata
+        self.quoted += 1
+        try:
+            yield ast.expr
+        finally:
+            self.quoted -= 1
+
+    def visit_Array(self, ast: Array) -> None:
+        for el in ast.elements:
+            yield el
+
+    def visit_ArrayAccess(self, ast: ArrayAccess) -> None:
+        # Los arreglos en variables tienen su propia memoización
+        yield ast.index
+        yield ast.expr
+
+    def visit_FunctionCall(self, ast: FunctionCall) -> Union[int, None]:
+        name = ast.id.value
+
+        # Funciones que inspeccionan la sintaxis de su argumento
+        if name in SYNTACTIC_FUNCTIONS:
+            return None
+
+        args = []
+        for arg in ast.args:
+            args.append((yield arg))
+        if ast.effect > READS or None in args:
+            return None
+        return self.share(ast, ('FunctionCall', name, *args))
+
+    def generic_visit(self, ast: AST):
+        raise Exception(f'Optimizador de {type(ast).__name__} no implementado')
+
+class ASTReductionFuser(ASTStackVisitor):
+    '''Subclase que implementa el patrón de diseño de Visitor para marcar
+    las reducciones (sum, avg y length) aplicadas directamente a una llamada
+    a array en un AST validado, por ejemplo sum(array(n, 'uniform()')).
+
+    Los evaluadores calculan las reducciones marcadas en un solo recorrido
+    de los valores de los elementos, sin crear el arreglo (ver
+    FUSED_REDUCTION_HANDLERS), con el mismo resultado que al crearlo.
+    Recorre el AST con una pila explícita (ver ASTStackVisitor).
+    '''
+    def fuse(self, ast: AST):
+        '''Marca todas las reducciones fusionables del AST.'''
+        self.visit(ast)
+
+    # ---- CASOS BASE (TERMINALES) ----
+    def visit_Number(self, ast: Number) -> None:
+        return None
+
+    def visit_Boolean(self, ast: Boolean) -> None:
+        return None
+
+    def visit_Id(self, ast: Id) -> None:
+        return None
+
+    def visit_Folded(self, ast: Folded) -> None:
+        # Las subexpresiones sustituidas ya no se evalúan
+        return None
+
+    # ---- OPERADORES ----
+    def visit_BinOp(self, ast: BinOp) -> None:
+        # También visita los nodos Comparison, subclase de BinOp
+        yield ast.lhs
+        yield ast.rhs
+
+    def visit_UnOp(self, ast: UnOp) -> None:
+        yield ast.term
+
+    # ---- DEFINICIONES Y ASIGNACIONES ----
+    def visit_SymDef(self, ast: SymDef) -> None:
+        yield ast.rhs
+
+    def visit_Assign(self, ast: Assign) -> None:
+        yield ast.rhs
+
+    def visit_AssignArrayElement(self, ast: AssignArrayElement) -> None:
+        yield ast.rhs
+
+    # ---- OTRAS EXPRESIONES ----
+    def visit_Quoted(self, ast: Quoted) -> None:
+        yield ast.expr
+
+    def visit_Array(self, ast: Array) -> None:
+        for el in ast.elements:
+            yield el
+
+    def visit_ArrayAccess(self, ast: ArrayAccess) -> None:
+        yield ast.index
+        yield ast.expr
+
+    def visit_FunctionCall(self, ast: FunctionCall) -> None:
+        if ast.id.value in FUSED_REDUCTION_HANDLERS and len(ast.args) == 1:
+            arg, = ast.args
+            ast.fused = (isinstance(arg, FunctionCall)
+                and arg.id.value == 'array')
+
+        for arg in ast.args:
+            yield arg
+
+    def generic_visit(self, ast: AST):
+        raise Exception(f'Optimizador de {type(ast).__name__} no implementado')
+
+def is_constant(ast: AST) -> bool:
+    '''Retorna un booleano indicando si el nodo (posiblemente sustituido por
+    un Folded) es un valor constante.
+    '''
+    if isinstance(ast, Folded):
+        ast = ast.expr
+    return isinstance(ast, (Number, Boolean))
+
+def constant_value(ast: AST) -> Union[int, float, bool]:
+    '''Retorna el valor de un nodo constante (ver is_constant).'''
+    if isinstance(ast, Folded):
+        ast = ast.expr
+    return ast.value
+
+def is_small_power(base: Union[int, float], exponent: Union[int, float]) -> bool:
+    '''Retorna un booleano indicando si base ^ exponent se puede calcular al
+    plegar constantes: las potencias con números de punto flotante tienen
+    costo constante, y las enteras solo si su resultado tiene a lo sumo
+    MAX_FOLDED_POWER_BITS bits.
+    '''
+    if not (isinstance(base, int) and isinstance(exponent, int)):
+        return True
+    if exponent <= 0 or abs(base) <= 1:
+        return True
+    return exponent * log2(abs(base)) <= MAX_FOLDED_POWER_BITS
@@ -0,0 +1,182 @@
+"""Reparto de muestreos de Stókhos entre varios procesos.
+Copyright (C) 2022 Arturo Yepez - Jesus Bandez - Christopher Gómez
+CI3725 - Traductores e Interpretadores
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pickle import PicklingError, dumps, loads
+from typing import Optional
+
+from ..AST import *
+from ..symtable import SymTable, SymVar
+from .effects import resolve_effect, resolve_reads
+
+def symbol_slice(ast: AST, sym_table: SymTable) -> list[tuple]:
+    '''Retorna el nombre, tipo y valor de las variables que lee el AST
+    (transitivamente), la parte de la tabla de símbolos que necesita un
+    proceso para evaluarlo.
+    '''
+    symbols = []
+    for name in sorted(resolve_reads(ast, sym_table)):
+        lookup = sym_table.lookup(name) if sym_table.exists(name) else None
+        if isinstance(lookup, SymVar):
+            symbols.append((name, lookup.type, lookup.value))
+    return symbols
+
+def split(n: int, parts: int) -> list[int]:
+    '''Reparte n en parts enteros que difieren a lo sumo en 1.'''
+    return [n // parts + (i < n % parts) for i in range(parts)]
+
+def run_worker(payload: bytes, cycle: int, lane: int, rng: tuple,
+    *args) -> object:
+    '''Punto de entrada de cada proceso: reconstruye la tabla de símbolos y
+    el evaluador, con el ciclo de cómputo, el carril y el estado del
+    generador de números aleatorios (semilla, primer sitio, secuencia de
+    baja discrepancia y dimensiones de la fórmula muestreada) indicados, y
+    retorna task(evaluador, *args, *task_args). El payload es la copia
+    serializada de la clase del evaluador, las variables, task y task_args
+    (ver run_workers).
+    '''
+    evaluator_class, symbols, task, task_args = loads(payload)
+    sym_table = SymTable()
+    sym_table.rng.seed(rng[0])
+    sym_table.rng.first_site = rng[1]
+    sym_table.rng.set_sequence(rng[2])
+    sym_table.rng.set_dimensions(rng[3])
+    for name, _type, value in symbols:
+        sym_table.insert(name, _type, value)
+    sym_table.cycle = cycle
+    sym_table.lane = lane
+
+    return task(evaluator_class(sym_table), *args, *task_args)
+
+def run_workers(evaluator, symbols: list[tuple], shares: list[int],
+    task: callable, *args) -> Optional[list]:
+    '''Ejecuta task(evaluador, parte, desplazamiento, *args) en un proceso
+    por cada parte de shares, con las variables indicadas, y retorna la
+    lista de resultados en el orden de las partes. El desplazamiento de
+    cada parte es la suma de las anteriores. Si task lanza un error en
+    algún proceso, se lanza el de la primera parte que falló.
+
+    Los procesos usan la misma semilla, secuencia, dimensiones, ciclo de
+    cómputo y carril que el evaluador: como los números aleatorios solo
+    dependen de ellos, del sitio y del desplazamiento de cada parte (ver
+    RandomSource), los resultados son los mismos que en un solo proceso.
+    Retorna None si no se pudo copiar los datos a los procesos, iniciarlos,
+    o si alguno terminó abruptamente.
+    '''
+    sym_table = evaluator.sym_table
+    rng = (sym_table.rng.seed_value, sym_table.rng.first_site,
+        sym_table.rng.sequence, sym_table.rng.dimensions)
+    offsets = [sum(shares[:i]) for i in range(len(shares))]
+
+    # Los datos se serializan aquí, una sola vez, para distinguir los que no
+    # se pueden copiar de los errores que lanza task en los procesos
+    try:
+        payload = dumps((type(evaluator), symbols, task, args))
+    except (PicklingError, AttributeError, TypeError):
+        return None
+
+    with ProcessPoolExecutor(max_workers=len(shares)) as pool:
+        try:
+            futures = [pool.submit(run_worker, payload, sym_table.cycle,
+                sym_table.lane, rng, share, offset)
+                for share, offset in zip(shares, offsets)]
+        except (BrokenProcessPool, OSError):
+            # No se pudo iniciar los procesos
+            return None
+
+        try:
+            return [future.result() for future in futures]
+        except BrokenProcessPool:
+            # Un proceso terminó abruptamente
+            return None
+
+def worker_count(evaluator, n: int, x: AST) -> int:
+    '''Retorna el número de procesos entre los que conviene repartir n
+    evaluaciones de x: a lo sumo evaluator.workers, con al menos
+    evaluator.parallel_threshold evaluaciones cada uno. Las expresiones que
+    modifican el estado de la VM (con tick, por ejemplo) no se reparten.
+    '''
+    workers = min(evaluator.workers, n // max(evaluator.parallel_threshold, 1))
+    if workers < 2 or resolve_effect(x, evaluator.sym_table) >= STATE:
+        return 1
+    return workers
+
+def parallel_samples(evaluator, x: AST, n_samples: int, task: callable,
+    *args) -> Optional[list]:
+    '''Reparte n_samples muestras de x (cada una en un nuevo ciclo de
+    cómputo) entre los procesos del evaluador. Cada proceso ejecuta
+    task(evaluador, x, muestras, *args) con una copia de las variables que
+    lee x, y se retorna la lista de sus resultados parciales.
+
+    Las muestras son las mismas que las de un solo proceso. El ciclo de
+    cómputo avanza en n_samples, como si se hubieran tomado aquí.
+
+    Retorna None si no conviene o no se puede repartir (ver worker_count y
+    run_workers); en ese caso, quien llama debe muestrear en este proceso.
+    '''
+    workers = worker_count(evaluator, n_samples, x)
+    if workers < 2:
+        return None
+
+    symbols = symbol_slice(x, evaluator.sym_table)
+    results = run_workers(evaluator, symbols, split(n_samples, workers),
+        sample_task, task, x, *args)
+    if results is not None:
+        evaluator.sym_table.cycle += n_samples
+    return results
+
+def sample_task(evaluator, share: int, offset: int, task: callable, x: AST,
+    *args):
+    '''Tarea de parallel_samples en cada proceso: sus muestras empiezan
+    offset ciclos más adelante.
+    '''
+    evaluator.sym_table.cycle += offset
+    return task(evaluator, x, share, *args)
+
+def parallel_elements(evaluator, init: AST, n: int,
+    task: callable) -> Optional[list]:
+    '''Reparte n evaluaciones de init en el ciclo de cómputo actual (los
+    elementos de un arreglo) entre los procesos del evaluador. Cada proceso
+    ejecuta task(evaluador, elementos, primero, init), donde primero es el
+    índice de su primer elemento, y se retorna la lista de sus resultados,
+    en orden.
+
+    Los elementos de un mismo ciclo comparten el valor memoizado de cada
+    variable, por lo que los procesos reciben los valores que tienen aquí
+    las variables que lee init, en lugar de sus fórmulas. Si alguna no se
+    puede evaluar, los elementos se evalúan en este proceso (el error solo
+    se reporta si un elemento la lee).
+
+    Retorna None si no conviene o no se puede repartir (ver worker_count y
+    run_workers); en ese caso, quien llama debe evaluar los elementos en
+    este proceso.
+    '''
+    workers = worker_count(evaluator, n, init)
+    if workers < 2 or isinstance(init, Terminal):
+        return None
+
+    symbols = []
+    for name in sorted(init.reads):
+        lookup = evaluator.sym_table.lookup(name)
+        try:
+            value = evaluator.visit(Id(name))
+        except StkRuntimeError:
+            return None
+        symbols.append((name, lookup.type, value))
+
+    return run_workers(evaluator, symbols, split(n, workers), task, init)
@@ -0,0 +1,204 @@
+"""Evaluación de AST de Stókhos sobre valores nativos de Python.
+Copyright (C) 2022 Arturo Yepez - Jesus Bandez - Christopher Gómez
+CI3725 - Traductores e Interpretadores
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from functools import partial
+
+from ..AST import *
+from ..symtable import SymFunction, SymTable
+from .evaluators import SHORT_CIRCUIT_OP, ASTEvaluator
+from .helpers import ASTNodeVisitor
+from .operators import RAW_BINARY_OP, RAW_UNARY_OP, apply_binop
+
+def box(_type: Type, value: object) -> Terminal:
+    '''Envuelve un valor nativo en el terminal de su tipo escalar.'''
+    return Number(value) if _type == NUM else Boolean(value)
+
+class ASTUnboxedCompiler(ASTNodeVisitor):
+    '''Subclase que implementa el patrón de diseño de Visitor para traducir
+    las subexpresiones escalares (de tipo num o bool) de un AST ya validado
+    a closures de Python que retornan valores nativos (float, int o bool),
+    sin crear un terminal por cada operación.
+
+    Los nodos que no se pueden evaluar sobre valores nativos (expresiones
+    entre comillas, arreglos, funciones especiales distintas de if...) se
+    compilan a None, al igual que los nodos escalares que los contienen; el
+    evaluador los evalúa con los terminales de siempre. La closure compilada
+    se guarda en el propio nodo, igual que en ASTClosureCompiler.
+    '''
+    def __init__(self, evaluator: ASTEvaluator):
+        self.evaluator = evaluator
+        self.sym_table = evaluator.sym_table
+
+    def compile(self, ast: AST) -> callable:
+        '''Retorna la closure sobre valores nativos asociada al AST,
+        compilándola si no existe, o None si el nodo no es escalar.
+        '''
+        try:
+            return ast._unboxed
+        except AttributeError:
+            pass
+
+        if getattr(ast, 'type', None) not in [NUM, BOOL]:
+            closure = None
+        else:
+            closure = self.visit(ast)
+            if closure is not None and ast.cse_key is not None:
+                closure = self.share(ast, closure)
+
+        # Los terminales creados al evaluar no se anotan
+        if not isinstance(ast, (Number, Boolean)):
+            ast._unboxed = closure
+        return closure
+
+    def share(self, ast: AST, closure: callable) -> callable:
+        '''Envuelve la closure de una subexpresión candidata para que, si
+        está compartida, se calcule una sola vez por ciclo de cómputo. Los
+        valores compartidos de subexpresiones escalares son nativos.
+        '''
+        shared = self.evaluator.shared
+        key = ast.cse_key
+
+        def load_shared():
+            if ast.cse_shared:
+                return shared(key, closure)
+            return closure()
+
+        return load_shared
+
+    # ---- CASOS BASE (TERMINALES) ----
+    def visit_Number(self, ast: Number) -> callable:
+        value = ast.value
+        return lambda: value
+
+    def visit_Boolean(self, ast: Boolean) -> callable:
+        value = ast.value
+        return lambda: value
+
+    def visit_Folded(self, ast: Folded) -> callable:
+        return self.compile(ast.expr)
+
+    # ---- NODOS RECURSIVOS ----
+    def visit_Id(self, ast: Id) -> callable:
+        # Los valores en la tabla de símbolos son terminales, la carga se
+        # delega en el evaluador para respetar la memoización
+        visit_Id = self.evaluator.visit_Id
+        return lambda: visit_Id(ast).value
+
+    # ---- OPERADORES ----
+    def visit_BinOp(self, ast: BinOp) -> callable:
+        # También visita los nodos Comparison, subclase de BinOp
+        lhs = self.compile(ast.lhs)
+        rhs = self.compile(ast.rhs)
+        if lhs is None or rhs is None:
+            return None
+
+        if ast.op in SHORT_CIRCUIT_OP:
+            decisive = SHORT_CIRCUIT_OP[ast.op]
+
+            def logical():
+                p = lhs()
+                if bool(p) is decisive:
+                    return p
+                return rhs()
+
+            return logical
+
+        op = RAW_BINARY_OP[ast.op]
+        if ast.op not in ['/', '%', '^']:
+            return lambda: op(lhs(), rhs())
+        return lambda: apply_binop(ast, lhs(), rhs())
+
+    def visit_UnOp(self, ast: UnOp) -> callable:
+        op = RAW_UNARY_OP[ast.op]
+        term = self.compile(ast.term)
+        if term is None:
+            return None
+        return lambda: op(term())
+
+    # ---- OTRAS EXPRESIONES ----
+    def visit_ArrayAccess(self, ast: ArrayAccess) -> callable:
+        # Los elementos de arreglos son terminales, el acceso se delega en
+        # el evaluador
+        visit_ArrayAccess = self.evaluator.visit_ArrayAccess
+        return lambda: visit_ArrayAccess(ast).value
+
+    def visit_FunctionCall(self, ast: FunctionCall) -> callable:
+        name = ast.id.value
+
+        if name == 'if':
+            condition, exprT, exprF = [self.compile(arg) for arg in ast.args]
+            if None in [condition, exprT, exprF]:
+                return None
+            return lambda: exprT() if condition() else exprF()
+
+        # Las demás funciones especiales se evalúan con terminales
+        function = self.sym_table.lookup(name)
+        if not isinstance(function, SymFunction) or function.raw is None:
+            return None
+
+        f = function.raw
+        if ast.site is not None:
+            f = partial(f, ast.site)
+        args = [self.compile(arg) for arg in ast.args]
+        if None in args:
+            return None
+
+        # Casos especializados por aridad, los más comunes
+        if len(args) == 0:
+            return f
+        if len(args) == 1:
+            arg, = args
+            return lambda: f(arg())
+        if len(args) == 2:
+            lhs, rhs = args
+            return lambda: f(lhs(), rhs())
+        return lambda: f(*[arg() for arg in args])
+
+    def generic_visit(self, ast: AST):
+        return None
+
+
+class ASTUnboxedEvaluator(ASTEvaluator):
+    '''Evaluador que calcula las subexpresiones escalares sobre valores
+    nativos de Python, y los envuelve en terminales de Stókhos solo en los
+    límites: el resultado retornado a la VM, los valores guardados en la
+    tabla de símbolos y los elementos de arreglos.
+
+    Produce los mismos resultados que ASTEvaluator, creando un terminal por
+    expresión evaluada (o variable recalculada) en lugar de uno por
+    operación. Las expresiones que no son escalares, o que contienen nodos
+    que no se pueden evaluar sobre valores nativos, se evalúan con los
+    métodos visit_* del evaluador base.
+    '''
+    def __init__(self, sym_table: SymTable):
+        super().__init__(sym_table)
+        self.compiler = ASTUnboxedCompiler(self)
+
+    def visit(self, ast: AST) -> AST:
+        if isinstance(ast, (Number, Boolean)):
+            return ast
+
+        closure = self.compiler.compile(ast)
+        if closure is None:
+            return super().visit(ast)
+        return box(ast.type, closure())
+
+    def evaluate_value(self, ast: AST) -> object:
+        closure = self.compiler.compile(ast)
+        if closure is None:
+            return super().evaluate_value(ast)
+        return closure()
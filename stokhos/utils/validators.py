@@ -17,17 +17,37 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 from ..AST import *
 from ..symtable import SymTable
+from .effects import ASTEffectAnalyzer
 from .err_strings import *
-from .helpers import ASTNodeVisitor
+from .helpers import ASTStackVisitor
+from .optimizers import (ASTCommonSubexpressionMarker, ASTConstantFolder,
+    ASTReductionFuser)
 
 
-class ASTValidator(ASTNodeVisitor):
+class ASTValidator(ASTStackVisitor):
     '''Subclase que implementa el patrón de diseño de Visitor para visitar
     recursivamente todos los tipo nodos de AST, tranformando en cada paso
     los árboles (anotándolos con su tipo si es válida la expresión)
+
+    Tras validar un árbol, se anotan sus nodos con sus efectos (ver
+    ASTEffectAnalyzer), se calculan una sola vez sus subexpresiones
+    constantes (ver ASTConstantFolder), se registran sus subexpresiones
+    comunes con otras fórmulas (ver ASTCommonSubexpressionMarker) y se
+    marcan sus reducciones de arreglos que no se crean (ver
+    ASTReductionFuser).
+
+    Todos estos recorridos usan una pila explícita en lugar de la recursión
+    de Python (ver ASTStackVisitor), por lo que la profundidad de las
+    expresiones no está limitada por la pila nativa. Los handlers de las
+    funciones especiales también son generadores, que se usan con yield
+    from.
     '''
     def __init__(self, sym_table: SymTable):
         self.sym_table = sym_table
+        self.analyzer = ASTEffectAnalyzer()
+        self.folder = ASTConstantFolder(sym_table)
+        self.marker = ASTCommonSubexpressionMarker(sym_table)
+        self.fuser = ASTReductionFuser()
 
     # ---- CASOS BASE (TERMINALES) ----
     def visit_Number(self, ast: Number) -> Type:
@@ -36,6 +56,9 @@ class ASTValidator(ASTNodeVisitor):
     def visit_Boolean(self, ast: Boolean) -> Type:
         return BOOL
 
+    def visit_Folded(self, ast: Folded) -> Type:
+        return ast.type
+
     def visit_Id(self, ast: Id) -> Type:
         # Verifica la existencia de la Id en la tabla de símbolos
         if self.sym_table.exists(ast.value):
@@ -50,36 +73,45 @@ class ASTValidator(ASTNodeVisitor):
     # ---- OPERADORES ----
     def visit_BinOp(self, ast: BinOp) -> Type:
         # Verifica que los operandos sean del mismo tipo según el operador
-        lhs_type = self.visit(ast.lhs)
-        rhs_type = self.visit(ast.rhs)
-        expected_type = BOOL if ast.op in ['&&', '||'] else NUM
+        lhs_type = yield ast.lhs
+        rhs_type = yield ast.rhs
 
-        if lhs_type == expected_type and rhs_type == expected_type:
-            ast.type = expected_type
-            return expected_type
+        if ast.op in ['&&', '||']:
+            if lhs_type == BOOL and rhs_type == BOOL:
+                ast.type = BOOL
+                return BOOL
+
+        # Los operadores aritméticos se aplican elemento a elemento si algún
+        # operando es un arreglo
+        elif lhs_type in [NUM, NUM_ARRAY] and rhs_type in [NUM, NUM_ARRAY]:
+            _type = NUM if lhs_type == rhs_type == NUM else NUM_ARRAY
+            ast.type = _type
+            return _type
         
         raise SemanticError(error_binop_operands(ast.op, lhs_type, rhs_type))
 
     def visit_Comparison(self, ast: Comparison) -> Type:
-        # Verifica que los operandos sean del mismo tipo según el operador
-        lhs_type = self.visit(ast.lhs)
-        rhs_type = self.visit(ast.rhs)
-        
-        if ast.op in ['<>', '=']:
-            if lhs_type == rhs_type:
-                if lhs_type in [NUM, BOOL]:
-                    ast.type = BOOL
-                    return BOOL
-        else:
-            if lhs_type == NUM and rhs_type == NUM:
-                ast.type = BOOL
-                return BOOL
+        # Verifica que los operandos sean del mismo tipo según el operador,
+        # o arreglos de ese tipo (comparación elemento a elemento)
+        lhs_type = yield ast.lhs
+        rhs_type = yield ast.rhs
+        element_types = [NUM, BOOL] if ast.op in ['<>', '='] else [NUM]
+
+        for element_type in element_types:
+            array_type = NUM_ARRAY if element_type == NUM else BOOL_ARRAY
+            if (lhs_type in [element_type, array_type]
+                and rhs_type in [element_type, array_type]
+            ):
+                scalar = lhs_type == rhs_type == element_type
+                _type = BOOL if scalar else BOOL_ARRAY
+                ast.type = _type
+                return _type
         
         raise SemanticError(error_binop_operands(ast.op, lhs_type, rhs_type))
 
     def visit_UnOp(self, ast: UnOp) -> Type:
         # Verifica que los operandos sean del tipo correcto según el operador
-        term_type = self.visit(ast.term)
+        term_type = yield ast.term
         expected_type = BOOL if ast.op == '!' else NUM
 
         if term_type == expected_type:
@@ -96,7 +128,7 @@ class ASTValidator(ASTNodeVisitor):
         
         # Verifica que el tipo del lado derecho de la definición sea consistente
         expected_type = ast.type
-        rhs_type = self.visit(ast.rhs)
+        rhs_type = yield ast.rhs
         
         if rhs_type == expected_type:
             return VOID
@@ -105,7 +137,7 @@ class ASTValidator(ASTNodeVisitor):
 
     def visit_Assign(self, ast: Assign):
         # Verifica que ya exista la variables en la tabla de símbolos
-        expected_type = self.visit(ast.id)
+        expected_type = yield ast.id
         
         # Verifica que no se intente asignar a una función
         if self.sym_table.is_function(ast.id.value):
@@ -113,7 +145,7 @@ class ASTValidator(ASTNodeVisitor):
                 'precargada, no se puede asignar')
 
         # Verifica que el tipo del lado derecho de la asignación sea consistente
-        rhs_type = self.visit(ast.rhs)
+        rhs_type = yield ast.rhs
 
         if expected_type == rhs_type:
             # Se anota el arbol del lado derecho con el tipo asignado
@@ -123,8 +155,8 @@ class ASTValidator(ASTNodeVisitor):
 
     def visit_AssignArrayElement(self, ast: AssignArrayElement) -> Type:
         # Verifica que el tipo del lado derecho de la asignación sea consistente
-        array_type = self.visit(ast.array_access)
-        rhs_type = self.visit(ast.rhs)
+        array_type = yield ast.array_access
+        rhs_type = yield ast.rhs
 
         if array_type == rhs_type:
             return VOID
@@ -133,7 +165,7 @@ class ASTValidator(ASTNodeVisitor):
 
     # ---- OTRAS EXPRESIONES ----
     def visit_Quoted(self, ast: Quoted) -> Type:
-        _type = self.visit(ast.expr)
+        _type = yield ast.expr
         ast.type = _type
         return _type
 
@@ -144,7 +176,7 @@ class ASTValidator(ASTNodeVisitor):
             ast.type = ANY_ARRAY
             return ANY_ARRAY
 
-        expected_type = self.visit(ast[0])
+        expected_type = yield ast[0]
 
         for el in ast:
             # Verifica que el tipo de cada elemento sea consistente# con el tipo
@@ -152,7 +184,7 @@ class ASTValidator(ASTNodeVisitor):
             if type(el) == Array:
                 raise SemanticError('Arreglos anidados no están permitidos')
             
-            el_type = self.visit(el)
+            el_type = yield el
             if el_type != expected_type:
                 raise SemanticError(f'El tipo de todos los elementos del '
                     f'arreglo debe ser {expected_type}, pero {el} es de tipo {el_type}')
@@ -163,13 +195,13 @@ class ASTValidator(ASTNodeVisitor):
 
     def visit_ArrayAccess(self, ast: ArrayAccess) -> Type:
         # Verifica que la Id corresponda a un arreglo
-        id_type = self.visit(ast.expr)
+        id_type = yield ast.expr
 
         if not isinstance(id_type.type, TypedArray):
             raise SemanticError('No se permite el acceso a arreglo para '
                 f'expresión de tipo {id_type}')
 
-        index_type = self.visit(ast.index)
+        index_type = yield ast.index
         if index_type == NUM:
             _type = Type(id_type.type.type)
             ast.type = _type
@@ -179,7 +211,7 @@ class ASTValidator(ASTNodeVisitor):
 
     def visit_FunctionCall(self, ast: FunctionCall):
         # Verifica que la id exista y sea una función
-        return_type = self.visit(ast.id)
+        return_type = yield ast.id
         
         if not self.sym_table.is_function(ast.id.value):
             raise SemanticError(f'Identificador "{ast.id}" no corresponde '
@@ -187,7 +219,7 @@ class ASTValidator(ASTNodeVisitor):
 
         f_args = self.sym_table.get_args(ast.id.value)
         if ast.id.value in SPECIAL_FUNCTION_HANDLERS:
-            _type = SPECIAL_FUNCTION_HANDLERS[ast.id.value](
+            _type = yield from SPECIAL_FUNCTION_HANDLERS[ast.id.value](
                 self,
                 *[return_type, ast.args, f_args, ast.id.value]
             )
@@ -204,11 +236,15 @@ class ASTValidator(ASTNodeVisitor):
 
         # Luego por sus tipos
         for i, expected_type in enumerate(f_args):
-            arg_type = self.visit(ast.args[i])
+            arg_type = yield ast.args[i]
             if arg_type != expected_type:
                 raise SemanticError(f'El tipo del argumento #{i + 1} es '
                     f'{arg_type}, pero se esperaba {expected_type}')
 
+        # Las llamadas con números aleatorios se identifican por su sitio
+        if self.sym_table.lookup(ast.id.value).sited and ast.site is None:
+            ast.site = self.sym_table.new_site()
+
         ast.type = return_type
         return return_type
 
@@ -216,7 +252,16 @@ class ASTValidator(ASTNodeVisitor):
         raise Exception(f'Validador de {type(ast).__name__} no implementado')
 
     def validate(self, ast: AST) -> Type:
-        return self.visit(ast)
+        _type = self.visit(ast)
+        self.optimize(ast)
+        return _type
+
+    def optimize(self, ast: AST):
+        '''Anota y optimiza un AST cuyos tipos ya se validaron.'''
+        self.analyzer.analyze(ast)
+        self.folder.fold(ast)
+        self.marker.mark(ast)
+        self.fuser.fuse(ast)
 
 # ---- Handlers de funciones especiales ----
 def pass_handler(validator: ASTValidator, *args):
@@ -228,7 +273,8 @@ def pass_handler(validator: ASTValidator, *args):
             f'{len(args[1])}')
 
     for arg in args[1]:
-        validator.validate(arg)
+        yield arg
+        validator.optimize(arg)
     return args[0]
 
 def if_handler(validator: ASTValidator, *args):
@@ -237,13 +283,13 @@ def if_handler(validator: ASTValidator, *args):
             f'3 argumentos, pero se recibieron {len(args[1])}')
 
     # Verifica que el primer argumento sea bool y los otros dos del mismo tipo
-    condition_type = validator.visit(args[1][0])
+    condition_type = yield args[1][0]
 
     if condition_type != BOOL:
         raise SemanticError(error_unexpected_type(condition_type, 'bool'))
 
-    exprT_type = validator.visit(args[1][1])
-    exprF_type = validator.visit(args[1][2])
+    exprT_type = yield args[1][1]
+    exprF_type = yield args[1][2]
     
     if exprT_type == exprF_type:
         if exprT_type is ANY_ARRAY:
@@ -259,12 +305,12 @@ def array_handler(validator, *args):
             f'2 argumentos, pero se recibieron {len(args[1])}')
 
     # Verifica que el primer argumento sea num y el otro num o bool
-    size_type = validator.visit(args[1][0])
+    size_type = yield args[1][0]
 
     if size_type != NUM:
         raise SemanticError(error_unexpected_type(size_type, 'num'))
 
-    init_type = validator.visit(args[1][1])
+    init_type = yield args[1][1]
 
     if init_type not in [NUM, BOOL]:
         raise SemanticError(f'El tipo del argumento #2 es '
@@ -272,6 +318,41 @@ def array_handler(validator, *args):
     
     return NUM_ARRAY if init_type == NUM else BOOL
 
+def stats_handler(validator, *args):
+    if len(args[1]) != 2:
+        raise SemanticError('La función "stats" esperaba '
+            f'2 argumentos, pero se recibieron {len(args[1])}')
+
+    # Verifica que ambos argumentos sean num (el primero, usualmente acotado)
+    for i, arg in enumerate(args[1]):
+        arg_type = yield arg
+        if arg_type != NUM:
+            raise SemanticError(f'El tipo del argumento #{i + 1} es '
+                f'{arg_type}, pero se esperaba num')
+
+    return NUM_ARRAY
+
+def quantile_handler(validator, *args):
+    if len(args[1]) != 3:
+        raise SemanticError('La función "quantile" esperaba '
+            f'3 argumentos, pero se recibieron {len(args[1])}')
+
+    # La expresión (usualmente acotada) y el número de muestras son num
+    for i, arg in enumerate(args[1][:2]):
+        arg_type = yield arg
+        if arg_type != NUM:
+            raise SemanticError(f'El tipo del argumento #{i + 1} es '
+                f'{arg_type}, pero se esperaba num')
+
+    # Se estima un cuantil por probabilidad
+    p_type = yield args[1][2]
+    if p_type == NUM:
+        return NUM
+    if p_type == NUM_ARRAY:
+        return NUM_ARRAY
+    raise SemanticError(f'El tipo del argumento #3 es {p_type}, pero se '
+        'esperaba num o [num]')
+
 # Diccionario de handlers de funciones especiales
 SPECIAL_FUNCTION_HANDLERS = {
     'type': pass_handler,
@@ -282,4 +363,6 @@ SPECIAL_FUNCTION_HANDLERS = {
     'formula': pass_handler,
     'array': array_handler,
     'histogram': pass_handler,
+    'stats': stats_handler,
+    'quantile': quantile_handler,
 }
@@ -0,0 +1,542 @@
+"""Evaluación en lote de AST de Stókhos sobre arreglos de NumPy.
+Copyright (C) 2022 Arturo Yepez - Jesus Bandez - Christopher Gómez
+CI3725 - Traductores e Interpretadores
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from math import exp, log, nan
+from typing import Optional
+
+# NumPy es opcional: sin él, el motor evalúa cada muestra por separado
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from ..AST import *
+from ..builtins.distributions import DISTRIBUTIONS
+from ..builtins.random_source import child_lane
+from ..symtable import SymFunction, SymTable, SymVar
+from .constants import ROOT_LANE
+from .effects import resolve_effect
+from .evaluators import SHORT_CIRCUIT_OP
+from .helpers import ASTNodeVisitor
+from .operators import RAW_UNARY_OP, apply_binop
+from .unboxed import ASTUnboxedEvaluator, box
+
+# Los enteros se calculan en int64 mientras su magnitud no supere la de los
+# enteros representables exactamente como flotantes
+MAX_EXACT_INT = 2 ** 53
+
+def elementwise(function: callable) -> callable:
+    '''Retorna la versión elemento a elemento de function (de math, o un
+    operador de Python), que calcula los mismos valores que la evaluación
+    escalar, mientras que los de NumPy pueden diferir en el último bit. Los
+    elementos en los que function falla o no retorna un número real quedan
+    en nan (quien llama los recalcula con patch).
+    '''
+    def apply(*values: object) -> float:
+        try:
+            return float(function(*values))
+        except (ArithmeticError, TypeError, ValueError):
+            return nan
+
+    def vectorized(*args: object) -> 'np.ndarray':
+        args = [arg.ravel().tolist() for arg in np.broadcast_arrays(*args)]
+        return np.fromiter(map(apply, *args), np.float64, len(args[0]))
+    return vectorized
+
+if np is not None:
+    # Operadores elementales, con la misma semántica que los de Python
+    VECTOR_BINARY_OP = {
+        '+': np.add,
+        '-': np.subtract,
+        '*': np.multiply,
+        '/': np.true_divide,
+        '%': np.mod,
+        '^': elementwise(pow),
+        '<': np.less,
+        '<=': np.less_equal,
+        '>': np.greater,
+        '>=': np.greater_equal,
+        '=': np.equal,
+        '<>': np.not_equal,
+    }
+    VECTOR_UNARY_OP = {
+        '+': np.positive,
+        '-': np.negative,
+        '!': np.logical_not,
+    }
+
+    # Funciones predefinidas con implementación elemental. floor, uniform y
+    # las distribuciones se tratan aparte
+    VECTOR_FUNCTIONS = {
+        'ln': elementwise(log),
+        'exp': elementwise(exp),
+        'sin': np.sin,
+        'cos': np.cos,
+        'sqrt': np.sqrt,
+    }
+
+def kind(value: object) -> str:
+    '''Retorna la clase de valor nativo de un escalar o arreglo de NumPy:
+    'b' (bool), 'i' (int) o 'f' (float).
+    '''
+    if isinstance(value, np.ndarray):
+        return value.dtype.kind
+    if isinstance(value, bool):
+        return 'b'
+    return 'i' if isinstance(value, int) else 'f'
+
+class ASTVectorizer(ASTNodeVisitor):
+    '''Subclase que implementa el patrón de diseño de Visitor para evaluar
+    un AST escalar ya validado n veces a la vez (una por carril), sobre
+    arreglos de NumPy. Cada subexpresión se calcula como un escalar de
+    Python, si tiene el mismo valor en todos los carriles, o como un arreglo
+    con un valor por carril.
+
+    Cada llamada a uniform() produce un número aleatorio distinto por
+    carril. Con per_cycle, cada carril es un ciclo de cómputo distinto (como
+    las muestras de histogram) y las variables se evalúan por carril; si no,
+    todos los carriles comparten el ciclo actual (como los elementos first
+    en adelante de un arreglo) y las variables se cargan una sola vez a
+    través del evaluador. En ambos casos, los números aleatorios son los
+    mismos que los de la evaluación escalar (ver RandomSource).
+
+    Los carriles en los que la evaluación escalar lanzaría una excepción se
+    registran en errors, con la excepción correspondiente. Solo cuentan los
+    carriles activos: los que toman la rama evaluada de un if y aquellos en
+    los que el operando izquierdo de && o || no determina el resultado. Los
+    carriles con valores excepcionales (no finitos, o divisores nulos) se
+    recalculan con la semántica escalar, de modo que los valores y mensajes
+    de error coinciden con los de ASTEvaluator.
+
+    Si el AST contiene nodos que no se pueden vectorizar, se lanza una
+    excepción VectorizeError antes de modificar la tabla de símbolos (salvo
+    por la memoización de variables en el ciclo actual).
+    '''
+    def __init__(self, evaluator: ASTUnboxedEvaluator, n: int, per_cycle: bool,
+        first: int = 0):
+        self.evaluator = evaluator
+        self.sym_table = evaluator.sym_table
+        self.n = n
+        self.per_cycle = per_cycle
+
+        # Ciclo de cómputo y carril del generador de números aleatorios en
+        # cada carril de la evaluación
+        cycle, lane = self.sym_table.cycle, self.sym_table.lane
+        if per_cycle:
+            self.cycles = cycle + 1 + np.arange(n, dtype=np.uint64)
+            self.streams = lane
+        else:
+            self.cycles = cycle
+            self.streams = np.uint64(child_lane(lane, first)) \
+                + np.arange(n, dtype=np.uint64)
+
+        # Carriles activos (None si lo están todos) y errores registrados,
+        # en el orden en que los encontraría la evaluación escalar
+        self.active = None
+        self.records = []
+
+        # Variables evaluadas por carril: valores y errores propios
+        self.memo = {}
+        self.in_progress = set()
+
+    def run(self, ast: AST) -> tuple[list, dict]:
+        '''Evalúa el AST en todos los carriles. Retorna la lista de valores
+        nativos, uno por carril, y un diccionario con la excepción de cada
+        carril en el que falló la evaluación.
+        '''
+        with np.errstate(all='ignore'):
+            values = self.visit(ast)
+
+        errors = {}
+        for record in self.records:
+            for lane, exc in record.items():
+                errors.setdefault(lane, exc)
+
+        if isinstance(values, np.ndarray):
+            return values.tolist(), errors
+        return [values] * self.n, errors
+
+    def commit(self, errors: dict):
+        '''Avanza el ciclo de cómputo en n, como si cada carril se hubiese
+        evaluado en un nuevo ciclo, y deja en la memoización de las variables
+        evaluadas por carril los valores del último.
+        '''
+        self.sym_table.cycle += self.n
+        last = self.n - 1
+        if last in errors:
+            return
+
+        for name, (values, record) in self.memo.items():
+            lookup = self.sym_table.lookup(name)
+            value = values[last].item() if isinstance(values, np.ndarray) \
+                else values
+            lookup.cache = box(lookup.type, value)
+            lookup.last_cycle = self.sym_table.cycle
+
+    # ---- CARRILES ----
+    def mask(self, lanes: object) -> object:
+        '''Restringe una máscara de carriles a los carriles activos.'''
+        if self.active is None:
+            return lanes
+        return lanes & self.active
+
+    def record(self, errors: dict):
+        '''Registra los errores de los carriles activos.'''
+        if self.active is not None:
+            errors = {lane: exc for lane, exc in errors.items()
+                if self.active[lane]}
+        if errors:
+            self.records.append(errors)
+
+    def lanes(self, values: object) -> 'np.ndarray':
+        '''Retorna los valores de los carriles activos.'''
+        values = np.broadcast_to(values, (self.n,))
+        return values if self.active is None else values[self.active]
+
+    def fail(self, exc: Exception):
+        '''Registra el mismo error en todos los carriles activos.'''
+        if self.active is None:
+            self.records.append(dict.fromkeys(range(self.n), exc))
+        else:
+            self.records.append(dict.fromkeys(
+                np.flatnonzero(self.active).tolist(), exc))
+
+    def scalar(self, compute: callable, *args) -> object:
+        '''Calcula con la semántica escalar un valor que es igual en todos los
+        carriles. Si falla, el error se registra en los carriles activos.
+        '''
+        try:
+            return compute(*args)
+        except Exception as e:
+            self.fail(e)
+            return 0
+
+    def patch(self, values: 'np.ndarray', lanes: 'np.ndarray',
+        compute: callable, *args) -> 'np.ndarray':
+        '''Recalcula con la semántica escalar los carriles activos indicados
+        por la máscara lanes, y registra los errores que ocurran.
+        '''
+        errors = {}
+        lanes = np.broadcast_to(lanes, (self.n,))
+        for lane in np.flatnonzero(self.mask(lanes)).tolist():
+            lane_args = [arg[lane].item() if isinstance(arg, np.ndarray)
+                else arg for arg in args]
+            try:
+                values[lane] = compute(*lane_args)
+            except Exception as e:
+                errors[lane] = e
+                values[lane] = 0
+        if errors:
+            self.records.append(errors)
+        return values
+
+    def check_int(self, values: object) -> object:
+        '''Verifica que los enteros calculados en int64 sean exactos.'''
+        if kind(values) == 'i' and np.any(np.abs(values) > MAX_EXACT_INT):
+            raise VectorizeError('Entero fuera del rango de int64')
+        return values
+
+    # ---- CASOS BASE (TERMINALES) ----
+    def visit_Number(self, ast: Number) -> object:
+        return self.check_int(ast.value)
+
+    def visit_Boolean(self, ast: Boolean) -> object:
+        return ast.value
+
+    def visit_Folded(self, ast: Folded) -> object:
+        return self.visit(ast.expr)
+
+    # ---- NODOS RECURSIVOS ----
+    def visit_Id(self, ast: Id) -> object:
+        name = ast.value
+        lookup = self.sym_table.lookup(name)
+        if not isinstance(lookup, SymVar) or isinstance(lookup.value, Array):
+            raise VectorizeError(f'No se puede vectorizar "{name}"')
+
+        if not self.per_cycle:
+            # Todos los carriles comparten el valor memoizado en el ciclo
+            if self.active is not None and not self.active.any():
+                return 0
+            try:
+                value = self.evaluator.visit_Id(ast)
+            except Exception as e:
+                self.fail(e)
+                return 0
+
+            if not isinstance(value, (Number, Boolean)):
+                raise VectorizeError(f'No se puede vectorizar "{name}"')
+            return self.check_int(value.value)
+
+        # Cada variable se evalúa una vez por carril (en todos ellos), y sus
+        # errores se registran en los carriles activos donde se lee
+        if name not in self.memo:
+            if name in self.in_progress:
+                raise VectorizeError(f'Dependencia circular en "{name}"')
+
+            # Como en la evaluación escalar, las fórmulas se evalúan en el
+            # carril raíz
+            active, records, streams = self.active, self.records, self.streams
+            self.active, self.records = None, []
+            self.streams = ROOT_LANE
+            self.in_progress.add(name)
+            try:
+                values = self.visit(lookup.value)
+            finally:
+                self.in_progress.discard(name)
+                var_records = self.records
+                self.active, self.records = active, records
+                self.streams = streams
+
+            self.memo[name] = (values, var_records)
+
+        values, var_records = self.memo[name]
+        for errors in var_records:
+            self.record(errors)
+        return values
+
+    # ---- OPERADORES ----
+    def visit_BinOp(self, ast: BinOp) -> object:
+        # También visita los nodos Comparison, subclase de BinOp
+        if ast.op in SHORT_CIRCUIT_OP:
+            return self.short_circuit(ast)
+
+        lhs = self.visit(ast.lhs)
+        rhs = self.visit(ast.rhs)
+        if not isinstance(lhs, np.ndarray) and not isinstance(rhs, np.ndarray):
+            return self.check_int(self.scalar(apply_binop, ast, lhs, rhs))
+
+        op = ast.op
+        integers = kind(lhs) == 'i' and kind(rhs) == 'i'
+        if op == '^' and integers:
+            # Con exponente negativo, la potencia de enteros es un flotante
+            negative = self.lanes(np.asarray(rhs) < 0)
+            if negative.any() and not negative.all():
+                raise VectorizeError('Potencia entera con exponentes de signo '
+                    'distinto')
+
+            values = VECTOR_BINARY_OP[op](lhs, rhs)
+            values = self.patch(values, ~np.isfinite(values),
+                lambda p, q: apply_binop(ast, p, q), lhs, rhs)
+            if negative.any():
+                return values
+            if np.any(np.abs(values) > MAX_EXACT_INT):
+                raise VectorizeError('Entero fuera del rango de int64')
+            return values.astype(np.int64)
+
+        values = VECTOR_BINARY_OP[op](lhs, rhs)
+        if isinstance(ast, Comparison):
+            return values
+
+        # La división de enteros produce flotantes
+        if integers and op != '/':
+            if op == '%':
+                values = self.patch(values, np.asarray(rhs) == 0,
+                    lambda p, q: apply_binop(ast, p, q), lhs, rhs)
+            return self.check_int(values)
+
+        # Divisores nulos, desbordamientos y resultados complejos producen
+        # valores no finitos
+        return self.patch(values, ~np.isfinite(values),
+            lambda p, q: apply_binop(ast, p, q), lhs, rhs)
+
+    def short_circuit(self, ast: BinOp) -> object:
+        decisive = SHORT_CIRCUIT_OP[ast.op]
+        lhs = self.visit(ast.lhs)
+
+        if not isinstance(lhs, np.ndarray):
+            if bool(lhs) is decisive:
+                return lhs
+            return self.visit(ast.rhs)
+
+        # El operando derecho solo se evalúa en los carriles que no quedan
+        # determinados por el izquierdo
+        pending = self.mask(lhs != decisive)
+        if not pending.any():
+            return lhs
+
+        active = self.active
+        self.active = pending
+        try:
+            rhs = self.visit(ast.rhs)
+        finally:
+            self.active = active
+
+        if decisive:
+            return np.logical_or(lhs, rhs)
+        return np.logical_and(lhs, rhs)
+
+    def visit_UnOp(self, ast: UnOp) -> object:
+        term = self.visit(ast.term)
+        if not isinstance(term, np.ndarray):
+            return RAW_UNARY_OP[ast.op](term)
+        return VECTOR_UNARY_OP[ast.op](term)
+
+    # ---- OTRAS EXPRESIONES ----
+    def visit_FunctionCall(self, ast: FunctionCall) -> object:
+        name = ast.id.value
+
+        if name == 'if':
+            return self.branch(*ast.args)
+
+        function = self.sym_table.lookup(name)
+        if not isinstance(function, SymFunction) or function.raw is None:
+            raise VectorizeError(f'No se puede vectorizar la función "{name}"')
+
+        if name == 'uniform':
+            values = self.sym_table.rng.uniform_array(ast.site or 0,
+                self.cycles, self.streams)
+            return np.broadcast_to(values, (self.n,)).copy()
+
+        args = [self.visit(arg) for arg in ast.args]
+        if name in DISTRIBUTIONS:
+            return self.distribution(ast, args)
+        if not any(isinstance(arg, np.ndarray) for arg in args):
+            return self.check_int(self.scalar(function.raw, *args))
+
+        x, = args
+        if name == 'floor':
+            if kind(x) == 'i':
+                return x
+            exceptional = ~np.isfinite(x)
+            values = np.floor(np.where(exceptional, 0, x))
+            values = self.patch(values, exceptional, function.raw, x)
+            return self.check_int(values.astype(np.int64))
+
+        if name not in VECTOR_FUNCTIONS:
+            raise VectorizeError(f'No se puede vectorizar la función "{name}"')
+
+        values = VECTOR_FUNCTIONS[name](x)
+        return self.patch(values, ~np.isfinite(values), function.raw, x)
+
+    def distribution(self, ast: FunctionCall, params: list) -> 'np.ndarray':
+        '''Calcula una muestra por carril de una distribución (normal,
+        poisson...). Los carriles con parámetros inválidos se recalculan con
+        la semántica escalar, que registra el error.
+        '''
+        name, site = ast.id.value, ast.site or 0
+        rng = self.sym_table.rng
+        values, invalid = rng.sample_array(name, site, self.cycles,
+            self.streams, self.n, *params)
+
+        sampler = DISTRIBUTIONS[name][0]
+        values = self.patch(np.array(values), invalid,
+            lambda cycle, lane, *params: rng.sample_at(sampler, site, cycle,
+                lane, *params), self.cycles, self.streams, *params)
+        return self.check_int(values)
+
+    def branch(self, condition: AST, exprT: AST, exprF: AST) -> object:
+        '''Evalúa un if: cada rama solo en los carriles que la toman.'''
+        cond = self.visit(condition)
+        if not isinstance(cond, np.ndarray):
+            return self.visit(exprT if cond else exprF)
+
+        active = self.active
+        branches = []
+        try:
+            for expr, lanes in [(exprT, cond), (exprF, ~cond)]:
+                self.active = lanes if active is None else lanes & active
+                branches.append(self.visit(expr) if self.active.any() else None)
+        finally:
+            self.active = active
+
+        valT, valF = branches
+        if valT is None:
+            return valF
+        if valF is None:
+            return valT
+
+        # Los carriles conservan el tipo nativo (int o float) de su rama
+        if kind(valT) != kind(valF):
+            raise VectorizeError('Ramas de if con tipos nativos distintos')
+        return np.where(cond, valT, valF)
+
+    def generic_visit(self, ast: AST):
+        raise VectorizeError(f'No se puede vectorizar {type(ast).__name__}')
+
+
+class ASTVectorEvaluator(ASTUnboxedEvaluator):
+    '''Evaluador que calcula en lote, sobre arreglos de NumPy, las fórmulas
+    que se evalúan muchas veces seguidas: las muestras de histogram y los
+    elementos de array (o de un arreglo acotado cuyos elementos son la misma
+    fórmula). Las demás expresiones se evalúan como en ASTUnboxedEvaluator.
+
+    Solo se vectorizan las fórmulas escalares cuyo efecto (incluyendo el de
+    las variables que leen) es a lo sumo random, cuando se evalúan al menos
+    vector_threshold veces. Las que no se pueden vectorizar se evalúan una
+    vez por muestra, de forma transparente. Los resultados coinciden con los
+    de ASTEvaluator, incluidos los números aleatorios.
+    '''
+    def __init__(self, sym_table: SymTable):
+        super().__init__(sym_table)
+        self.vector_threshold = VECTOR_MIN_LANES
+
+    def evaluate_lanes(self, ast: AST, n: int, per_cycle: bool,
+        first: int = 0) -> Optional[tuple[list, dict]]:
+        if np is None or n < self.vector_threshold:
+            return None
+        if getattr(ast, 'type', None) not in [NUM, BOOL]:
+            return None
+        if resolve_effect(ast, self.sym_table) > RANDOM:
+            return None
+
+        vectorizer = ASTVectorizer(self, n, per_cycle, first)
+        try:
+            values, errors = vectorizer.run(ast)
+        except VectorizeError:
+            return None
+
+        if per_cycle:
+            vectorizer.commit(errors)
+        return values, errors
+
+    def visit_Array(self, ast: AST) -> AST:
+        # Las secuencias de elementos con la misma fórmula (por ejemplo, los
+        # creados por array con una expresión acotada) se evalúan en lote
+        elements = ast.elements
+        evaluated_list = []
+        start = 0
+
+        while start < len(elements):
+            end = start + 1
+            while end < len(elements) and elements[end] is elements[start]:
+                end += 1
+
+            batch = self.evaluate_lanes(elements[start], end - start, False,
+                start)
+
+            # Si todo el arreglo se evaluó en un solo lote, los valores
+            # nativos se guardan directamente en el arreglo compacto
+            if batch is not None and end - start == len(elements):
+                values, errors = batch
+                if errors:
+                    raise errors[min(errors)]
+                return pack_values(values, elements[start].type)
+
+            if batch is None:
+                lane = self.sym_table.lane
+                for i in range(start, end):
+                    evaluated_list.append(self.at_lane(child_lane(lane, i),
+                        elements[i]))
+            else:
+                values, errors = batch
+                if errors:
+                    raise errors[min(errors)]
+                _type = elements[start].type
+                evaluated_list.extend(box(_type, value) for value in values)
+            start = end
+
+        return pack_array(evaluated_list)
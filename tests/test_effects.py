@@ -0,0 +1,97 @@
+"""Modulo de pruebas para el análisis de efectos de los AST validados"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(1, os.path.abspath('.'))
+
+from stokhos.AST import *
+from stokhos.VM import StokhosVM as SVM
+
+# -------------- Clases de efecto y variables leídas ----------
+test_cases, test_sol = [], []
+
+test_cases.append('1 + 2 * pi()')
+test_sol.append((PURE, set()))
+
+test_cases.append('x + floor(y)')
+test_sol.append((READS, {'x', 'y'}))
+
+test_cases.append('x * uniform()')
+test_sol.append((RANDOM, {'x'}))
+
+test_cases.append('normal(x, 1) + poisson(2)')
+test_sol.append((RANDOM, {'x'}))
+
+test_cases.append('if(x > 1, now(), uniform())')
+test_sol.append((CLOCK, {'x'}))
+
+test_cases.append('if(reset(), tick(), 0)')
+test_sol.append((STATE, set()))
+
+# Las expresiones acotadas no se evalúan...
+test_cases.append("'uniform() + x'")
+test_sol.append((PURE, set()))
+
+# ...salvo en las funciones que las evalúan
+test_cases.append("array(3, 'x * uniform()')")
+test_sol.append((RANDOM, {'x'}))
+
+test_cases.append("histogram('x', 10, 2, 0, 1)")
+test_sol.append((STATE, {'x'}))
+
+test_cases.append('type(now())')
+test_sol.append((PURE, set()))
+
+test_cases.append('a[floor(x)]')
+test_sol.append((READS, {'a', 'x'}))
+
+test_cases.append("y := 'uniform()';")
+test_sol.append((STATE, set()))
+
+test_cases.append('a[0] := x;')
+test_sol.append((STATE, {'x'}))
+
+cases = list(zip(test_cases, test_sol))
+@pytest.mark.parametrize("test_case,test_sol", cases)
+def test_effects(test_case: str, test_sol: tuple):
+    vm = SVM()
+    vm.process('num x := 1;')
+    vm.process("num y := 'x + uniform()';")
+    vm.process('[num] a := [1, 2];')
+
+    ast = vm.parse(test_case)
+    vm.validate(ast)
+    assert (ast.effect, ast.reads) == test_sol
+
+# Salidas del comando de inspección de efectos
+test_cases = [
+    "num u := 'uniform()';",
+    "num y := '2 * u';",
+    'num z := 3;',
+    '2 + 3',
+    'z - 1',
+    'y + z',
+    "'y + now()'",
+    'tick()',
+]
+test_sol = [
+    "OK: effect(\"num u := 'uniform()';\") ==> state",
+    "OK: effect(\"num y := '2 * u';\") ==> state",
+    'OK: effect("num z := 3;") ==> state',
+    'OK: effect("2 + 3") ==> pure',
+    'OK: effect("z - 1") ==> reads-variables {z}, transitivo: reads-variables',
+    'OK: effect("y + z") ==> reads-variables {y, z}, transitivo: random',
+    'OK: effect("\'y + now()\'") ==> clock {y}, transitivo: clock',
+    'OK: effect("tick()") ==> state',
+]
+
+def test_effect_outputs():
+    vm = SVM()
+    for command, sol in zip(test_cases, test_sol):
+        assert vm.effect(command) == sol
+        # El análisis no ejecuta el comando
+        if command.endswith(';'):
+            vm.process(command)
+    assert vm.symbol_table.cycle == 3
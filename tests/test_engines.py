@@ -0,0 +1,887 @@
+"""Modulo de pruebas para los motores de evaluación de la VM"""
+from array import array
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(1, os.path.abspath('.'))
+
+from stokhos.AST import *
+from stokhos.builtins import low_discrepancy, random_source
+from stokhos.utils import effects, evaluators, operators, parallel
+from stokhos.utils.helpers import ASTNodeVisitor
+from stokhos.VM import EVALUATION_ENGINES
+from stokhos.VM import StokhosVM as SVM
+
+# -------------- Programas deterministas ----------
+# Cada caso es una lista de comandos, se compara la salida de cada comando
+# con la del motor por defecto (tree)
+test_cases = []
+
+# Operaciones y funciones predefinidas
+test_cases.append([
+    '2+2',
+    '10/4 - 3*(2^3) % 5',
+    '!(true && false) || 1 >= 2',
+    '-1 <> -1',
+    'sqrt(16) + ln(1) + floor(2.7) + cos(0) + sin(0) + exp(0)',
+    'sum([1,2,3,-3]) + avg([1,2,3,-3]) + length([1,2,3])',
+    'min([3, 1.5, 2]) + max([1,2,3]) + var([1,2,3,4]) + std([2,4,4,9])',
+    'if(1 < 2, 2 * pi(), 0)',
+])
+
+# Errores en tiempo de ejecución
+test_cases.append([
+    '1/0',
+    '2 + 1 % 0',
+    '(-8)^(1/3)',
+    'ln(0)',
+    'sqrt(-1)',
+    '[1,2,3][5]',
+    '[1,2,3][-1]',
+    'sin',
+])
+
+# Variables acotadas y memoización
+test_cases.append([
+    'num x := 3;',
+    "num y := 'x * 2';",
+    "num z := 'y + x';",
+    'z',
+    'x := 10;',
+    'z',
+    "[num] a := [1, 'x', 'y + 1'];",
+    'a',
+    'a[2]',
+    'a[1] := 5;',
+    'a',
+    "formula(y)",
+    "type('x')",
+    'ltype(a[0])',
+])
+
+# Funciones especiales
+test_cases.append([
+    'num n := 3;',
+    "[num] b := array(n, 'n * 2');",
+    'b',
+    "num c := 'if(n > 2, 1, -1)';",
+    "histogram('c', 10, 2, -1, 1)",
+    "stats('c * 2', 10)",
+    "stats('c / (n - 3)', 5)",
+    "quantile('c * 2', 10, [0, 0.5, 1])",
+    "quantile('c / (n - 3)', 5, 0.5)",
+    'tick()',
+    'tick()',
+    'reset()',
+    'n',
+])
+
+# Reducciones de llamadas a array, calculadas sin crear el arreglo
+test_cases.append([
+    'num n := 4;',
+    "sum(array(n, 'n / 8'))",
+    "avg(array(n, 'n * 2')) + length(array(n, 1))",
+    "sum(array(10, '0.1')) + avg(array(0, 1))",
+    "sum(array(2, '2^70'))",
+    "sum(array(n, '1 / (n - 4)'))",
+    "length(array(n, ''n''))",
+    "sum(array(n, ''n''))",
+    "sum(array(-1, 2))",
+])
+
+# Operadores lógicos con cortocircuito
+test_cases.append([
+    'num x := 2;',
+    "bool b := 'x > 1 || ln(0) > 0';",
+    "bool c := 'x < 1 && sqrt(-1) > 0';",
+    'b && !c',
+    'x := 0;',
+    'b',
+    'c',
+])
+
+# Dependencias circulares
+test_cases.append([
+    "num p := 1;",
+    "num q := 'p + 1';",
+    "p := 'q + 1';",
+    'p',
+])
+
+# Valores nativos y terminales: enteros y flotantes, comillas y funciones
+# especiales dentro de expresiones escalares
+test_cases.append([
+    '7 / 7 + 1',
+    '2 ^ 10 - floor(3.5) * 2',
+    "'1' + 2",
+    'tick() + 1',
+    'if(true, 1, 2.5) = 1.0',
+    "num x := 'floor(uniform()) + 4 % 3';",
+    "[num] a := [x, 'x / 2'];",
+    'a[1] + x * a[0]',
+])
+
+# Arreglos compactos: asignación de elementos de otro tipo nativo o de
+# fórmulas, y copias independientes
+test_cases.append([
+    '[num] a := [1, 2, 3];',
+    "[num] b := array(4, '2.5 * 2');",
+    '[bool] c := [true, false];',
+    '[num] d := a;',
+    'a[1] := 2.5;',
+    'b[0] := 1;',
+    'c[1] := true;',
+    "a[0] := 'a[1] + 1';",
+    'a',
+    'b',
+    'c',
+    'd',
+    'sum(a) + sum(b) + avg(d) + length(c)',
+    '[num] e := [99999999999999999999, 1];',
+    'sum(e)',
+])
+
+# Operadores elemento a elemento sobre arreglos
+test_cases.append([
+    '[num] a := [1, 2, 3];',
+    "[num] b := array(3, '0.5');",
+    "[num] c := 'a * b + 1';",
+    'c',
+    'a[0] := 4;',
+    'c',
+    'a / b - a % 2 + 2 ^ a',
+    '(a >= 2) <> [true, false, true]',
+    'sum(a * a) / length(a)',
+    'a / [1, 0, 2]',
+    '(0 - a) ^ 0.5',
+    'a + [1, 2]',
+])
+
+# Variables acotadas a fórmulas con tick
+test_cases.append([
+    "num t := 'tick()';",
+    't',
+    't + 1',
+    "[num] a := ['tick()', 't * 2'];",
+    'a',
+    "histogram('t', 3, 2, 0, 10)",
+    "sum(array(3, 't'))",
+])
+
+engines = [e for e in EVALUATION_ENGINES if e != 'tree']
+cases = [(engine, case) for engine in engines for case in test_cases]
+@pytest.mark.parametrize("engine,test_case", cases)
+def test_engine_matches_tree(engine: str, test_case: list):
+    tree_vm = SVM()
+    engine_vm = SVM(engine)
+
+    for command in test_case:
+        assert engine_vm.process(command) == tree_vm.process(command)
+
+@pytest.mark.parametrize("test_case", test_cases)
+def test_tiered_matches_interpreter(test_case: list):
+    # Con umbral 1 toda fórmula acotada se compila en su primera evaluación
+    tree_vm = SVM()
+    tree_vm.evaluator.hot_threshold = None
+    tiered_vm = SVM()
+    tiered_vm.evaluator.hot_threshold = 1
+
+    for command in test_case + ['tick()'] + test_case[3:]:
+        assert tiered_vm.process(command) == tree_vm.process(command)
+
+def test_tiered_deoptimization():
+    vm = SVM()
+    vm.evaluator.hot_threshold = 3
+    vm.process('num x := 2;')
+    vm.process("num y := 'x ^ 2 + 1';")
+
+    for i in range(3):
+        assert vm.process('y') == 'OK: y ==> 5'
+        vm.process('tick()')
+    assert vm.symbol_table.lookup('y').compiled is not None
+
+    # Las variables referenciadas se siguen cargando en cada evaluación
+    vm.process('x := 3;')
+    assert vm.process('y') == 'OK: y ==> 10'
+
+    # Reasignar la variable descarta la fórmula compilada
+    vm.process("y := 'x - 1';")
+    assert vm.symbol_table.lookup('y').compiled is None
+    assert vm.process('y') == 'OK: y ==> 2'
+
+def test_engine_unknown():
+    with pytest.raises(ValueError):
+        SVM('inexistente')
+
+@pytest.mark.parametrize("engine", list(EVALUATION_ENGINES))
+def test_engine_histogram_samples(engine: str):
+    # Con números aleatorios solo se puede verificar el total de muestras
+    vm = SVM(engine)
+    vm.process("num u := 'uniform()';")
+    ast = vm.parse("histogram('u', 1000, 4, 0, 1)")
+    vm.validate(ast)
+    out = vm.eval(ast)
+
+    assert sum(el.value for el in out) == 1000
+    assert out[0].value == 0 and out[-1].value == 0
+
+def test_bytecode_disassemble():
+    vm = SVM()
+    vm.process('num x := 3;')
+    out = vm.disassemble('if(x > 2, 2 * x, 0)')
+
+    assert out.splitlines() == [
+        'OK: bytecode("if(x > 2, 2 * x, 0)") ==>',
+        '   0 LOAD_VAR         0 (x)',
+        '   2 PUSH_CONST       1 (2)',
+        '   4 COMPARE          2 (>)',
+        '   6 JUMP_IF_FALSE   16 (-> 16)',
+        '   8 PUSH_CONST       3 (2)',
+        '  10 LOAD_VAR         4 (x)',
+        '  12 BINOP            5 (*)',
+        '  14 JUMP            18 (-> 18)',
+        '  16 PUSH_CONST       6 (0)',
+    ]
+
+def test_visitor_dispatch():
+    class Visitor(ASTNodeVisitor):
+        def visit_BinOp(self, ast):
+            return 'BinOp'
+
+        def visit_Terminal(self, ast):
+            return 'Terminal'
+
+        def generic_visit(self, ast):
+            return 'generic'
+
+    class SubVisitor(Visitor):
+        def visit_Number(self, ast):
+            return 'Number'
+
+    # Los nodos sin visit_* propio usan el de su clase base más cercana
+    visitor = Visitor()
+    assert visitor.visit(Comparison('<', Number(1), Number(2))) == 'BinOp'
+    assert visitor.visit(Number(1)) == 'Terminal'
+    assert visitor.visit(Quoted(Number(1))) == 'generic'
+
+    # Las subclases heredan los visit_* y tienen su propia tabla
+    sub = SubVisitor()
+    assert sub.visit(Number(1)) == 'Number'
+    assert sub.visit(Boolean(True)) == 'Terminal'
+    assert visitor.visit(Number(1)) == 'Terminal'
+
+@pytest.mark.parametrize("engine", list(EVALUATION_ENGINES))
+def test_circular_dependencies(engine: str):
+    vm = SVM(engine)
+    vm.process('num p := 1;')
+    vm.process("num q := 'p + 1';")
+    vm.process("p := 'q + 1';")
+    vm.process('[num] a := [1, 2];')
+    vm.process("a[0] := 'a[1]';")
+    vm.process("a[1] := 'a[0] + 1';")
+
+    assert vm.process('q') == ('ERROR: Dependencia circular en la '
+        'evaluación de "q"')
+    assert vm.process('a[0]') == ('ERROR: Dependencia circular en la '
+        'evaluación de "a[0]"')
+
+    # La detección no deja variables marcadas como en evaluación
+    vm.process('p := 1;')
+    assert vm.process('q') == 'OK: q ==> 2'
+    assert not vm.evaluator.in_progress
+
+def test_iterative_deep_formulas():
+    # Cadena de variables acotadas más profunda que la pila de Python
+    commands = ['num x0 := 0;']
+    commands += [f"num x{i} := 'x{i - 1} + 1';" for i in range(1, 3000)]
+
+    tree_vm = SVM()
+    iterative_vm = SVM('iterative')
+    for command in commands:
+        tree_vm.process(command)
+        iterative_vm.process(command)
+
+    assert tree_vm.process('x2999').startswith('ERROR: Recursión máxima')
+    assert iterative_vm.process('x2999') == 'OK: x2999 ==> 2999'
+
+    # Las fórmulas se memoizan igual que en el evaluador recursivo
+    iterative_vm.process('x0 := 10;')
+    assert iterative_vm.process('x2999 + x1500') == 'OK: x2999 + x1500 ==> 4519'
+
+@pytest.mark.parametrize("engine", list(EVALUATION_ENGINES))
+def test_deep_expression_validation(engine: str):
+    # La validación y las optimizaciones no usan la pila nativa, solo los
+    # motores de evaluación recursivos están limitados por ella
+    vm = SVM(engine)
+    vm.process('num x := 1;')
+    constant = ' + '.join(['1'] * 5000)
+    assert vm.process(constant) == f'OK: {constant} ==> 5000'
+
+    chain = ' + '.join(['x'] * 5000)
+    out = vm.process(chain)
+    if engine == 'iterative':
+        assert out == f'OK: {chain} ==> 5000'
+    else:
+        assert out.endswith('demasiado profunda para el motor de evaluación')
+
+    # Las fórmulas profundas se definen y muestran sin errores
+    assert vm.process(f"num y := '{chain}';") == f"ACK: num y := '{chain}';"
+    assert vm.process('formula(y)').startswith('OK: formula(y) ==> ((')
+    if engine == 'iterative':
+        assert vm.process('x := 2;') == 'ACK: x := 2;'
+        assert vm.process('y') == 'OK: y ==> 10000'
+
+# El operando derecho que no se evalúa no tiene efectos ni errores
+short_circuit_cases = [
+    ('tick()', 'OK: tick() ==> 1'),
+    ('false && reset()', 'OK: false && reset() ==> false'),
+    ('true || reset()', 'OK: true || reset() ==> true'),
+    ('tick()', 'OK: tick() ==> 2'),
+    ('false && 1/0 > 0', 'OK: false && 1/0 > 0 ==> false'),
+    ('true || [1][3] > 0', 'OK: true || [1][3] > 0 ==> true'),
+    ('false || 1/0 > 0', 'ERROR: División por cero en la expresión 1 / 0'),
+    ("bool b := 'false && uniform() > 2';", "ACK: bool b := 'false && uniform() > 2';"),
+    ("bool c := 'uniform() >= 0 || reset()';", "ACK: bool c := 'uniform() >= 0 || reset()';"),
+    ('c && !b', 'OK: c && !b ==> true'),
+    ('tick()', 'OK: tick() ==> 5'),
+]
+
+@pytest.mark.parametrize("engine", list(EVALUATION_ENGINES))
+def test_short_circuit(engine: str):
+    vm = SVM(engine)
+    vm.evaluator.hot_threshold = 1 if engine == 'tree' else None
+    for command, sol in short_circuit_cases:
+        assert vm.process(command) == sol
+
+def test_unboxed_allocations(monkeypatch):
+    # Cuenta los terminales creados al tomar 1000 muestras con histogram
+    def count_terminals(engine: str) -> int:
+        vm = SVM(engine)
+        vm.evaluator.hot_threshold = None
+        vm.process("num d := 'if((2*uniform() - 1)^2 + (2*uniform() - 1)^2 <= 1, 1, -1)';")
+
+        created = []
+        for cls in [Number, Boolean]:
+            def counted(terminal, value, init=cls.__init__):
+                created.append(value)
+                init(terminal, value)
+            monkeypatch.setattr(cls, '__init__', counted)
+
+        assert vm.process("histogram('d', 1000, 1, 0, 0)").startswith('OK')
+        monkeypatch.undo()
+        return len(created)
+
+    # Al recorrer el AST se crea un terminal por operación, mientras que el
+    # motor unboxed solo crea el valor guardado en la tabla de símbolos
+    assert count_terminals('tree') >= 10 * 1000
+    assert count_terminals('unboxed') <= 1000 + 10
+
+# -------------- Evaluación en lote ----------
+# Con umbral 1, el motor vector evalúa en lote las muestras de histogram y los
+# elementos de array; la salida debe coincidir con la de tree
+vector_cases = [
+    'num n := 3;',
+    "num k := 'n * 2 - 1';",
+    "[num] a := array(4, 'k ^ 2 / 5');",
+    'a',
+    "histogram('k % 4', 5, 4, 0, 4)",
+    "[num] b := array(3, 'ln(n - 3)');",
+    "[bool] c := array(3, 'n > 2 && k < 10');",
+    'c',
+    "histogram('1 / (n - 3)', 8, 2, 0, 1)",
+    "[num] d := array(5, 'if(n < 3, 1/0, floor(k / 2))');",
+    'd',
+    "[num] e := array(5, ''n + k'');",
+    'e',
+    "num m := 'if(uniform() < 2, 5, 1/0)';",
+    "histogram('m', 6, 3, 0, 9)",
+    'm',
+    'tick()',
+    "[num] f := array(4, 'if(uniform() < 2, 2 ^ 60, 0)');",
+    'f',
+    "[num] g := array(4, 'if(uniform() < 0.5, 1, 1) + floor(uniform())');",
+    'g',
+    "[num] h := array(3, 'uniform() * 0 + if(uniform() < 0.5, 2, 2.0)');",
+    'h',
+    "[num] p := array(3, '(uniform() - 2) ^ 0.5');",
+    "[num] q := array(3, '(uniform() - 2) ^ 2 - (uniform() - 2) ^ 2 * 0 > 0');",
+    "[num] r := array(3, 'exp(1000 + uniform())');",
+    "histogram('sqrt(uniform() - 2)', 5, 1, 0, 1)",
+    "histogram('if(uniform() < 2 || ln(0) > 0, 1, 2)', 4, 2, 0, 2)",
+    "histogram('if(uniform() > 2 && ln(0) > 0, 1, 2)', 4, 2, 0, 2)",
+    "histogram('if(uniform() < 2, 1, ln(-1))', 4, 2, 0, 2)",
+    "num u := '1 / floor(uniform())';",
+    "histogram('if(uniform() < 2, 1, u)', 4, 2, 0, 2)",
+    "histogram('if(uniform() < 2, u, 1)', 4, 2, 0, 2)",
+    "[num] s := array(70, 'n % 2 + 0 * uniform()');",
+    "[num] t := array(3, 'floor(uniform()) % (n - 3)');",
+    "[num] v := array(3, '(floor(uniform()) + 3) ^ 40');",
+    'v',
+    'sum(s)',
+    'tick()',
+]
+
+@pytest.mark.parametrize("test_case", [vector_cases] + test_cases)
+def test_vector_matches_tree(test_case: list):
+    tree_vm = SVM()
+    vector_vm = SVM('vector')
+    vector_vm.evaluator.vector_threshold = 1
+
+    for command in test_case:
+        assert vector_vm.process(command) == tree_vm.process(command)
+
+@pytest.mark.skipif(random_source.np is None, reason='requiere NumPy')
+def test_vector_lanes():
+    vm = SVM('vector')
+    vm.process('num x := 2;')
+    vm.process("num y := 'x + uniform()';")
+
+    def lanes(expr: str, per_cycle: bool = False):
+        ast = vm.parse(expr)
+        vm.validate(ast)
+        return vm.evaluator.evaluate_lanes(ast, 100, per_cycle)
+
+    values, errors = lanes('2 * uniform() - 1')
+    assert len(values) == 100 and not errors
+    assert all(-1 <= v < 1 for v in values) and len(set(values)) > 1
+
+    # Con per_cycle, las variables se evalúan en cada carril
+    values, errors = lanes('y - x', True)
+    assert len(set(values)) > 1 and vm.symbol_table.cycle == 102
+    values, errors = lanes('y - x')
+    assert len(set(values)) == 1
+
+    # Errores por carril, solo en los carriles que evalúan la rama
+    values, errors = lanes('if(uniform() < 0.5, 1, 1 / 0)')
+    assert errors and all(values[i] == 1 for i in range(100) if i not in errors)
+    assert isinstance(errors[min(errors)], StkRuntimeError)
+
+    # Las fórmulas con efectos de estado, o con menos muestras que el
+    # umbral, se evalúan una vez por muestra
+    assert lanes('tick() + uniform()') is None
+    vm.evaluator.vector_threshold = 1000
+    assert lanes('uniform()') is None
+
+@pytest.mark.parametrize("engine", list(EVALUATION_ENGINES))
+def test_parallel_histogram(engine: str, monkeypatch):
+    vm = SVM(engine, workers=3, parallel_threshold=100)
+    vm.process('num k := 2;')
+    vm.process("num u := 'floor(uniform() * k)';")
+    vm.process("[num] b := [1, 'u + 1'];")
+
+    # Cada proceso cuenta una parte de las muestras, y el ciclo de cómputo
+    # avanza como si se hubieran tomado en la VM
+    cycle = vm.symbol_table.cycle
+    ast = vm.parse("histogram('b[1] * 10 + u', 1000, 30, 0, 30)")
+    vm.validate(ast)
+    counts = vm.eval(ast).buffer.tolist()
+    assert vm.symbol_table.cycle == cycle + 1000
+    # Solo se obtiene 10 o 21: u tiene un único valor en cada muestra
+    assert counts[11] + counts[22] == 1000 and 400 < counts[11] < 600
+
+    # Las muestras se reparten sin perder ninguna
+    assert parallel.split(1000, 3) == [334, 333, 333]
+    assert parallel.symbol_slice(ast.args[0].expr, vm.symbol_table) == [
+        ('b', NUM_ARRAY, vm.symbol_table.lookup('b').value),
+        ('k', NUM, Number(2)),
+        ('u', NUM, vm.symbol_table.lookup('u').value),
+    ]
+
+    # Las expresiones que modifican el estado, o con menos muestras por
+    # proceso que el umbral, se muestrean en la VM
+    def workers(n: int, expr: str) -> int:
+        ast = vm.parse(expr)
+        vm.validate(ast)
+        return parallel.worker_count(vm.evaluator, n, ast)
+
+    assert workers(1000, 'tick()') == 1
+    assert workers(250, 'uniform()') == 2
+    vm.set_workers(3, 500)
+    assert workers(1000, 'uniform()') == 2
+    vm.set_workers(1)
+    assert workers(1000, 'uniform()') == 1
+
+@pytest.mark.parametrize("engine", list(EVALUATION_ENGINES))
+def test_parallel_array(engine: str):
+    vm = SVM(engine, workers=3, parallel_threshold=100)
+    vm.process('num k := 2;')
+    vm.process("num u := 'uniform()';")
+
+    def run(expr: str) -> AST:
+        ast = vm.parse(expr)
+        vm.validate(ast)
+        return vm.eval(ast)
+
+    # Cada proceso evalúa una parte de los elementos, y las partes se unen
+    # en un solo buffer
+    a = run("array(1000, '2 * uniform() - 1')")
+    assert isinstance(a, PackedArray) and a.buffer.typecode == 'd'
+    assert len(a) == 1000 and all(-1 <= v <= 1 for v in a.buffer)
+    assert len(set(a.buffer)) == 1000
+
+    # Los elementos de un mismo ciclo comparten el valor de u
+    a = run("array(1000, 'u + k * 0')")
+    assert len(set(a.buffer)) == 1
+
+    assert run("array(300, 'k + 1 < 3')").buffer.tolist() == [False] * 300
+
+    # Los errores de los procesos se reportan en la VM
+    assert vm.process("array(1000, '1 / (k - k)')").startswith('ERROR')
+
+    # Las partes se unen como si se hubieran evaluado juntas
+    assert evaluators.stitch([array('q', [1, 2]), array('q', [3])],
+        NUM).buffer.tolist() == [1, 2, 3]
+    mixed = evaluators.stitch([array('q', [1]), [0.5, 2 ** 70]], NUM)
+    assert [el.value for el in mixed] == [1, 0.5, 2 ** 70]
+
+    # Los errores de task se lanzan en la VM; si no se pueden copiar los
+    # datos a los procesos, se retorna None
+    with pytest.raises(TypeError):
+        parallel.run_workers(vm.evaluator, [], [1, 1], divmod)
+    assert parallel.run_workers(vm.evaluator, [], [1, 1],
+        lambda evaluator, share, offset: share) is None
+
+@pytest.mark.parametrize("engine", list(EVALUATION_ENGINES))
+def test_parallel_array_elements(engine: str):
+    def run(workers: int) -> list[str]:
+        vm = SVM(engine, workers=workers, parallel_threshold=50)
+        vm.set_seed(7)
+        vm.process("[num] a := ['uniform()', 'uniform() * 2', 3];")
+        vm.process("num k := 'a[0] + a[1]';")
+        return [vm.process(command) for command in [
+            "histogram('k', 300, 6, 0, 3)",
+            "sum(array(300, 'a[1]'))",
+            "stats('a[1]', 1000)",
+            'a[0] + a[1]',
+            'a[1] := 5;',
+            'floor(a[0]) + a[1]',
+        ]]
+
+    # Cada elemento de un arreglo se evalúa de nuevo en cada ciclo, de modo
+    # que los resultados no dependen del número de procesos
+    results = run(1)
+    assert results == run(3)
+
+    counts = json.loads(results[0].split('==> ')[1])
+    assert sum(counts[3:6]) > 0
+    n, mean, variance, low, high = json.loads(results[2].split('==> ')[1])
+    assert 0.25 < variance < 0.42
+    assert results[5] == 'OK: floor(a[0]) + a[1] ==> 5'
+
+@pytest.mark.parametrize("engine", list(EVALUATION_ENGINES))
+def test_seed(engine: str):
+    program = [
+        'num k := 3;',
+        "num u := 'floor(uniform() * k)';",
+        "histogram('u + uniform()', 5000, 4, 0, 4)",
+        "sum(array(300, 'uniform()'))",
+        "[num] a := array(50, 'u');",
+        'a',
+        'uniform()',
+    ]
+
+    def run(vm: SVM) -> list[str]:
+        return [vm.process(line) for line in program]
+
+    # Con la misma semilla, se obtienen los mismos resultados
+    vm1, vm2 = SVM(engine), SVM(engine)
+    vm1.set_seed(42)
+    vm2.process('uniform()')
+    assert vm2.process('seed(42)') == 'OK: seed(42) ==> true'
+    assert run(vm1) == run(vm2)
+
+    # Cada VM tiene su propio generador
+    vm1.set_seed(7)
+    vm2.set_seed(7)
+    vm1.process('uniform()')
+    vm1.process('seed(7)')
+    assert vm1.process('uniform()') == vm2.process('uniform()')
+
+    # reset no reinicia el generador (pero avanza el ciclo, como tick)
+    vm1.process('seed(7)')
+    vm2.process('seed(7)')
+    vm1.process('uniform()')
+    vm1.process('reset()')
+    vm2.process('uniform()')
+    vm2.process('tick()')
+    assert vm1.process('uniform()') == vm2.process('uniform()')
+
+    # Los procesos de .workers usan la semilla de la VM
+    vm1, vm2 = SVM(engine, 3, 100), SVM(engine, 3, 100)
+    vm1.set_seed(1)
+    vm2.set_seed(1)
+    assert run(vm1) == run(vm2)
+
+    assert vm1.process('seed(-1)').startswith('ERROR')
+    assert vm1.process('seed(1.5)').startswith('ERROR')
+    for seed in [-1, 1.5, True]:
+        with pytest.raises(ValueError):
+            vm1.set_seed(seed)
+
+def test_counter_random():
+    program = [
+        'num k := 3;',
+        "num u := 'floor(uniform() * k)';",
+        "[num] v := [uniform(), 'uniform() + u', 'u'];",
+        "histogram('u + uniform()', 3000, 4, 0, 4)",
+        "histogram('if(uniform() < 0.5, u, -u) + v[1]', 3000, 4, -4, 4)",
+        "sum(array(2000, 'uniform() + u'))",
+        "histogram('uniform() - uniform()', 500, 2, -1, 1)",
+        "histogram('normal(u, 1) + poisson(k) + bernoulli(0.5)', 3000, 4, -2, 10)",
+        "sum(array(2000, 'exponential(2) + randint(1, 6) + poisson(30)'))",
+        "histogram('if(uniform() < 0.5, normal(0, 1 - 2 * k), u)', 300, 4, 0, 4)",
+        "[num] a := array(400, 'uniform() * k');",
+        'sum(a)',
+        "[num] b := array(400, 'exp(uniform() * 10) - ln(uniform()) ^ k');",
+        'b',
+        "sum(array(2000, '(uniform() * 9) ^ (u / 2) + exp(-k * uniform())'))",
+        'v',
+        '[uniform(), uniform()]',
+    ]
+
+    def run(engine: str, workers: int = 1) -> list[str]:
+        vm = SVM(engine, workers, 100)
+        vm.set_seed(2022)
+        return [vm.process(line) for line in program]
+
+    # Cada número aleatorio depende solo de la semilla, el sitio, el ciclo
+    # y el carril: todos los motores, en lote o repartidos entre procesos,
+    # producen exactamente los mismos resultados
+    expected = run('tree')
+    assert all(line.startswith(('ACK', 'OK')) for line in expected)
+    for engine in EVALUATION_ENGINES:
+        assert run(engine) == expected
+    assert run('vector', 3) == expected
+    assert run('tree', 3) == expected
+
+    # Llamadas distintas y elementos distintos producen números distintos
+    values = expected[-1].split('==> ')[1]
+    assert len(set(values.strip('[]').split(', '))) == 2
+    vm = SVM()
+    assert vm.process('uniform()') != vm.process('uniform()')
+
+    # El cálculo en lote coincide con el escalar
+    if random_source.np is not None:
+        cycles = [0, 1, 5, 2 ** 40]
+        lanes = [0, 7, random_source.child_lane(3, 2), random_source.MASK]
+        batch = random_source.counter_uniform_array(9, 4, cycles, lanes)
+        assert batch.tolist() == [random_source.counter_uniform(9, 4, c, l)
+            for c, l in zip(cycles, lanes)]
+
+    # También el cálculo por bloques sin NumPy, incluso al desbordar 2^64
+    start = random_source.MASK - 2
+    block = random_source.counter_uniform_block(9, 4, start, 7, 5, False)
+    assert block == [random_source.counter_uniform(9, 4, start + i, 7)
+        for i in range(5)]
+    block = random_source.counter_uniform_block(9, 4, 5, start - 2, 5, True)
+    assert block == [random_source.counter_uniform(9, 4, 5, start - 2 + i)
+        for i in range(5)]
+
+@pytest.mark.parametrize("sequence", ['sobol', 'halton'])
+def test_qmc_random(sequence: str):
+    program = [
+        "num dart := 'if((2*uniform() - 1)^2 + (2*uniform() - 1)^2 <= 1, 1, -1)';",
+        "histogram('dart', 4096, 1, 0, 0)",
+        "[num] a := 'array(8, '2 * uniform() - 1')';",
+        "histogram('avg(a)', 300, 4, -0.5, 0.5)",
+        "stats('normal(0, 1) + poisson(3)', 300)",
+        "quantile('uniform() + exponential(2)', 300, 0.5)",
+        "sum(array(300, 'uniform() + randint(1, 6)'))",
+        '[uniform(), uniform()]',
+    ]
+
+    def run(engine: str, workers: int = 1) -> list[str]:
+        vm = SVM(engine, workers, 100)
+        vm.set_seed(2022)
+        vm.set_sequence(sequence)
+        return [vm.process(line) for line in program]
+
+    # Los números siguen siendo funciones puras de la semilla, el sitio, el
+    # ciclo y el carril
+    expected = run('tree')
+    assert all(line.startswith(('ACK', 'OK')) for line in expected)
+    for engine in EVALUATION_ENGINES:
+        assert run(engine) == expected
+    assert run('vector', 3) == expected
+    assert run('tree', 3) == expected
+
+    # La estimación de pi converge más rápido que con números
+    # pseudoaleatorios, con cualquier semilla
+    def pi_error(seed: int, sequence: str = None) -> float:
+        vm = SVM('vector')
+        vm.set_seed(seed)
+        vm.set_sequence(sequence)
+        vm.process(program[0])
+        inside = vm.process(program[1]).split('==> ')[1].strip('[]')
+        return abs(4 * int(inside.split(', ')[2]) / 4096 - 3.141592653589793)
+
+    quasi = [pi_error(seed, sequence) for seed in range(10)]
+    pseudo = [pi_error(seed) for seed in range(10)]
+    assert max(quasi) < 0.02
+    assert sum(quasi) < sum(pseudo) / 4
+
+    # El cálculo en lote coincide con el escalar
+    vm = SVM()
+    vm.set_sequence(sequence)
+    rng = vm.symbol_table.rng
+    rng.set_dimensions(rng.sample_dimensions([(1, 'uniform'),
+        (2, 'normal'), (3, 'uniform')]))
+    cycles = [0, 1, 5, 2 ** 40, 3, 3]
+    lanes = [0, 7, 2, random_source.MASK, 40, 1]
+    for key in [1, 3, 2 + random_source.DRAW_STRIDE]:
+        if random_source.np is not None:
+            batch = rng.draw_array(key, cycles, lanes)
+            assert batch.tolist() == [rng.draw(key, c, l)
+                for c, l in zip(cycles, lanes)]
+
+    with pytest.raises(ValueError):
+        vm.set_sequence('latin')
+
+def test_qmc_dimensions():
+    # Las dimensiones de cada fórmula muestreada se numeran desde 0, sin
+    # importar cuántas llamadas se validaron antes
+    vm = SVM('vector')
+    vm.set_seed(5)
+    vm.set_sequence('sobol')
+    for i in range(60):
+        vm.process(f"num u{i} := 'uniform() + normal(0, 1)';")
+
+    vm.process("num x := 'uniform()';")
+    vm.process("num y := 'x + normal(0, 1) + sum(array(3, uniform()))';")
+    rng = vm.symbol_table.rng
+    sites = effects.resolve_sites(vm.symbol_table.lookup('y').value,
+        vm.symbol_table)
+    assert [name for site, name in sites] == ['uniform', 'normal', 'uniform']
+    columns, draws = rng.sample_dimensions(sites)
+    assert sorted(columns.values()) == [0, 1, 2] and draws == 2
+
+    # El primer número de cada llamada en el carril raíz usa las primeras
+    # dimensiones, y los elementos de arreglos las siguientes
+    key = sites[0][0] - rng.first_site
+    assert low_discrepancy.qmc_dimension(key, 0, columns, draws) == 0
+    assert low_discrepancy.qmc_dimension(key + random_source.DRAW_STRIDE,
+        0, columns, draws) == 3
+    assert low_discrepancy.qmc_dimension(key, 2, columns, draws) == 12
+    assert low_discrepancy.qmc_dimension(key + 2 * random_source.DRAW_STRIDE,
+        0, columns, draws) is None
+
+    # La estimación de pi sigue convergiendo más rápido que con números
+    # pseudoaleatorios tras validar muchas llamadas
+    vm.process("num dart := 'if((2*uniform() - 1)^2 + (2*uniform() - 1)^2 <= 1, 1, -1)';")
+    counts = vm.process("histogram('dart', 4096, 1, 0, 0)")
+    inside = int(counts.split('==> ')[1].strip('[]').split(', ')[2])
+    assert abs(4 * inside / 4096 - 3.141592653589793) < 0.02
+
+    # Fuera de las fórmulas muestreadas se usan números pseudoaleatorios
+    assert rng.dimensions is None
+
+# Programa evaluado sin NumPy en test_without_numpy
+NUMPY_FREE_SCRIPT = """
+import json, sys
+class Block:
+    def find_spec(self, name, path=None, target=None):
+        if name.split('.')[0] == 'numpy':
+            raise ImportError('NumPy bloqueado')
+sys.meta_path.insert(0, Block())
+from stokhos.VM import EVALUATION_ENGINES, StokhosVM
+outputs = {}
+for engine in EVALUATION_ENGINES:
+    vm = StokhosVM(engine)
+    vm.set_seed(7)
+    outputs[engine] = [vm.process(line) for line in json.loads(sys.argv[1])]
+print(json.dumps(outputs))
+"""
+
+def test_without_numpy():
+    program = [
+        "num u := 'floor(uniform() * 3)';",
+        "histogram('u + normal(0, 1)', 2000, 4, -2, 4)",
+        "[num] a := array(500, 'uniform() + u');",
+        'sum(a) + var(a)',
+        "stats('exponential(2)', 500)",
+        "quantile('uniform()', 500, 0.5)",
+    ]
+
+    # NumPy es opcional: sin él, todos los motores cargan y producen los
+    # mismos resultados que con él (salvo en el último bit de los momentos
+    # de stats, que con NumPy se acumulan por bloques)
+    result = subprocess.run([sys.executable, '-c', NUMPY_FREE_SCRIPT,
+        json.dumps(program)], capture_output=True, text=True,
+        cwd=os.path.abspath('.'))
+    assert result.returncode == 0, result.stderr
+    outputs = json.loads(result.stdout)
+
+    vm = SVM()
+    vm.set_seed(7)
+    expected = [vm.process(line) for line in program]
+    assert all(line.startswith(('ACK', 'OK')) for line in expected)
+    for engine in EVALUATION_ENGINES:
+        for line, expected_line in zip(outputs[engine], expected):
+            if line.startswith('OK: stats'):
+                values = json.loads(line.split('==> ')[1])
+                expected_values = json.loads(expected_line.split('==> ')[1])
+                assert values == pytest.approx(expected_values, rel=1e-12)
+            else:
+                assert line == expected_line
+
+@pytest.mark.parametrize("engine", list(EVALUATION_ENGINES))
+def test_packed_arrays(engine: str):
+    vm = SVM(engine)
+    vm.process('[num] a := [1, 2, 3];')
+    vm.process("[num] b := array(3, 'uniform()');")
+    vm.process('[bool] c := [true, 1 > 2];')
+    vm.process("[num] d := [1, 'a[0] + 1'];")
+    vm.process('[num] e := [1, 2.5];')
+    lookup = vm.symbol_table.lookup
+
+    # Los arreglos de valores evaluados de un mismo tipo nativo se guardan
+    # en un buffer, y los que tienen fórmulas o tipos mezclados no
+    assert lookup('a').value.buffer.typecode == 'q'
+    assert lookup('b').value.buffer.typecode == 'd'
+    assert lookup('c').value.buffer.typecode == 'b'
+    assert not isinstance(lookup('d').value, PackedArray)
+    assert not isinstance(lookup('e').value, PackedArray)
+    assert vm.process('c') == 'OK: c ==> [true, false]'
+    assert lookup('a').value == Array([Number(1), Number(2), Number(3)])
+
+    # Asignar un valor del mismo tipo nativo modifica el buffer, y uno de
+    # otro tipo pasa el arreglo a una lista de elementos
+    vm.process('a[2] := 5;')
+    assert lookup('a').value.buffer.tolist() == [1, 2, 5]
+    assert vm.process('a[1] + a[2]') == 'OK: a[1] + a[2] ==> 7'
+    assert vm.process('a') == 'OK: a ==> [1, 2, 5]'
+    assert vm.process('sum(a)') == 'OK: sum(a) ==> 8'
+    vm.process('a[0] := 0.5;')
+    assert not isinstance(lookup('a').value, PackedArray)
+    assert vm.process('a') == 'OK: a ==> [0.5, 2, 5]'
+    assert vm.process('a[2] + sum(a)') == 'OK: a[2] + sum(a) ==> 12.5'
+
+@pytest.mark.parametrize("numpy", [True, False])
+def test_elementwise_operators(numpy: bool, monkeypatch):
+    if not numpy:
+        monkeypatch.setattr(operators, 'np', None)
+
+    vm = SVM()
+    vm.process('[num] a := [1, 2, 3];')
+    vm.process('[num] b := [0.5, 0.25, 2.0];')
+    assert vm.process('a * b') == 'OK: a * b ==> [0.5, 0.5, 6.0]'
+    assert vm.process('b / a') == 'OK: b / a ==> [0.5, 0.125, 0.6666666666666666]'
+    assert vm.process('a + 1') == 'OK: a + 1 ==> [2, 3, 4]'
+    assert vm.process('1 / a') == 'OK: 1 / a ==> [1.0, 0.5, 0.3333333333333333]'
+    assert vm.process('b < 1') == 'OK: b < 1 ==> [true, true, false]'
+    assert vm.process('[1, 2.5] * 2') == 'OK: [1, 2.5] * 2 ==> [2, 5.0]'
+
+    # Los resultados de un mismo tipo nativo se guardan en buffers
+    ast = vm.parse('b * a > 0.5')
+    vm.validate(ast)
+    assert vm.evaluator.evaluate(ast).buffer.typecode == 'b'
+
+    # Mismos errores que los operadores escalares
+    assert vm.process('b / [1, 0, 2]') == ('ERROR: División por cero en la '
+        'expresión b / [1, 0, 2]')
+    assert vm.process('a - [1]') == ('ERROR: Los arreglos de la expresión '
+        'a - [1] tienen tamaños distintos (3 y 1)')
@@ -96,6 +96,16 @@ test_sol.append(Number(3))
 test_cases.append('avg([1,2,3,-3])')
 test_sol.append(Number(0.75))
 
+# Suma con redondeo correcto, sin depender del orden de los elementos
+test_cases.append('sum(array(10, 0.1))')
+test_sol.append(Number(1.0))
+
+test_cases.append('sum([10.0^16, 1, -(10.0^16)]) + avg([1, 2.5])')
+test_sol.append(Number(2.75))
+
+test_cases.append('sum([10.0^308, 10.0^308])')
+test_sol.append(Number(float('inf')))
+
 test_cases.append('array(2, 4)') 
 test_sol.append(Array([Number(4), Number(4)]))
 
@@ -7,6 +7,9 @@ import pytest
 sys.path.insert(1, os.path.abspath('.'))
 
 from stokhos.AST import *
+from stokhos.builtins import functions
+from stokhos.builtins.quantiles import QuantileSketch
+from stokhos.utils import evaluators
 from stokhos.VM import StokhosVM as SVM
 
 NUM_UN_OPS = ['+', '-']
@@ -228,6 +231,169 @@ def test_histogram0():
 
     assert sum(res, Number(0)).value == samples
 
+@pytest.mark.parametrize("numpy", [True, False])
+def test_statistics(numpy: bool, monkeypatch):
+    if not numpy:
+        monkeypatch.setattr(functions, 'np', None)
+
+    # Los momentos de bloques distintos se combinan
+    monkeypatch.setattr(functions, 'REDUCTION_CHUNK', 3)
+
+    cases = [
+        ('min([3, 1.5, 2])', 1.5),
+        ('max([1, 2, 3])', 3),
+        ('var([1, 2, 3, 4])', 1.25),
+        ('std([2, 4, 4, 4, 5, 5, 7, 9])', 2),
+        ('var(array(7, 2.5))', 0),
+        # Como avg, las reducciones de un arreglo vacío valen 0
+        ('var([]) + std([])', 0),
+        ('min([]) + max([])', 0),
+        # Welford no pierde precisión con valores grandes y varianza pequeña
+        ('var(10^9 + [4, 7, 13, 16])', 22.5),
+        ('var(10.0^9 + [4, 7, 13, 16])', 22.5),
+    ]
+    for command, expected in cases:
+        ast = VM.parse(command)
+        VM.validate(ast)
+        assert VM.eval(ast).value == pytest.approx(expected, abs=1e-9)
+
+@pytest.mark.parametrize("numpy", [True, False])
+def test_stats(numpy: bool, monkeypatch):
+    if not numpy:
+        monkeypatch.setattr(functions, 'np', None)
+    monkeypatch.setattr(evaluators, 'HISTOGRAM_CHUNK', 7)
+
+    vm = SVM()
+    def stats(command: str) -> list:
+        ast = vm.parse(command)
+        vm.validate(ast)
+        return [el.value for el in vm.eval(ast)]
+
+    # Cada muestra es un nuevo ciclo de cómputo, como en histogram
+    cycle = vm.symbol_table.cycle
+    n, mean, var, low, high = stats("stats('floor(uniform() * 4) * 2', 1000)")
+    assert vm.symbol_table.cycle == cycle + 1000
+    assert n == 1000 and low == 0 and high == 6
+    assert 2 < mean < 4 and 4 < var < 6
+
+    # Las muestras que fallan no se cuentan
+    n, mean, var, low, high = stats("stats('1 / floor(uniform() * 2)', 100)")
+    assert 0 < n < 100 and [mean, var, low, high] == [1, 0, 1, 1]
+    assert stats("stats('1 / 0', 10)") == [0, 0, 0, 0, 0]
+    assert stats("stats('2.5', 20)") == [20, 2.5, 0, 2.5, 2.5]
+
+    # Las muestras nan son un error, aunque sean pocas
+    nan = '10.0 ^ 300 * 10.0 ^ 300 - 10.0 ^ 300 * 10.0 ^ 300'
+    assert vm.process(f"stats('if(uniform() < 0.9, 1, {nan})', 100)") == (
+        'ERROR: Se esperaban muestras con un orden, pero se obtuvo nan')
+
+    # Los enteros fuera del rango de los flotantes no tienen media
+    error = ('ERROR: No se pueden calcular la media y la varianza de números '
+        'fuera del rango de los flotantes')
+    assert vm.process("stats('2^1100', 3)") == error
+    assert vm.process("var(array(3, '2^1100'))") == error
+    assert vm.process("std([1, 2^1100])") == error
+
+def test_quantile(monkeypatch):
+    monkeypatch.setattr(evaluators, 'HISTOGRAM_CHUNK', 7)
+
+    vm = SVM()
+    def quantile(command: str) -> object:
+        ast = vm.parse(command)
+        vm.validate(ast)
+        res = vm.eval(ast)
+        return res.value if isinstance(res, Number) else [el.value for el in res]
+
+    # Con pocas muestras los cuantiles son exactos
+    cycle = vm.symbol_table.cycle
+    assert quantile("quantile('floor(uniform() * 4) * 2', 100, [0, 1])") == [0, 6]
+    assert vm.symbol_table.cycle == cycle + 100
+    assert quantile("quantile('2.5', 20, 0.3)") == 2.5
+    # Las muestras que fallan no se cuentan
+    assert quantile("quantile('1 / floor(uniform() * 2)', 100, 0.5)") == 1
+    assert vm.process("quantile('1 / 0', 10, 0.5)").startswith('ERROR')
+    # Las muestras nan son un error, como en stats e histogram
+    nan = '10.0 ^ 300 * 10.0 ^ 300 - 10.0 ^ 300 * 10.0 ^ 300'
+    assert vm.process(f"quantile('{nan}', 10, 0.5)") == vm.process(
+        f"stats('{nan}', 10)") == vm.process(
+        f"histogram('{nan}', 10, 2, 0, 1)") == ('ERROR: Se esperaban '
+        'muestras con un orden, pero se obtuvo nan')
+    assert vm.process("quantile('1', 10, [0.5, -0.1])") == ('ERROR: Se '
+        'esperaba una probabilidad entre 0 y 1, pero se obtuvo -0.1')
+
+def test_distributions():
+    vm = SVM()
+    vm.set_seed(3)
+    def stats(expr: str) -> list:
+        ast = vm.parse(f"stats('{expr}', 20000)")
+        vm.validate(ast)
+        return [el.value for el in vm.eval(ast)]
+
+    # Media y varianza de cada distribución, con un margen de unas cuatro
+    # desviaciones estándar del estimador
+    for expr, mean, var in [
+        ('normal(3, 2)', 3, 4),
+        ('exponential(4)', 0.25, 0.0625),
+        ('poisson(2.5)', 2.5, 2.5),
+        ('poisson(60)', 60, 60),
+        ('bernoulli(0.3)', 0.3, 0.21),
+        ('randint(-2, 7)', 2.5, 8.25),
+    ]:
+        n, m, v, low, high = stats(expr)
+        assert n == 20000
+        assert abs(m - mean) < 4 * (var / n) ** 0.5
+        assert abs(v - var) < 0.1 * var
+
+    assert stats('randint(-2, 7)')[3:] == [-2, 7]
+    assert stats('bernoulli(1) + bernoulli(0) + poisson(0)')[1:] == [1, 0, 1, 1]
+    assert stats('normal(5, 0)')[1:] == [5, 0, 5, 5]
+    assert vm.process('randint(4, 4)') == 'OK: randint(4, 4) ==> 4'
+
+    for command, error in [
+        ('normal(0, -1)', 'desviación estándar un número no negativo, pero se '
+            'obtuvo -1'),
+        ('exponential(0)', 'tasa un número positivo, pero se obtuvo 0'),
+        ('poisson(-0.5)', 'media un número no negativo, pero se obtuvo -0.5'),
+        ('bernoulli(1.5)', 'probabilidad un número entre 0 y 1, pero se '
+            'obtuvo 1.5'),
+        ('randint(2, 1)', 'límites dos enteros a <= b, pero se obtuvo 2 y 1'),
+        ('randint(0, 0.5)', 'límites dos enteros a <= b, pero se obtuvo 0 y '
+            '0.5'),
+    ]:
+        assert vm.process(command) == f'ERROR: Se esperaba como {error}'
+
+    # Cada muestra de randint usa un número de 53 bits
+    assert vm.process('randint(0, 2^53)') == ('ERROR: Se esperaban como '
+        'límites dos enteros a <= b con b - a < 2^53, pero se obtuvo 0 y '
+        '9007199254740992')
+    assert vm.process('randint(2^70, 2^70 + 1) - 2^70 < 2') == ('OK: '
+        'randint(2^70, 2^70 + 1) - 2^70 < 2 ==> true')
+
+def test_quantile_error_bound():
+    # Secuencia determinista de n valores distintos, desordenados
+    n = 20000
+    values = [(i * 7919) % n for i in range(n)]
+    sketch = QuantileSketch(capacity=64)
+    for i in range(0, n, 1000):
+        sketch.extend(values[i:i + 1000])
+
+    bound = sketch.rank_error()
+    assert 0 < bound <= n * (n // 64).bit_length() / 64
+    # El rango del valor i es i + 1
+    for p, estimate in zip([0, 0.01, 0.25, 0.5, 0.9, 1],
+        sketch.quantiles([0, 0.01, 0.25, 0.5, 0.9, 1])):
+        assert abs(estimate + 1 - p * n) <= bound + 1
+
+    exact = QuantileSketch(capacity=64)
+    exact.extend([3, 1, 2])
+    assert exact.rank_error() == 0
+    assert exact.quantiles([0, 0.5, 0.7, 1]) == [1, 2, 3, 3]
+
+    # nan no tiene un orden: se rechaza sin modificar el resumen
+    with pytest.raises(ValueError):
+        exact.extend([4, float('nan')])
+    assert exact.n == 3
+
 def test_histogram1():
     samples = 20
     ast = VM.parse(f"histogram('1/0', {samples}, 10, 1, 10)")
@@ -244,6 +410,37 @@ def test_histogram1():
 
     assert sum(res, Number(0)).value == 0
 
+@pytest.mark.parametrize("numpy", [True, False])
+def test_histogram_bins(numpy: bool, monkeypatch):
+    if not numpy:
+        monkeypatch.setattr(evaluators, 'np', None)
+
+    # Buckets de ancho 2 entre 0 y 10, más los de fuera de rango
+    inf = float('inf')
+    histogram = [0] * 7
+    samples = [-inf, -1, 0, 0.5, 1, 2.5, 9.999, 10, 11, inf, 3]
+    evaluators.stk_bin(histogram, samples, 0, 10, 2)
+    assert histogram == [2, 3, 2, 0, 0, 1, 3]
+
+    with pytest.raises(StkRuntimeError):
+        evaluators.stk_bin(histogram, [float('nan')], 0, 10, 2)
+
+    # Los enteros fuera del rango de los flotantes van a los extremos
+    histogram = [0] * 7
+    evaluators.stk_bin(histogram, [2 ** 1100, -2 ** 1100, 3], 0, 10, 2)
+    assert histogram == [1, 0, 1, 0, 0, 0, 1]
+    ast = VM.parse("histogram('2^1100', 10, 2, 0, 1)")
+    VM.validate(ast)
+    assert [el.value for el in VM.eval(ast)] == [0, 0, 0, 10]
+
+    # Las muestras se clasifican por porciones
+    samples = HISTOGRAM_CHUNK + 10
+    ast = VM.parse(f"histogram('floor(uniform() * 2) * 4 + 3', {samples}, 2, 1, 9)")
+    VM.validate(ast)
+    res = VM.eval(ast)
+    assert res[0] == res[3] == Number(0)
+    assert sum(res, Number(0)).value == samples
+
 
 
 # ------ Pruebas que deben arrojar errores en la VM ---------
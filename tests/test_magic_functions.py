@@ -115,6 +115,88 @@ test_sol.append(sol3 + [append_column(prefix_error(error_with_line_and_file(lex_
 
 # -----------------------------------------------------------------
 
+# ------------------- Procesos de histogram y array ---------------------
+test_cases.append(lambda :repl.default('.workers 4'))
+test_sol.append(['OK: Procesos cambiados a 4 (umbral: 20000)'])
+test_cases.append(lambda :repl.default('.workers'))
+test_sol.append(['OK: Procesos: 4 (umbral: 20000)'])
+test_cases.append(lambda :repl.default('.workers 0'))
+test_sol.append([prefix_error(error_invalid_workers('0'))])
+test_cases.append(lambda :repl.default('.workers dos'))
+test_sol.append([prefix_error(error_invalid_workers('dos'))])
+test_cases.append(lambda :repl.default('.workers 2 500'))
+test_sol.append(['OK: Procesos cambiados a 2 (umbral: 500)'])
+test_cases.append(lambda :repl.default('.workers 2 0'))
+test_sol.append([prefix_error(error_invalid_workers('2 0'))])
+test_cases.append(lambda :repl.default('.workers 2 500 3'))
+test_sol.append([prefix_error(error_invalid_workers('2 500 3'))])
+test_cases.append(lambda :repl.default('.workers'))
+test_sol.append(['OK: Procesos: 2 (umbral: 500)'])
+test_cases.append(lambda :repl.default('.workers 1 20000'))
+test_sol.append(['OK: Procesos cambiados a 1 (umbral: 20000)'])
+# -----------------------------------------------------------------
+
+# ------------------- Secuencias de baja discrepancia ---------------------
+test_cases.append(lambda :repl.default('.qmc'))
+test_sol.append(['OK: Secuencia actual: off'])
+test_cases.append(lambda :repl.default('.qmc sobol'))
+test_sol.append(['OK: Secuencia cambiada a sobol'])
+test_cases.append(lambda :repl.default('.qmc'))
+test_sol.append(['OK: Secuencia actual: sobol'])
+test_cases.append(lambda :repl.default('.qmc latin'))
+test_sol.append([prefix_error(error_nonexistent_sequence('latin'))])
+test_cases.append(lambda :repl.default('.qmc off'))
+test_sol.append(['OK: Secuencia cambiada a off'])
+# -----------------------------------------------------------------
+
+# ------------------- Motores de evaluación ---------------------
+test_cases.append(lambda :repl.default('.engine'))
+test_sol.append(['OK: Motor de evaluación actual: tree'])
+test_cases.append(lambda :repl.default('.engine closure'))
+test_sol.append(['OK: Motor de evaluación cambiado a closure'])
+test_cases.append(lambda :repl.default('.engine'))
+test_sol.append(['OK: Motor de evaluación actual: closure'])
+test_cases.append(lambda :repl.default('.engine turbo'))
+test_sol.append([prefix_error(error_nonexistent_engine('turbo'))])
+test_cases.append(lambda :repl.default('.engine tree'))
+test_sol.append(['OK: Motor de evaluación cambiado a tree'])
+# -----------------------------------------------------------------
+
+# ------------------- Bytecode y efectos ---------------------
+test_cases.append(lambda :repl.default('.bytecode 2 * 3'))
+test_sol.append(['OK: bytecode("2 * 3") ==>\n'
+    '   0 PUSH_CONST       0 (2)\n'
+    '   2 PUSH_CONST       1 (3)\n'
+    '   4 BINOP            2 (*)'])
+test_cases.append(lambda :repl.default('.bytecode'))
+test_sol.append([prefix_error(error_invalid_syntax_generic())])
+test_cases.append(lambda :repl.default('.bytecode 2 +'))
+test_sol.append([prefix_error(error_invalid_syntax_generic())])
+test_cases.append(lambda :repl.default('.effect uniform() + 1'))
+test_sol.append(['OK: effect("uniform() + 1") ==> random'])
+test_cases.append(lambda :repl.default('.effect'))
+test_sol.append([prefix_error(error_invalid_syntax_generic())])
+test_cases.append(lambda :repl.default('.effect noDefinida + 1'))
+test_sol.append([prefix_error(error_undefined_var('noDefinida'))])
+# -----------------------------------------------------------------
+
+# ------------------- Subexpresiones compartidas ---------------------
+test_cases.append(lambda :repl.default('.reset'))
+test_sol.append(['OK: Lista de errores y tabla de símbolos vaciadas correctamente'])
+test_cases.append(lambda :repl.default('.cse'))
+test_sol.append(['OK: Subexpresiones compartidas: 0 evaluadas, 0 evaluaciones ahorradas'])
+test_cases.append(lambda :[repl.default(command) for command in
+    ['num x := 3;', "num a := 'x * x + 1';", "num b := 'x * x + 2';", 'a + b']])
+test_sol.append(['ACK: num x := 3;', "ACK: num a := 'x * x + 1';",
+    "ACK: num b := 'x * x + 2';", 'OK: a + b ==> 21'])
+test_cases.append(lambda :repl.default('.cse'))
+test_sol.append(['OK: Subexpresiones compartidas: 1 evaluadas, 1 evaluaciones ahorradas'])
+test_cases.append(lambda :repl.default('.cse 1'))
+test_sol.append([prefix_error(error_invalid_arguments('.cse'))])
+test_cases.append(lambda :repl.default('.stats'))
+test_sol.append([prefix_error(error_nonexistent_special_command())])
+# -----------------------------------------------------------------
+
 cases = list(zip(test_cases, test_sol))
 @pytest.mark.parametrize("test_case,test_sol", cases)
 def test_magic_functions(test_case:str, test_sol:object, capsys):
@@ -0,0 +1,242 @@
+"""Modulo de pruebas para las optimizaciones sobre AST validados"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(1, os.path.abspath('.'))
+
+from stokhos.AST import *
+from stokhos.builtins import functions
+from stokhos.utils import evaluators
+from stokhos.VM import EVALUATION_ENGINES
+from stokhos.VM import StokhosVM as SVM
+
+# -------------- Plegado de constantes ----------
+# Cada caso es una definición acotada y el nodo esperado en su lado derecho
+# tras la validación: None si no debe sustituirse, o el valor calculado
+test_cases, test_sol = [], []
+
+test_cases.append("'2 * pi()'")
+test_sol.append(Number(2 * 3.141592653589793))
+
+test_cases.append("'(1 + 2) * 3 - 4 / 2'")
+test_sol.append(Number(7.0))
+
+test_cases.append("'if(1 < 2, 10, 20)'")
+test_sol.append(Number(10))
+
+test_cases.append("'sqrt(16) + floor(ln(exp(2)))'")
+test_sol.append(Number(6.0))
+
+test_cases.append("'-(2 + 3) ^ 2'")
+test_sol.append(Number(-25))
+
+# Funciones con efectos y variables no se pliegan
+test_cases.append("'2 * uniform()'")
+test_sol.append(None)
+
+test_cases.append("'now() - now()'")
+test_sol.append(None)
+
+test_cases.append("'tick() + 1'")
+test_sol.append(None)
+
+test_cases.append("'x + 1'")
+test_sol.append(None)
+
+# Errores al plegar, se reportan al evaluar
+test_cases.append("'1 / 0'")
+test_sol.append(None)
+
+test_cases.append("'ln(0)'")
+test_sol.append(None)
+
+# Las subexpresiones que nunca se evalúan no se calculan, y las potencias
+# enteras muy grandes se dejan para la evaluación
+test_cases.append("'if(false, 7 ^ 7 ^ 8, 1)'")
+test_sol.append(Number(1))
+
+test_cases.append("'if(false && 9 ^ 9 ^ 9 > 0, 1, 2)'")
+test_sol.append(Number(2))
+
+test_cases.append("'7 ^ 7 ^ 8'")
+test_sol.append(None)
+
+test_cases.append("'2 ^ 1000'")
+test_sol.append(Number(2 ** 1000))
+
+cases = list(zip(test_cases, test_sol))
+@pytest.mark.parametrize("test_case,test_sol", cases)
+def test_constant_folding(test_case: str, test_sol: object):
+    vm = SVM()
+    vm.process('num x := 1;')
+    ast = vm.parse(f'num y := {test_case};')
+    vm.validate(ast)
+    folded = ast.rhs.expr
+
+    if test_sol is None:
+        assert not isinstance(folded, Folded)
+    else:
+        assert isinstance(folded, Folded)
+        assert folded.expr == test_sol
+        assert type(folded.expr.value) == type(test_sol.value)
+
+# Las salidas de la VM no cambian al plegar constantes
+test_cases = [
+    "num x := '2 * pi() * uniform()';",
+    'formula(x)',
+    "num y := 'if(1 > 2, x, 3 + 4)';",
+    'formula(y)',
+    'y',
+    "num z := '(1/0) + x';",
+    'z',
+    "num w := '-(2+3) ^ 2';",
+    'w',
+    'formula(w)',
+    "'1+2'",
+    "ltype(1+2)",
+    "type(2 * 3 > 5)",
+]
+test_sol = [
+    "ACK: num x := '2 * pi() * uniform()';",
+    'OK: formula(x) ==> (2 * pi()) * uniform()',
+    "ACK: num y := 'if(1 > 2, x, 3 + 4)';",
+    'OK: formula(y) ==> if((1 > 2), x, (3 + 4))',
+    'OK: y ==> 7',
+    "ACK: num z := '(1/0) + x';",
+    'ERROR: División por cero en la expresión 1 / 0',
+    "ACK: num w := '-(2+3) ^ 2';",
+    'OK: w ==> -25',
+    'OK: formula(w) ==> -((2 + 3) ^ 2)',
+    "OK: '1+2' ==> 1 + 2",
+    'ERROR: La expresión "1 + 2" no tiene LVALUE',
+    'OK: type(2 * 3 > 5) ==> bool',
+]
+
+def test_constant_folding_outputs():
+    vm = SVM()
+    for command, sol in zip(test_cases, test_sol):
+        assert vm.process(command) == sol
+
+def test_constant_folding_dead_code():
+    vm = SVM()
+    ast = vm.parse("num y := 'if(true, 1, 2 ^ 3) + if(x > 0, 2 ^ 3, 4)';")
+    vm.process('num x := 1;')
+    vm.validate(ast)
+
+    # La rama descartada de un if constante no se visita
+    dead = ast.rhs.expr.lhs.original.args[2]
+    assert isinstance(dead, BinOp) and not isinstance(dead.lhs, Folded)
+
+    # Con una condición que no es constante se pliegan ambas ramas
+    live = ast.rhs.expr.rhs.args
+    assert isinstance(live[1], Folded) and live[1].expr == Number(8)
+
+    # Las potencias enormes no se calculan al validar
+    assert vm.process("num big := '9 ^ 9 ^ 9';") == "ACK: num big := '9 ^ 9 ^ 9';"
+    assert vm.process('if(false, 7 ^ 7 ^ 8, 1)') == 'OK: if(false, 7 ^ 7 ^ 8, 1) ==> 1'
+
+# -------------- Subexpresiones comunes ----------
+# Las subexpresiones compartidas se calculan una vez por ciclo de cómputo y
+# no conservan valores de ciclos anteriores
+cse_cases = [
+    'num x := 3;',
+    "num a := 'x * x + 1';",
+    "num b := 'x * x + 2';",
+    'a + b',
+    'x := 4;',
+    'a + b',
+    "num c := 'if(x > 3, x * x, 0)';",
+    "num d := 'x * x - 1';",
+    'tick()',
+    'd + c',
+]
+cse_sol = [
+    'ACK: num x := 3;',
+    "ACK: num a := 'x * x + 1';",
+    "ACK: num b := 'x * x + 2';",
+    'OK: a + b ==> 21',
+    'ACK: x := 4;',
+    'OK: a + b ==> 35',
+    "ACK: num c := 'if(x > 3, x * x, 0)';",
+    "ACK: num d := 'x * x - 1';",
+    'OK: tick() ==> 7',
+    'OK: d + c ==> 31',
+]
+
+@pytest.mark.parametrize('engine', ['tree', 'closure', 'bytecode'])
+def test_common_subexpressions(engine: str):
+    vm = SVM(engine)
+    for command, sol in zip(cse_cases, cse_sol):
+        assert vm.process(command) == sol
+
+    # x * x se calcula una vez en cada ciclo y se reutiliza en las demás
+    # fórmulas del mismo ciclo
+    assert vm.symbol_table.cse_computed == 3
+    assert vm.symbol_table.cse_saved == 3
+
+def test_common_subexpressions_marking():
+    vm = SVM()
+    vm.process('num x := 3;')
+    vm.process("num a := 'x * x + 1';")
+    vm.process('x * x + 1')
+    # Las expresiones evaluadas directamente no se comparten
+    assert not vm.symbol_table.lookup('a').value.cse_shared
+
+    vm.process("num b := 'x * x + uniform()';")
+    a = vm.symbol_table.lookup('a').value
+    b = vm.symbol_table.lookup('b').value
+    assert a.lhs.cse_shared and b.lhs.cse_shared
+    # Las subexpresiones con efectos no son candidatas
+    assert not a.cse_shared and b.cse_key is None
+
+@pytest.mark.parametrize('engine', list(EVALUATION_ENGINES))
+def test_common_subexpressions_signed_zero(engine: str):
+    # 0.0 y -0.0 son iguales, pero x * 0.0 y x * -0.0 no se comparten
+    vm = SVM(engine)
+    vm.process('num x := 0-1;')
+    vm.process("num d := 'x * -0.0';")
+    vm.process("num c := 'x * 0.0';")
+    assert vm.process('[c, d]') == 'OK: [c, d] ==> [-0.0, 0.0]'
+
+# -------------- Reducciones fusionadas ----------
+def test_reduction_fusion_marking():
+    vm = SVM()
+    vm.process('[num] a := [1, 2];')
+    vm.process("num s := 'sum(array(3, uniform())) + avg(a)';")
+    s = vm.symbol_table.lookup('s').value
+    assert s.lhs.fused and not s.rhs.fused
+
+    # Un arreglo constante ya se calculó al validar
+    ast = vm.parse('sum(array(3, 1))')
+    vm.validate(ast)
+    assert not ast.fused
+
+@pytest.mark.parametrize('engine', list(EVALUATION_ENGINES))
+def test_reduction_fusion(engine: str, monkeypatch):
+    # Porciones pequeñas para recorrer varias
+    monkeypatch.setattr(evaluators, 'SAMPLE_CHUNK', 3)
+    created = []
+    monkeypatch.setattr(evaluators, 'pack_values',
+        lambda *args: created.append(args))
+
+    vm = SVM(engine)
+    vm.process('num x := 0.1;')
+    assert vm.process("sum(array(10, 'x'))") == "OK: sum(array(10, 'x')) ==> 1.0"
+    assert vm.process("avg(array(7, 'x * 10'))") == ("OK: avg(array(7, "
+        "'x * 10')) ==> 1.0")
+    assert vm.process("length(array(8, 'uniform()'))") == ("OK: length(array("
+        "8, 'uniform()')) ==> 8")
+    # No se crea ningún arreglo
+    assert created == []
+
+def test_chunked_sum():
+    values = [0.1] * 10 + [10.0**16, 1, -10.0**16, 3]
+    for size in [1, 4, 100]:
+        chunks = [values[i:i + size] for i in range(0, len(values), size)]
+        assert functions.raw_chunked_sum(iter(chunks)) == functions.raw_sum(values)
+
+    assert functions.raw_chunked_sum(iter([[1, 2], [2**70]])) == 2**70 + 3
+    assert functions.raw_chunked_sum(iter([[10.0**308], [10.0**308, -10.0**308]])) == float('inf')
+    assert functions.raw_chunked_sum(iter([])) == 0
@@ -72,9 +72,43 @@ test_cases.append(f'arregloDeBooleanos := [3, -1, 4];')
 # la a VM
 test_cases.append(f'uniform() - true')
 test_cases.append(f'pi(uniform())')
-test_cases.append(f'length([1,2,3])^[2,3]') 
+test_cases.append(f'length([1,2,3])^[true,false]') 
 test_cases.append(f'sum([1,2,3])+true')
-test_cases.append(f'avg([1,2,3]) * 3 + [2]')
+test_cases.append(f'avg([1,2,3]) * 3 + [false]')
+
+# operadores elemento a elemento con arreglos de tipos incompatibles
+test_cases.extend([f'arregloDeNumeros {binOp} arregloDeBooleanos'
+    for binOp in ALL_BIN_OPS])
+test_cases.extend([f'arregloDeBooleanos {binOp} true'
+    for binOp in NUM_BIN_OPS + ['<', '<=', '>', '>=']])
+test_cases.extend([f'arregloDeNumeros {binOp} 1' for binOp in BOOL_BIN_OPS])
+test_cases.append(f'arregloDeNumeros = true')
+test_cases.append(f'num x := arregloDeNumeros + 1;')
+test_cases.append(f'bool x := arregloDeNumeros < 1;')
+
+# stats recibe una expresión num y un número de muestras
+test_cases.append(f"stats('true', 10)")
+test_cases.append(f"stats('1', true)")
+test_cases.append(f"stats('1')")
+
+# quantile recibe una expresión num, un número de muestras y probabilidades
+test_cases.append(f"quantile('true', 10, 0.5)")
+test_cases.append(f"quantile('1', 10, true)")
+test_cases.append(f"quantile('1', 10, arregloDeBooleanos)")
+test_cases.append(f"quantile('1', 10)")
+
+# seed recibe un número
+test_cases.append(f"seed(true)")
+test_cases.append(f"seed()")
+
+# Las distribuciones reciben sus parámetros numéricos
+test_cases.append(f"normal(0)")
+test_cases.append(f"normal(0, true)")
+test_cases.append(f"exponential()")
+test_cases.append(f"poisson(arregloDeNumeros)")
+test_cases.append(f"bernoulli(y)")
+test_cases.append(f"randint(1, 2, 3)")
+test_cases.append(f"normal(0, 1) && true")
 # Cuando se ejecutan estas pruebas de forma individual, funcionan. Pero al hacerlo,
 # global (con solo "pytest") fallan. El programa no falla con estos casos
 
@@ -109,6 +109,22 @@ test_sol.append(NUM)
 test_cases.append('[1, unNumero]')
 test_sol.append(NUM_ARRAY)
 
+# Operadores elemento a elemento entre arreglos y escalares
+test_cases.extend([f'arregloDeNumeros {numOp} 2' for numOp in NUM_BIN_OPS])
+test_sol.extend([NUM_ARRAY for i in range(len(NUM_BIN_OPS))])
+
+test_cases.extend([f'unNumero {numOp} [1, 2]' for numOp in NUM_BIN_OPS])
+test_sol.extend([NUM_ARRAY for i in range(len(NUM_BIN_OPS))])
+
+test_cases.extend([f'arregloDeNumeros {comparison} [1]' for comparison in COMPARISONS])
+test_sol.extend([BOOL_ARRAY for i in range(len(COMPARISONS))])
+
+test_cases.extend([f'true {comparison} arregloDeBooleanos' for comparison in ['<>', '=']])
+test_sol.extend([BOOL_ARRAY for i in range(2)])
+
+test_cases.append('sum(arregloDeNumeros * arregloDeNumeros) / length(arregloDeNumeros)')
+test_sol.append(NUM)
+
 # ----------- Definiciones ---------------
 test_cases.append('num h := 2;')
 test_sol.append(VOID)